@@ -14,9 +14,6 @@ import bpy
 from . import lip_sync
 from . import content_manager
 from . import video_player
-from .logger import get_logger
-
-logger = get_logger()
 
 class LIPSYNC_CONTENT_PT_main_panel(bpy.types.Panel):
     bl_label = "Lip Sync and Content Generation"
@@ -39,8 +36,7 @@ class LIPSYNC_CONTENT_PT_main_panel(bpy.types.Panel):
             video_player.draw_player_controls(self, context, layout)
 
 def register():
-    logger.info("开始注册 Lip sync & 3D digital human 插件")
-    
+    # 注册和注销时不写日志: 日志文件在第一条日志时才创建, 启用插件本身不应在磁盘上留下文件
     bpy.utils.register_class(LIPSYNC_CONTENT_PT_main_panel)
     bpy.types.Scene.lipsync_content_tab = bpy.props.EnumProperty(
         items=[
@@ -54,20 +50,14 @@ def register():
     content_manager.register()    
     lip_sync.register()
     video_player.register()
-    
-    logger.info("Lip sync & 3D digital human 插件注册完成")
 
 def unregister():
-    logger.info("开始注销 Lip sync & 3D digital human 插件")
-    
     bpy.utils.unregister_class(LIPSYNC_CONTENT_PT_main_panel)
     del bpy.types.Scene.lipsync_content_tab
 
     content_manager.unregister()    
     lip_sync.unregister()
     video_player.unregister()
-    
-    logger.info("Lip sync & 3D digital human 插件注销完成")
 
 if __name__ == "__main__":
     register()
\ No newline at end of file
@@ -0,0 +1,82 @@
+import os
+import time
+import logging
+import tempfile
+import threading
+
+# 上传给语音识别之前的预处理: 混成单声道、重采样到 16 kHz、去掉首尾静音, 可选编码为 FLAC
+# 浏览器录音多是 48 kHz 立体声, 处理后上传的字节数通常只有原来的十分之一左右; 无法解码的文件原样上传
+# librosa 和 soundfile 导入很慢, 第一次处理时才导入
+
+PREPROCESS_DEFAULTS = {
+    'enabled': True,
+    'sample_rate': 16000,
+    'top_db': 40,  # 比峰值低这么多分贝以下视为静音
+    'pad_ms': 200,  # 裁剪后首尾各保留的静音, 避免切掉第一个和最后一个音
+    'format': 'flac',  # flac 或 wav (16 位 PCM)
+}
+FORMATS = {'flac': ('FLAC', 'PCM_16', '.flac'), 'wav': ('WAV', 'PCM_16', '.wav')}
+PREPROCESS_DIR = os.path.join(os.path.dirname(__file__), 'Cache', 'stt')
+
+class AudioPreprocessor:
+    def __init__(self, sample_rate=16000, top_db=40, pad_ms=200, format='flac', output_dir=PREPROCESS_DIR):
+        self.sample_rate = sample_rate
+        self.top_db = top_db
+        self.pad_ms = pad_ms
+        self.format = format
+        self.output_dir = output_dir
+        self.files = 0
+        self.failures = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.total_time = 0.0
+        self.lock = threading.Lock()
+
+    def process(self, file_name):
+        # 返回处理后的临时文件路径, 由调用方上传后删除; 解码失败时返回 None, 调用方应上传原文件
+        start = time.perf_counter()
+        output_path = None
+        try:
+            import librosa
+            import soundfile
+            file_format, subtype, suffix = FORMATS[self.format]
+            y, sr = librosa.load(file_name, sr=self.sample_rate, mono=True, res_type='soxr_hq')
+            duration = len(y) / sr
+            if len(y):
+                _, (begin, end) = librosa.effects.trim(y, top_db=self.top_db)
+                pad = int(self.pad_ms / 1000 * sr)
+                if end > begin:  # 全是静音时保留原样, 交给识别服务判断
+                    y = y[max(0, begin - pad):min(len(y), end + pad)]
+            os.makedirs(self.output_dir, exist_ok=True)
+            fd, output_path = tempfile.mkstemp(suffix=suffix, dir=self.output_dir)
+            os.close(fd)
+            soundfile.write(output_path, y, sr, subtype=subtype, format=file_format)
+        except Exception as e:
+            logging.warning(f"音频预处理失败, 上传原文件: {file_name}, {str(e)}")
+            if output_path and os.path.exists(output_path):
+                os.remove(output_path)
+            with self.lock:
+                self.failures += 1
+            return None
+
+        elapsed = time.perf_counter() - start
+        size_before = os.path.getsize(file_name)
+        size_after = os.path.getsize(output_path)
+        with self.lock:
+            self.files += 1
+            self.bytes_before += size_before
+            self.bytes_after += size_after
+            self.total_time += elapsed
+        logging.info(f"音频预处理: {size_before} -> {size_after} 字节, 时长 {duration:.2f}s -> {len(y) / sr:.2f}s, 耗时 {elapsed * 1000:.0f} ms")
+        return output_path
+
+    def stats(self):
+        with self.lock:
+            return {
+                'files': self.files,
+                'failures': self.failures,
+                'bytes_before': self.bytes_before,
+                'bytes_after': self.bytes_after,
+                'ratio': self.bytes_after / self.bytes_before if self.bytes_before else 0.0,
+                'avg_time': self.total_time / self.files if self.files else 0.0,
+            }
@@ -0,0 +1,27 @@
+# 基准脚本共用: 把插件目录登记为包, 按包名导入其中的模块, 模块之间的相对导入与在 Blender 中一样生效
+# 不执行插件的 __init__.py (它需要 bpy), 所以没有 Blender 也能导入内容生成、语音和接收服务器等模块
+# 用法: from addon_package import load_module; ContentGenerator = load_module('content_generator').ContentGenerator
+# 服务的 config 是配置服务的共享字典, 只读; 基准要把地址指向桩服务器等时用 private_config, 不影响进程里的其他服务
+import os
+import sys
+import copy
+import types
+import importlib
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "lipsync_addon"
+
+def load_module(name):
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [REPO_DIR]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+def private_config(service, overrides):
+    # 把服务的配置换成深拷贝, 再按段合并 overrides, 例如 {'chattts': {'url': ...}}
+    config = copy.deepcopy(service.config)
+    for section, values in overrides.items():
+        config[section] = {**config.get(section, {}), **values}
+    service.config = config
+    return config
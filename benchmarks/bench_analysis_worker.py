@@ -0,0 +1,68 @@
+# 后台分析进程基准: 新进程中第一次 analyze_audio(含 librosa 导入和 numba 编译) 与 预热后的后台进程从提交到拿到口型数组的耗时对比
+# 运行: python benchmarks/bench_analysis_worker.py [音频文件]   (不指定文件时使用30秒合成语音)
+import os
+import sys
+import time
+import logging
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lip_sync_worker import AnalysisWorker
+from bench_streaming_analysis import synthetic_speech
+
+logging.getLogger("LipSyncLogger").setLevel(logging.WARNING)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def cold_first_call(audio_file):
+    # 在全新的解释器中计时, 保证导入和 JIT 编译都计入
+    code = (
+        "import sys, time, logging; sys.path.insert(0, sys.argv[1]); start = time.perf_counter();"
+        "from lip_sync_core import LipSyncCore; logging.getLogger('LipSyncLogger').setLevel(logging.WARNING);"
+        "LipSyncCore().analyze_audio(sys.argv[2]); print(time.perf_counter() - start)"
+    )
+    result = subprocess.run([sys.executable, "-c", code, REPO_DIR, audio_file], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def wait(predicate):
+    while not predicate():
+        time.sleep(0.005)
+
+def worker_round_trip(worker, audio_file):
+    results = []
+    start = time.perf_counter()
+    worker.submit(audio_file, {'core': {}, 'streaming': False, 'cache_dir': None}, lambda arrays, info: results.append((arrays, info)))
+    wait(lambda: worker.poll() == 0)
+    elapsed = time.perf_counter() - start
+    arrays, info = results[0]
+    if arrays is None:
+        raise RuntimeError(info['error'])
+    return elapsed, info
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        if len(sys.argv) > 1:
+            audio_file = sys.argv[1]
+        else:
+            audio_file = os.path.join(tmp, "synthetic_30s.wav")
+            synthetic_speech(audio_file, 30)
+
+        cold_time = cold_first_call(audio_file)
+        print(f"新进程第一次分析: {cold_time:.2f}s")
+
+        worker = AnalysisWorker()
+        start = time.perf_counter()
+        worker.start()
+        wait(lambda: worker.poll() == 0 and worker.ready)
+        print(f"后台进程启动并预热: {time.perf_counter() - start:.2f}s (其中预热 {worker.warm_up_time:.2f}s, 不占用主线程)")
+        try:
+            for attempt in range(3):
+                elapsed, info = worker_round_trip(worker, audio_file)
+                print(f"后台分析 #{attempt + 1}: 提交到拿到结果 {elapsed:.3f}s, 进程内分析 {info['elapsed']:.3f}s, {info['count']} 帧")
+        finally:
+            worker.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# 关键帧写入基准: 逐帧 keyframe_insert(旧实现) 与 批量写入F曲线(LipSyncCore.apply_visemes_to_mesh) 的耗时对比
+# 需要在Blender中运行: blender -b --factory-startup --python benchmarks/bench_apply_visemes.py -- [分钟数]
+import os
+import sys
+import time
+import logging
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lip_sync_core import LipSyncCore, VISEMES
+from bench_generate_visemes import synthetic_features
+
+logging.getLogger("LipSyncLogger").setLevel(logging.WARNING)
+
+def legacy_apply_visemes_to_mesh(obj, visemes, action_name):
+    shape_keys = obj.data.shape_keys.key_blocks
+    action = bpy.data.actions.new(name=action_name)
+    obj.data.shape_keys.animation_data.action = action
+    for frame, viseme, strength in visemes:
+        for shape_key in shape_keys:
+            if shape_key.name in ['A', 'I', 'U', 'E', 'O']:
+                shape_key.value = strength if shape_key.name == viseme else 0.0
+                shape_key.keyframe_insert("value", frame=frame)
+    return action
+
+def create_mouth_object():
+    mesh = bpy.data.meshes.new("BenchMouth")
+    mesh.from_pydata([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [], [(0, 1, 2)])
+    obj = bpy.data.objects.new("BenchMouth", mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    obj.shape_key_add(name='Basis')
+    for viseme in VISEMES:
+        obj.shape_key_add(name=viseme)
+    obj.data.shape_keys.animation_data_create()
+    return obj
+
+def keyframe_data(action):
+    data = {}
+    for fcurve in action.fcurves:
+        data[fcurve.data_path] = [(round(kp.co.x, 4), round(kp.co.y, 4), kp.interpolation) for kp in fcurve.keyframe_points]
+    return data
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    minutes = float(argv[0]) if argv else 10.0
+    frame_rate = 24.0
+    total_frames = int(minutes * 60 * frame_rate)
+    core = LipSyncCore(frame_rate=frame_rate)
+    mel_spec, chroma = synthetic_features(total_frames)
+    visemes = core.generate_visemes(total_frames, mel_spec, chroma)
+    obj = create_mouth_object()
+
+    start = time.perf_counter()
+    legacy_action = legacy_apply_visemes_to_mesh(obj, visemes, "BenchLegacy")
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bulk_action = core.apply_visemes_to_mesh(obj, visemes, "BenchBulk")
+    bulk_time = time.perf_counter() - start
+
+    print(f"{total_frames} 帧 x {len(VISEMES)} 个口型 ({minutes:g} 分钟 @ {frame_rate:g} fps)")
+    print(f"  逐帧 keyframe_insert: {legacy_time:.3f}s")
+    print(f"  批量写入F曲线: {bulk_time:.3f}s")
+    print(f"  加速比: {legacy_time / bulk_time:.1f}x, 关键帧一致: {keyframe_data(legacy_action) == keyframe_data(bulk_action)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# 进度推送压力测试: 大量观看者同时订阅 /events, 通过任务登记表发布事件, 报告从发布到所有观看者收到的延迟和服务器线程数
+# 运行: python benchmarks/bench_event_stream.py [--viewers 500] [--events 200] [--interval-ms 5]
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+import selectors
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from addon_package import load_module
+
+file_handler = load_module('file_handler')
+FileHandler, FileHandlerServer = file_handler.FileHandler, file_handler.FileHandlerServer
+EventBroadcaster = load_module('event_stream').EventBroadcaster
+JobRegistry = load_module('job_registry').JobRegistry
+
+logging.getLogger().setLevel(logging.WARNING)
+FileHandler.log_message = lambda self, format, *args: None
+
+def open_viewer(port):
+    sock = socket.create_connection(("localhost", port))
+    sock.sendall(b"GET /events HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n")
+    return sock
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def read_viewers(viewers, expected, latencies, done):
+    # 所有观看者在一个线程里用 selectors 读取, 客户端一侧也不按连接开线程
+    selector = selectors.DefaultSelector()
+    buffers = {}
+    for sock in viewers:
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ)
+        buffers[sock] = b''
+    received = {sock: 0 for sock in viewers}
+    remaining = len(viewers)
+    while remaining:
+        for key, _ in selector.select(timeout=5):
+            sock = key.fileobj
+            data = sock.recv(65536)
+            if not data:
+                selector.unregister(sock)
+                remaining -= 1
+                continue
+            now = time.perf_counter()
+            buffers[sock] += data
+            *messages, buffers[sock] = buffers[sock].split(b"\n\n")
+            for message in messages:
+                for line in message.split(b"\n"):
+                    if line.startswith(b"data: "):
+                        data = json.loads(line[6:])
+                        if 'sent' in data:
+                            latencies.append(now - data['sent'])
+                            received[sock] += 1
+                            if received[sock] == expected:
+                                selector.unregister(sock)
+                                remaining -= 1
+        if not selector.get_map() and remaining:
+            break
+    done.set()
+
+def main():
+    parser = argparse.ArgumentParser(description="进度推送压力测试")
+    parser.add_argument('--port', type=int, default=9992)
+    parser.add_argument('--viewers', type=int, default=500)
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--interval-ms', type=float, default=5.0, help="两次发布之间的间隔, 模拟模型逐段输出")
+    args = parser.parse_args()
+
+    registry = JobRegistry()
+    events = EventBroadcaster(snapshot=registry.get, max_clients=args.viewers)
+    registry.add_listener(events.publish)
+    server = FileHandlerServer(port=args.port, status_provider=registry.get, events=events)
+    if not server.start():
+        sys.exit(f"无法在端口 {args.port} 启动服务器")
+
+    baseline_threads = threading.active_count()
+    start = time.perf_counter()
+    viewers = [open_viewer(args.port) for _ in range(args.viewers)]
+    while events.stats()['subscribers'] < args.viewers:
+        time.sleep(0.01)
+    connect_time = time.perf_counter() - start
+    server_threads = threading.active_count()
+
+    latencies, done = [], threading.Event()
+    reader = threading.Thread(target=read_viewers, args=(viewers, args.events, latencies, done), daemon=True)
+    reader.start()
+    job_id = registry.create()
+    start = time.perf_counter()
+    for index in range(args.events):
+        registry.publish(job_id, 'token', {'text': f"片段{index}", 'sent': time.perf_counter()})
+        time.sleep(args.interval_ms / 1000)
+    done.wait(timeout=30)
+    elapsed = time.perf_counter() - start
+
+    stats = events.stats()
+    stop_start = time.perf_counter()
+    server.stop()
+    stop_time = time.perf_counter() - stop_start
+    for sock in viewers:
+        sock.close()
+
+    print(f"{args.viewers} 个观看者, {args.events} 条事件, 发布间隔 {args.interval_ms:.0f} ms")
+    print(f"建立所有订阅用时 {connect_time:.2f}s, 订阅后进程线程数 {server_threads} (订阅前 {baseline_threads}, 不含读取线程)")
+    print(f"收到 {len(latencies)} / {args.viewers * args.events} 条, 发布 {stats['published']} 条, 断开慢观看者 {stats['dropped']} 个, 用时 {elapsed:.2f}s")
+    if latencies:
+        print(f"发布到收到的延迟 p50 {percentile(latencies, 0.50) * 1000:.1f} ms, p99 {percentile(latencies, 0.99) * 1000:.1f} ms, 最大 {max(latencies) * 1000:.1f} ms")
+    print(f"服务器停止用时 {stop_time * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
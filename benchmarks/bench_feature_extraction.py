@@ -0,0 +1,58 @@
+# 特征提取基准: melspectrogram + chroma_stft 各做一次STFT(旧实现) 与 共用一次STFT(LipSyncCore.compute_features) 的耗时对比
+# 运行: python benchmarks/bench_feature_extraction.py [音频文件...]   (不指定文件时使用合成语音, 计时不包括解码)
+# 插件默认由音频估计调音偏差, 这时两种实现都要调用 librosa.estimate_tuning (piptrack, 比一次STFT更耗时), 共用STFT只省下一次STFT, 加速有限; 两种情况分别报告
+import os
+import sys
+import time
+import logging
+import tempfile
+import numpy as np
+import librosa
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lip_sync_core import LipSyncCore
+from bench_streaming_analysis import synthetic_speech
+
+logging.getLogger("LipSyncLogger").setLevel(logging.WARNING)
+
+def legacy_features(y, sr, frame_rate, tuning=None):
+    mel_spec = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=10, hop_length=int(sr/frame_rate))
+    chroma = librosa.feature.chroma_stft(y=y, sr=sr, hop_length=int(sr/frame_rate), tuning=tuning)
+    return mel_spec, chroma
+
+def best_of(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+def compare(audio_file, tuning=None):
+    core = LipSyncCore(tuning=tuning)
+    y, sr = librosa.load(audio_file)
+    legacy_features(y, sr, core.frame_rate)  # 预热 numba JIT
+    (mel_old, chroma_old), legacy_time = best_of(lambda: legacy_features(y, sr, core.frame_rate, tuning))
+    (mel_new, chroma_new), shared_time = best_of(lambda: core.compute_features(y, sr))
+
+    identical = np.array_equal(mel_old, mel_new) and np.array_equal(chroma_old, chroma_new)
+    print(f"{os.path.basename(audio_file)}: {len(y) / sr:.0f} 秒, 调音偏差: {'估计 (插件默认)' if tuning is None else tuning}")
+    print(f"  两次STFT: {legacy_time:.3f}s")
+    print(f"  共用STFT: {shared_time:.3f}s")
+    print(f"  加速比: {legacy_time / shared_time:.2f}x, 特征一致: {identical}")
+
+def main():
+    if len(sys.argv) > 1:
+        for audio_file in sys.argv[1:]:
+            compare(audio_file)
+            compare(audio_file, tuning=0.0)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic_2min.wav")
+        synthetic_speech(path, 120)
+        compare(path)
+        compare(path, tuning=0.0)
+
+if __name__ == "__main__":
+    main()
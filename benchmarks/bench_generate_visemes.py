@@ -0,0 +1,73 @@
+# 口型生成基准: 逐帧循环(旧实现) 与 整段矩阵计算(LipSyncCore.generate_visemes) 的帧率对比
+# 运行: python benchmarks/bench_generate_visemes.py [分钟数]
+import os
+import sys
+import time
+import logging
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lip_sync_core import LipSyncCore
+
+logging.getLogger("LipSyncLogger").setLevel(logging.WARNING)
+
+def legacy_generate_visemes(core, total_frames, mel_spec, chroma):
+    visemes = []
+    silence_counter = 0
+    current_viseme = None
+
+    for frame in range(total_frames):
+        frame_energy = np.sum(mel_spec[:, frame])
+
+        if frame_energy > core.silence_threshold:
+            pitch_frame = np.argmax(mel_spec[:, frame])
+            chroma_frame = np.argmax(chroma[:, frame])
+            phoneme_index = (pitch_frame + chroma_frame) % len(core.phoneme_to_viseme)
+            current_phoneme = list(core.phoneme_to_viseme.keys())[phoneme_index]
+            current_viseme = core.phoneme_to_viseme[current_phoneme]
+            silence_counter = 0
+        elif silence_counter >= core.max_silence_frames:
+            current_viseme = None
+        else:
+            silence_counter += 1
+
+        viseme_strength = min(1.0, frame_energy / core.silence_threshold) if current_viseme else 0.0
+        visemes.append((frame, current_viseme, viseme_strength))
+    return visemes
+
+def synthetic_features(total_frames, seed=0):
+    # 模拟语音: 有声段与静音段交替, 能量分布在阈值附近
+    rng = np.random.default_rng(seed)
+    envelope = np.repeat(rng.random(total_frames // 12 + 1) < 0.6, 12)[:total_frames]
+    mel_spec = (rng.random((10, total_frames)) ** 4 * 0.01).astype(np.float32)
+    mel_spec[:, envelope] *= 8
+    chroma = rng.random((12, total_frames)).astype(np.float32)
+    return mel_spec, chroma
+
+def main():
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 60.0
+    frame_rate = 24.0
+    total_frames = int(minutes * 60 * frame_rate)
+    mel_spec, chroma = synthetic_features(total_frames)
+
+    for language in ('chinese', 'english'):
+        core = LipSyncCore(frame_rate=frame_rate, silence_threshold=0.01, max_silence_frames=5, language=language)
+
+        start = time.perf_counter()
+        expected = legacy_generate_visemes(core, total_frames, mel_spec, chroma)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = core.generate_visemes(total_frames, mel_spec, chroma)
+        vectorized_time = time.perf_counter() - start
+
+        identical = expected == result
+        print(f"[{language}] {total_frames} 帧 ({minutes:g} 分钟 @ {frame_rate:g} fps)")
+        print(f"  逐帧循环: {legacy_time:.3f}s, {total_frames / legacy_time:,.0f} 帧/秒")
+        print(f"  整段计算: {vectorized_time:.3f}s, {total_frames / vectorized_time:,.0f} 帧/秒")
+        print(f"  加速比: {legacy_time / vectorized_time:.1f}x, 输出一致: {identical}")
+        if not identical:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# 连接复用测试: 对本地桩服务器连续发请求, 对比每次调用 requests.post(每次新建连接) 和共用的 HTTP 客户端(连接池复用)
+# 桩服务器在每个新连接上先等待 --setup-ms, 模拟远程主机的 TCP/TLS 建连耗时
+# 运行: python benchmarks/bench_http_client.py [--requests 200] [--setup-ms 20] [--clients 4]
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from addon_package import load_module
+
+HttpClient = load_module('http_client').HttpClient
+
+logging.getLogger().setLevel(logging.WARNING)
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # 响应头和正文分两次写出, 长连接上不关掉 Nagle 会多出约40ms
+    setup_ms = 0.0
+
+    def setup(self):
+        time.sleep(self.setup_ms / 1000)
+        super().setup()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length'] or 0))
+        body = b'{"code": 0}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def run(post, clients, count, url):
+    def client():
+        for _ in range(count):
+            post(url, data={'text': "你好"}).content
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="连接复用测试")
+    parser.add_argument('--port', type=int, default=9997)
+    parser.add_argument('--requests', type=int, default=200, help="每个客户端线程的请求数")
+    parser.add_argument('--clients', type=int, default=4, help="并发的客户端线程数")
+    parser.add_argument('--setup-ms', type=float, default=20.0, help="模拟的建连耗时")
+    args = parser.parse_args()
+    import requests
+
+    StubHandler.setup_ms = args.setup_ms
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{args.port}/tts"
+    total = args.requests * args.clients
+
+    print(f"{args.clients} 个线程 x {args.requests} 个请求, 建连耗时 {args.setup_ms:.0f} ms")
+    elapsed = run(requests.post, args.clients, args.requests, url)
+    print(f"requests.post: {elapsed:.2f}s, 平均每个请求 {elapsed / args.requests * 1000:.1f} ms, 新建 {total} 个连接")
+
+    client = HttpClient()
+    elapsed = run(client.post, args.clients, args.requests, url)
+    stats = client.stats()
+    print(f"共用客户端: {elapsed:.2f}s, 平均每个请求 {elapsed / args.requests * 1000:.1f} ms, 新建 {stats['connections']} 个连接, 复用率 {stats['reuse_ratio']:.1%}")
+    client.close()
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# 接收服务器压力测试: 多个长连接客户端同时按 test.html 的格式 POST 文本, 回调为本地桩函数(模拟入队并返回任务ID), 报告吞吐量和延迟分位数
+# 运行: python benchmarks/bench_ingest_server.py [--clients 32] [--requests 200] [--callback-ms 20] [--workers 16]
+import os
+import sys
+import time
+import uuid
+import logging
+import argparse
+import threading
+import http.client
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from addon_package import load_module
+
+file_handler = load_module('file_handler')
+FileHandler, FileHandlerServer = file_handler.FileHandler, file_handler.FileHandlerServer
+
+logging.getLogger().setLevel(logging.WARNING)
+FileHandler.log_message = lambda self, format, *args: None
+
+def run_client(port, count, latencies, errors):
+    # 一个客户端复用一条 HTTP/1.1 长连接
+    connection = http.client.HTTPConnection("localhost", port, timeout=30)
+    body = urlencode({'text': "你好, 请介绍一下你自己"})
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            connection.request("POST", "/", body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 202:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(f"{type(e).__name__}: {e}")
+            connection.close()
+            connection = http.client.HTTPConnection("localhost", port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description="接收服务器压力测试")
+    parser.add_argument('--port', type=int, default=9991)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=200, help="每个客户端的请求数")
+    parser.add_argument('--callback-ms', type=float, default=20.0, help="桩回调的耗时, 模拟入队")
+    parser.add_argument('--workers', type=int, default=16, help="服务器线程池大小")
+    args = parser.parse_args()
+
+    handled = []
+    def stub_callback(result):
+        time.sleep(args.callback_ms / 1000)
+        handled.append(result)
+        return uuid.uuid4().hex
+
+    server = FileHandlerServer(port=args.port, callback=stub_callback, max_workers=args.workers)
+    if not server.start():
+        sys.exit(f"无法在端口 {args.port} 启动服务器")
+
+    latencies, errors = [], []
+    clients = [threading.Thread(target=run_client, args=(args.port, args.requests, latencies, errors)) for _ in range(args.clients)]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+
+    stop_start = time.perf_counter()
+    server.stop()
+    stop_time = time.perf_counter() - stop_start
+
+    print(f"{args.clients} 个客户端 x {args.requests} 个请求, 线程池 {args.workers}, 回调 {args.callback_ms:.0f} ms")
+    print(f"成功 {len(latencies)}, 失败 {len(errors)}, 回调 {len(handled)} 次, 用时 {elapsed:.2f}s")
+    if latencies:
+        print(f"吞吐量 {len(latencies) / elapsed:,.0f} 请求/秒")
+        print(f"延迟 p50 {percentile(latencies, 0.50) * 1000:.1f} ms, p99 {percentile(latencies, 0.99) * 1000:.1f} ms, 最大 {max(latencies) * 1000:.1f} ms")
+    print(f"服务器停止用时 {stop_time * 1000:.0f} ms")
+    for error in sorted(set(map(str, errors)))[:5]:
+        print(f"  错误: {error}")
+
+if __name__ == "__main__":
+    main()
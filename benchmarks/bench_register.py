@@ -0,0 +1,85 @@
+# 插件注册耗时基准: 在新的 Blender 进程中导入插件并调用 register(), 对比重量级依赖被替换为空模块(stubbed)与真实导入(real)的耗时
+# 运行: python benchmarks/bench_register.py [--blender /path/to/blender] [--repeat 5] [--max-overhead 50]
+# 两者之差就是注册时被提前导入的重量级依赖的开销, 超过 --max-overhead 毫秒时返回非零退出码, 便于发现回归
+import os
+import sys
+import json
+import time
+import types
+import argparse
+import subprocess
+import statistics
+import importlib.util
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('librosa', 'numba', 'scipy', 'soundfile', 'soxr', 'openai', 'requests')
+RESULT_MARKER = "BENCH_REGISTER "
+
+def install_stubs():
+    for name in HEAVY_MODULES:
+        sys.modules[name] = types.ModuleType(name)
+
+def run_child(mode):
+    # 在 Blender 内执行: 导入插件包并注册, 把耗时和注册后已导入的重量级模块打印到标准输出
+    if mode == 'stubbed':
+        install_stubs()
+    start = time.perf_counter()
+    spec = importlib.util.spec_from_file_location(
+        "lipsync_addon", os.path.join(REPO_DIR, "__init__.py"), submodule_search_locations=[REPO_DIR])
+    addon = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = addon
+    spec.loader.exec_module(addon)
+    imported = time.perf_counter()
+    addon.register()
+    registered = time.perf_counter()
+    addon.unregister()
+
+    loaded = [name for name in HEAVY_MODULES if mode == 'real' and name in sys.modules]
+    print(RESULT_MARKER + json.dumps({
+        'import': imported - start,
+        'register': registered - imported,
+        'loaded': loaded,
+    }), flush=True)
+
+def measure(blender, mode):
+    command = [blender, '-b', '--factory-startup', '--python', os.path.abspath(__file__), '--', '--child', mode]
+    result = subprocess.run(command, capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"Blender 子进程没有输出结果 (退出码 {result.returncode}):\n{result.stdout[-2000:]}\n{result.stderr[-2000:]}")
+
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser(description="测量插件 register() 的耗时")
+    parser.add_argument('--blender', default=os.environ.get('BLENDER', 'blender'), help="Blender 可执行文件")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-overhead', type=float, default=50.0, help="real 比 stubbed 慢的上限(毫秒)")
+    parser.add_argument('--child', choices=['stubbed', 'real'], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.child)
+        return 0
+
+    totals = {}
+    loaded = set()
+    for mode in ('stubbed', 'real'):
+        samples = [measure(args.blender, mode) for _ in range(args.repeat)]
+        totals[mode] = statistics.median(sample['import'] + sample['register'] for sample in samples)
+        loaded.update(name for sample in samples for name in sample['loaded'])
+        print(f"{mode:>8}: 导入 {statistics.median(s['import'] for s in samples) * 1000:7.1f} ms, "
+              f"register() {statistics.median(s['register'] for s in samples) * 1000:7.1f} ms, "
+              f"合计 {totals[mode] * 1000:7.1f} ms (中位数, {args.repeat} 次)")
+
+    overhead = (totals['real'] - totals['stubbed']) * 1000
+    print(f"重量级依赖带来的额外耗时: {overhead:.1f} ms")
+    if loaded:
+        print(f"注册后已被导入的重量级模块: {', '.join(sorted(loaded))}")
+    if overhead > args.max_overhead:
+        print(f"超过上限 {args.max_overhead:.0f} ms")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
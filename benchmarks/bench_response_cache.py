@@ -0,0 +1,118 @@
+# 回复缓存测试: 本地桩服务器模拟 Ollama 逐字流式输出, 多个观众在几秒内重复问同一批问题, 对比不开缓存和开缓存时的后端调用次数和平均耗时
+# 运行: python benchmarks/bench_response_cache.py [--viewers 8] [--rounds 5] [--questions 3] [--token-ms 20]
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from addon_package import load_module, private_config
+
+ContentGenerator = load_module('content_generator').ContentGenerator
+ResponseCache = load_module('response_cache').ResponseCache
+
+logging.getLogger().setLevel(logging.WARNING)
+
+REPLY = "欢迎来到直播间，今天给大家介绍新品。"
+
+class StubHandler(BaseHTTPRequestHandler):
+    # POST /api/generate: 按 Ollama 的格式逐字输出 NDJSON, 分块传输
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    token_ms = 20.0
+    calls = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        prompt = json.loads(self.rfile.read(int(self.headers['Content-Length'] or 0)))['prompt']
+        with self.lock:
+            StubHandler.calls += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for token in prompt + REPLY:
+            time.sleep(self.token_ms / 1000)
+            self.write_chunk(json.dumps({'response': token, 'done': False}, ensure_ascii=False).encode('utf-8') + b"\n")
+        self.write_chunk(b'{"response": "", "done": true}\n')
+        self.write_chunk(b'')
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+
+def run(generator, args):
+    # 每一轮所有观众同时提问, 每人问的是同一批问题中的一个
+    StubHandler.calls = 0
+    latencies = []
+    wrong = []
+    def viewer(index):
+        question = f"问题{index % args.questions}"
+        start = time.perf_counter()
+        reply = generator.generate(question, "Ollama")
+        latencies.append(time.perf_counter() - start)
+        if reply != question + REPLY:
+            wrong.append(reply)
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        threads = [threading.Thread(target=viewer, args=(index,)) for index in range(args.viewers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return time.perf_counter() - start, sum(latencies) / len(latencies), StubHandler.calls, len(wrong)
+
+def check_close_before_read():
+    # 拿到迭代器后还没读取就关闭是允许的用法, 不能留下登记; 同时在读取的相同问题和之后的相同问题都必须正常拿到回复
+    cache = ResponseCache()
+    produce = lambda: iter(["回复"])
+    abandoned = cache.stream('问题', produce)
+    replies = []
+    follower = threading.Thread(target=lambda: replies.append("".join(cache.stream('问题', produce))), daemon=True)
+    follower.start()
+    abandoned.close()
+    follower.join(timeout=5)
+    later = threading.Thread(target=lambda: replies.append("".join(cache.stream('问题', produce))), daemon=True)
+    later.start()
+    later.join(timeout=5)
+    return replies == ["回复", "回复"] and cache.stats()['inflight'] == 0
+
+def main():
+    parser = argparse.ArgumentParser(description="回复缓存测试")
+    parser.add_argument('--port', type=int, default=9993)
+    parser.add_argument('--viewers', type=int, default=8, help="每轮同时提问的观众数")
+    parser.add_argument('--rounds', type=int, default=5, help="提问轮数, 都在缓存有效期内")
+    parser.add_argument('--questions', type=int, default=3, help="不同问题的数量")
+    parser.add_argument('--token-ms', type=float, default=20.0, help="模型每输出一个字的耗时")
+    args = parser.parse_args()
+
+    if not check_close_before_read():
+        print("未读取就关闭的请求留下了登记, 相同的问题一直等待")
+        sys.exit(1)
+
+    StubHandler.token_ms = args.token_ms
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    generator = ContentGenerator("Ollama")
+    url = f"http://127.0.0.1:{args.port}/api/generate"
+
+    print(f"{args.rounds} 轮 x {args.viewers} 个观众, {args.questions} 个不同问题, 每字 {args.token_ms:.0f} ms")
+    try:
+        for name, enabled in (("不开缓存", False), ("开缓存", True)):
+            private_config(generator, {'ollama': {'url': url}, 'llm_cache': {'backends': {'Ollama': enabled}}})
+            generator.cache.clear()
+            elapsed, latency, calls, wrong = run(generator, args)
+            print(f"{name}: {elapsed:.2f}s, 平均回复耗时 {latency * 1000:.0f} ms, 调用后端 {calls} 次, 回复错误 {wrong} 个")
+        stats = generator.cache.stats()
+        print(f"缓存: 命中 {stats['hits']}, 合并 {stats['coalesced']}, 未命中 {stats['misses']}")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# 文本文件合成测试: 本地桩服务器模拟 ChatTTS(耗时 = 固定开销 + 每字耗时, 同时处理的请求数有上限), 对比整篇一次合成和分块并发合成的总耗时与首段音频到达时间
+# 运行: python benchmarks/bench_script_synthesis.py [--paragraphs 60] [--tts-base-ms 300] [--tts-char-ms 10] [--server-slots 8] [--workers 1 4 8]
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from addon_package import load_module, private_config
+
+TextToSpeech = load_module('text_to_speech').TextToSpeech
+speech_pipeline = load_module('speech_pipeline')
+split_script, synthesize_chunks = speech_pipeline.split_script, speech_pipeline.synthesize_chunks
+OrderedStreams = load_module('job_scheduler').OrderedStreams
+
+logging.getLogger().setLevel(logging.WARNING)
+
+PARAGRAPH = "欢迎来到今天的直播间，我们先来介绍一下这款新品的设计理念。它的外壳采用了再生材料，重量只有上一代的一半！"
+
+class StubHandler(BaseHTTPRequestHandler):
+    # POST /tts: 占用一个合成槽位, 按文本长度等待后返回音频地址; GET /audio/<名称>: 返回音频内容
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    options = None
+    slots = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'] or 0))
+        text = parse_qs(body.decode('utf-8'))['text'][0]
+        with self.slots:
+            time.sleep((self.options.tts_base_ms + self.options.tts_char_ms * len(text)) / 1000)
+        port = self.server.server_address[1]
+        name = f"{time.monotonic_ns()}_{threading.get_ident()}.wav"
+        payload = json.dumps({'code': 0, 'msg': 'ok', 'audio_files': [{'url': f"http://127.0.0.1:{port}/audio/{name}"}]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        payload = b"RIFF" + b"\0" * 4096
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/wav')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def run_chunked(tts, chunks, workers, output_dir):
+    # 与 ContentManager.synthesize_script 相同: 并发合成, 按块顺序交付
+    start = time.perf_counter()
+    delivered = []
+    def deliver(ticket, index, audio_files):
+        delivered.append((index, time.perf_counter() - start))
+    streams = OrderedStreams(deliver)
+    stream = streams.open()
+    clips = synthesize_chunks(chunks, lambda index, chunk: tts.synthesize(chunk, output_dir=output_dir),
+                              lambda index, clip: streams.put(stream, index, clip), workers=workers)
+    streams.finish(stream, len(chunks))
+    in_order = [index for index, _ in delivered] == list(range(len(chunks)))
+    return time.perf_counter() - start, delivered[0][1], clips.count(None), in_order
+
+def main():
+    parser = argparse.ArgumentParser(description="文本文件合成测试")
+    parser.add_argument('--port', type=int, default=9989)
+    parser.add_argument('--paragraphs', type=int, default=60, help="脚本段落数")
+    parser.add_argument('--chunk-chars', type=int, default=120, help="每块最多字数")
+    parser.add_argument('--tts-base-ms', type=float, default=300.0, help="每次合成请求的固定耗时")
+    parser.add_argument('--tts-char-ms', type=float, default=10.0, help="每个字的合成耗时")
+    parser.add_argument('--server-slots', type=int, default=8, help="合成服务最多同时处理的请求数")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8], help="要对比的并发数")
+    args = parser.parse_args()
+
+    StubHandler.options = args
+    StubHandler.slots = threading.Semaphore(args.server_slots)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    output_dir = tempfile.mkdtemp(prefix="bench_script_")
+
+    tts = TextToSpeech("ChatTTS")
+    private_config(tts, {'chattts': {'url': f"http://127.0.0.1:{args.port}/tts"}})
+    tts.cache_enabled = False
+    script = "\n".join([PARAGRAPH] * args.paragraphs)
+    chunks = split_script(script, args.chunk_chars)
+
+    print(f"脚本 {len(script)} 字, 切成 {len(chunks)} 块; 合成 {args.tts_base_ms:.0f} ms + 每字 {args.tts_char_ms:.0f} ms, 服务端 {args.server_slots} 个槽位")
+    try:
+        start = time.perf_counter()
+        tts.synthesize(script, output_dir=output_dir)
+        elapsed = time.perf_counter() - start
+        print(f"整篇一次合成: 总耗时 {elapsed:.2f}s, 首段音频 {elapsed:.2f}s")
+        for workers in args.workers:
+            elapsed, first, failed, in_order = run_chunked(tts, chunks, workers, output_dir)
+            print(f"分块合成 (并发 {workers}): 总耗时 {elapsed:.2f}s, 首段音频 {first:.2f}s, 失败 {failed} 块, 交付顺序{'正确' if in_order else '错误'}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
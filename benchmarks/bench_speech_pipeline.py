@@ -0,0 +1,134 @@
+# 首段语音延迟测试: 本地桩服务器模拟 Ollama 逐词流式输出和 ChatTTS 合成, 对比整段合成和逐句合成的首段音频到达时间(time-to-first-audio)
+# 运行: python benchmarks/bench_speech_pipeline.py [--sentences 6] [--token-ms 40] [--tts-base-ms 300] [--tts-char-ms 15] [--runs 3]
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from addon_package import load_module, private_config
+
+ContentGenerator = load_module('content_generator').ContentGenerator
+TextToSpeech = load_module('text_to_speech').TextToSpeech
+SentencePipeline = load_module('speech_pipeline').SentencePipeline
+
+logging.getLogger().setLevel(logging.WARNING)
+
+SENTENCE = "今天的天气很好，适合出去散步。"
+
+class StubHandler(BaseHTTPRequestHandler):
+    # POST /api/generate: 按 Ollama 的格式逐词输出 NDJSON; POST /tts: 按 ChatTTS 的格式返回音频地址; GET /audio/<名称>: 返回音频内容
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # 响应头和正文分两次写出, 长连接上不关掉 Nagle 会多出约40ms
+    options = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'] or 0))
+        if self.path == '/api/generate':
+            # 和 Ollama 一样用分块传输, 每个字一块
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for token in SENTENCE * self.options.sentences:
+                time.sleep(self.options.token_ms / 1000)
+                self.write_chunk(json.dumps({'response': token, 'done': False}, ensure_ascii=False).encode('utf-8') + b"\n")
+            self.write_chunk(b'{"response": "", "done": true}\n')
+            self.write_chunk(b'')
+        elif self.path == '/tts':
+            text = parse_qs(body.decode('utf-8'))['text'][0]
+            time.sleep((self.options.tts_base_ms + self.options.tts_char_ms * len(text)) / 1000)
+            name = f"{time.monotonic_ns()}_{threading.get_ident()}.wav"
+            port = self.server.server_address[1]
+            payload = json.dumps({'code': 0, 'msg': 'ok', 'audio_files': [{'url': f"http://127.0.0.1:{port}/audio/{name}"}]}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        else:
+            self.send_error(404)
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+
+    def do_GET(self):
+        payload = b"RIFF" + b"\0" * 4096
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/wav')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def run_whole(generator, tts, output_dir):
+    start = time.perf_counter()
+    content = generator.generate("你好", "Ollama")
+    audio_files = tts.synthesize(content, output_dir=output_dir)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed, len(audio_files or [])
+
+def run_pipelined(generator, tts, pipeline, output_dir):
+    start = time.perf_counter()
+    first_audio = []
+    def on_clip(index, audio_files):
+        if index == 0:
+            first_audio.append(time.perf_counter() - start)
+    content, futures = pipeline.run(
+        lambda on_token: generator.generate("你好", "Ollama", on_token=on_token),
+        lambda index, sentence: tts.synthesize(sentence, output_dir=output_dir),
+        on_clip)
+    clips = [future.result() for future in futures]
+    return first_audio[0], time.perf_counter() - start, len(clips)
+
+def main():
+    parser = argparse.ArgumentParser(description="首段语音延迟测试")
+    parser.add_argument('--port', type=int, default=9995)
+    parser.add_argument('--sentences', type=int, default=6, help="回复包含的句子数")
+    parser.add_argument('--token-ms', type=float, default=40.0, help="模型每输出一个字的耗时")
+    parser.add_argument('--tts-base-ms', type=float, default=300.0, help="每次合成请求的固定耗时")
+    parser.add_argument('--tts-char-ms', type=float, default=15.0, help="每个字的合成耗时")
+    parser.add_argument('--workers', type=int, default=1, help="逐句合成的线程数")
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    StubHandler.options = args
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    generator = ContentGenerator("Ollama")
+    # 每次运行的问题相同, 开着回复缓存时第一次之后都不再请求模型, 测不到逐句合成与生成重叠的效果
+    private_config(generator, {'ollama': {'url': f"http://127.0.0.1:{args.port}/api/generate"},
+                               'llm_cache': {'backends': {'Ollama': False}}})
+    tts = TextToSpeech("ChatTTS")
+    private_config(tts, {'chattts': {'url': f"http://127.0.0.1:{args.port}/tts"}})
+    tts.cache_enabled = False  # 每次运行合成的句子相同, 开着语音缓存就测不到合成耗时
+    pipeline = SentencePipeline(workers=args.workers)
+    output_dir = tempfile.mkdtemp(prefix="bench_speech_")
+
+    print(f"回复 {args.sentences} 句 ({len(SENTENCE) * args.sentences} 字), 每字 {args.token_ms:.0f} ms; 合成 {args.tts_base_ms:.0f} ms + 每字 {args.tts_char_ms:.0f} ms; 逐句合成线程 {args.workers}")
+    try:
+        for name, run in (("整段合成", lambda: run_whole(generator, tts, output_dir)),
+                          ("逐句合成", lambda: run_pipelined(generator, tts, pipeline, output_dir))):
+            results = [run() for _ in range(args.runs)]
+            first = sorted(result[0] for result in results)[len(results) // 2]
+            total = sorted(result[1] for result in results)[len(results) // 2]
+            print(f"{name}: 首段音频 {first:.2f}s, 全部音频 {total:.2f}s, 音频片段 {results[0][2]} 个 (中位数, {args.runs} 次)")
+        stats = generator.http.stats()
+        print(f"HTTP: {stats['requests']} 个请求, 新建 {stats['connections']} 个连接, 复用率 {stats['reuse_ratio']:.0%}")
+    finally:
+        pipeline.shutdown()
+        server.shutdown()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
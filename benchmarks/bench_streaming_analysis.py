@@ -0,0 +1,83 @@
+# 流式分析基准: 对比 analyze_audio 与 analyze_audio_stream 的峰值内存、耗时和输出一致性
+# 运行: python benchmarks/bench_streaming_analysis.py [音频文件...]   (不指定文件时生成不同时长的合成语音)
+# 流式分析先完整读一遍文件估计调音偏差, 估计和固定调音偏差时两者都应逐帧一致
+# 流式分析估计调音偏差用的是 librosa.piptrack 的私有复制, 每个文件都先与 librosa.estimate_tuning 核对, 不一致时返回非零退出码
+import os
+import sys
+import time
+import logging
+import tempfile
+import tracemalloc
+import numpy as np
+import soundfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lip_sync_core import LipSyncCore, N_CHROMA, _tuning_peaks, _estimate_tuning_from_peaks
+
+logging.getLogger("LipSyncLogger").setLevel(logging.WARNING)
+
+def synthetic_speech(path, seconds, sr=44100, seed=0):
+    # 音节长度的调幅谐波加噪声, 中间穿插停顿
+    rng = np.random.default_rng(seed)
+    with soundfile.SoundFile(path, 'w', samplerate=sr, channels=1, subtype='PCM_16') as f:
+        for start in range(0, int(seconds), 10):
+            t = np.arange(int(min(10, seconds - start) * sr)) / sr
+            pitch = 120 + 80 * rng.random()
+            y = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+            syllables = np.repeat(rng.random(len(t) // 4410 + 1) < 0.7, 4410)[:len(t)]
+            y = (0.3 * y * syllables + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+            f.write(y)
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def check_tuning(audio_file):
+    # 同一个功率谱上, 私有复制与 librosa.estimate_tuning 的结果必须相同
+    import librosa
+    core = LipSyncCore()
+    y, sr = librosa.load(audio_file, sr=core.sample_rate, res_type=core.res_type)
+    power = core._power_spectrogram(y, int(sr / core.frame_rate))
+    expected = librosa.estimate_tuning(S=power, sr=sr, n_fft=core.n_fft, bins_per_octave=N_CHROMA)
+    actual = _estimate_tuning_from_peaks(*_tuning_peaks(power, sr, core.n_fft))
+    print(f"{os.path.basename(audio_file)}: 调音偏差 librosa {expected}, 流式分析 {actual}")
+    return expected == actual
+
+def compare(audio_file, tuning=None):
+    core = LipSyncCore(tuning=tuning)
+    batch, batch_time, batch_peak = measure(lambda: core.analyze_audio(audio_file))
+    stream, stream_time, stream_peak = measure(lambda: list(core.analyze_audio_stream(audio_file)))
+
+    same_viseme = sum(a[1] == b[1] for a, b in zip(batch, stream))
+    strength_error = max((abs(a[2] - b[2]) for a, b in zip(batch, stream)), default=0.0)
+    print(f"{os.path.basename(audio_file)}: {len(batch)} 帧, 调音偏差: {'估计' if tuning is None else tuning}")
+    print(f"  整段分析: {batch_time:.2f}s, 峰值内存 {batch_peak / 2**20:.1f} MiB")
+    print(f"  流式分析: {stream_time:.2f}s, 峰值内存 {stream_peak / 2**20:.1f} MiB")
+    print(f"  帧数一致: {len(batch) == len(stream)}, 口型一致率: {same_viseme / max(len(batch), 1):.2%}, 最大强度误差: {strength_error:.4f}")
+
+def main():
+    consistent = True
+    if len(sys.argv) > 1:
+        for audio_file in sys.argv[1:]:
+            consistent &= check_tuning(audio_file)
+            compare(audio_file)
+            compare(audio_file, tuning=0.0)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            for minutes in (1, 5, 20):
+                path = os.path.join(tmp, f"synthetic_{minutes}min.wav")
+                synthetic_speech(path, minutes * 60)
+                consistent &= check_tuning(path)
+                compare(path)
+                compare(path, tuning=0.0)
+    if not consistent:
+        print("流式分析的调音偏差估计与 librosa.estimate_tuning 不一致, 需要按新版 librosa 更新 lip_sync_core 中的复制")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# 语音识别预处理测试: 生成一段带首尾静音的 48 kHz 立体声录音, 本地桩服务器模拟 Whisper ASR(按限定速率接收上传, 识别耗时与音频时长成正比),
+# 对比原样上传和预处理(单声道/16 kHz/去静音/FLAC)后上传的字节数和端到端转写耗时
+# 运行: python benchmarks/bench_stt_preprocess.py [--seconds 8] [--silence 1.5] [--upload-kbps 1024] [--asr-ms-per-sec 50] [--runs 3]
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from email.parser import BytesParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import soundfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from addon_package import load_module, private_config
+
+SpeechToText = load_module('speech_to_text').SpeechToText
+
+logging.getLogger().setLevel(logging.WARNING)
+
+class StubHandler(BaseHTTPRequestHandler):
+    # POST /asr: 以 --upload-kbps 的速率读取 multipart 上传, 再按音频时长等待 --asr-ms-per-sec, 按 Whisper ASR 的格式返回
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    options = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        remaining = int(self.headers['Content-Length'] or 0)
+        body = b""
+        chunk = 16 * 1024
+        while remaining:
+            data = self.rfile.read(min(chunk, remaining))
+            body += data
+            remaining -= len(data)
+            time.sleep(len(data) / 1024 / self.options.upload_kbps)
+        message = BytesParser().parsebytes(f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode('latin-1') + body)
+        audio = next(part.get_payload(decode=True) for part in message.get_payload() if part.get_param('name', header='content-disposition') == 'audio_file')
+        duration = soundfile.info(io.BytesIO(audio)).duration
+        time.sleep(duration * self.options.asr_ms_per_sec / 1000)
+        payload = json.dumps({'text': "你好"}, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def make_recording(path, seconds, silence, sr=48000):
+    # 浏览器录音的典型格式: 48 kHz 立体声 16 位; 中间是带谐波和音节起伏的"语音", 首尾是底噪
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sr)) / sr
+    voice = sum(np.sin(2 * np.pi * 180 * k * t) / k for k in range(1, 6)) * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)) * 0.2
+    gap = rng.normal(0, 0.0005, int(silence * sr))
+    y = np.concatenate((gap, voice + rng.normal(0, 0.0005, len(t)), gap))
+    soundfile.write(path, np.stack((y, y), axis=1), sr, subtype='PCM_16')
+
+def main():
+    parser = argparse.ArgumentParser(description="语音识别预处理测试")
+    parser.add_argument('--port', type=int, default=9991)
+    parser.add_argument('--seconds', type=float, default=8.0, help="有声部分时长")
+    parser.add_argument('--silence', type=float, default=1.5, help="首尾各有多长的静音")
+    parser.add_argument('--upload-kbps', type=float, default=1024.0, help="上传速率 (KB/s)")
+    parser.add_argument('--asr-ms-per-sec', type=float, default=50.0, help="每秒音频的识别耗时")
+    parser.add_argument('--format', default='flac', choices=('flac', 'wav'))
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    StubHandler.options = args
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    work_dir = tempfile.mkdtemp(prefix="bench_stt_")
+    recording = os.path.join(work_dir, "recording.wav")
+    make_recording(recording, args.seconds, args.silence)
+
+    stt = SpeechToText("Whisper")
+    private_config(stt, {'whisper': {'url': f"http://127.0.0.1:{args.port}/asr"}})
+    stt.preprocessor.output_dir = work_dir
+    stt.preprocessor.format = args.format
+    stt.preprocessor.process(recording)  # 预热: librosa 第一次导入很慢, 不计入结果
+
+    print(f"录音 {args.seconds + 2 * args.silence:.1f}s (首尾静音各 {args.silence:.1f}s), 48 kHz 立体声 {os.path.getsize(recording)} 字节; 上传 {args.upload_kbps:.0f} KB/s")
+    try:
+        for name, enabled in (("原样上传", False), (f"预处理 ({args.format})", True)):
+            stt.preprocess_enabled = enabled
+            stt.preprocessor.files = stt.preprocessor.bytes_before = stt.preprocessor.bytes_after = 0
+            stt.preprocessor.total_time = 0.0
+            stt.requests, stt.total_time = 0, 0.0
+            for _ in range(args.runs):
+                stt.transcribe(recording)
+            stats = stt.stats()
+            preprocess = stats['preprocess']
+            uploaded = preprocess['bytes_after'] // preprocess['files'] if enabled else os.path.getsize(recording)
+            extra = f", 预处理 {preprocess['avg_time'] * 1000:.0f} ms" if enabled else ""
+            print(f"{name}: 上传 {uploaded} 字节, 平均转写耗时 {stats['avg_latency'] * 1000:.0f} ms{extra}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
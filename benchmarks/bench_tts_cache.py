@@ -0,0 +1,105 @@
+# 语音缓存测试: 本地桩服务器模拟 ChatTTS, 按 Zipf 分布重放一批台词(少数问候语和固定回答占大部分), 对比不开缓存和开缓存的平均合成耗时
+# 运行: python benchmarks/bench_tts_cache.py [--requests 300] [--phrases 40] [--zipf 1.2] [--tts-ms 400] [--max-mb 256]
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from addon_package import load_module, private_config
+
+TextToSpeech = load_module('text_to_speech').TextToSpeech
+AudioCache = load_module('tts_cache').AudioCache
+
+logging.getLogger().setLevel(logging.WARNING)
+
+class StubHandler(BaseHTTPRequestHandler):
+    # POST /tts: 等待 --tts-ms 后按 ChatTTS 的格式返回音频地址; GET /audio/<名称>: 返回音频内容
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    options = None
+    calls = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length'] or 0))
+        StubHandler.calls += 1
+        time.sleep(self.options.tts_ms / 1000)
+        name = f"{time.monotonic_ns()}_{threading.get_ident()}.wav"
+        port = self.server.server_address[1]
+        payload = json.dumps({'code': 0, 'msg': 'ok', 'audio_files': [{'url': f"http://127.0.0.1:{port}/audio/{name}"}]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        payload = b"RIFF" + b"\0" * (self.options.audio_kb * 1024)
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/wav')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def workload(args):
+    rng = random.Random(args.seed)
+    phrases = [f"第{i}条台词，欢迎来到直播间。" for i in range(args.phrases)]
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(args.phrases)]
+    return rng.choices(phrases, weights, k=args.requests)
+
+def run(tts, texts, output_dir):
+    StubHandler.calls = 0
+    start = time.perf_counter()
+    for text in texts:
+        tts.synthesize(text, output_dir=output_dir)
+    return time.perf_counter() - start, StubHandler.calls
+
+def main():
+    parser = argparse.ArgumentParser(description="语音缓存测试")
+    parser.add_argument('--port', type=int, default=9994)
+    parser.add_argument('--requests', type=int, default=300, help="合成请求数")
+    parser.add_argument('--phrases', type=int, default=40, help="不同台词的数量")
+    parser.add_argument('--zipf', type=float, default=1.2, help="Zipf 分布的指数, 越大重复越集中")
+    parser.add_argument('--tts-ms', type=float, default=400.0, help="每次合成请求的耗时")
+    parser.add_argument('--audio-kb', type=int, default=256, help="每段音频的大小")
+    parser.add_argument('--max-mb', type=float, default=256.0, help="缓存大小上限")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    StubHandler.options = args
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    work_dir = tempfile.mkdtemp(prefix="bench_tts_cache_")
+    output_dir = os.path.join(work_dir, "Voice")
+    texts = workload(args)
+
+    tts = TextToSpeech("ChatTTS")
+    private_config(tts, {'chattts': {'url': f"http://127.0.0.1:{args.port}/tts"}})
+    tts.cache = AudioCache(os.path.join(work_dir, "tts"), int(args.max_mb * 1024 * 1024))
+
+    print(f"{args.requests} 个请求, {len(set(texts))} 条不同台词, 合成 {args.tts_ms:.0f} ms, 音频 {args.audio_kb} KB, 缓存上限 {args.max_mb:.0f} MB")
+    try:
+        tts.cache_enabled = False
+        elapsed, calls = run(tts, texts, output_dir)
+        print(f"不开缓存: {elapsed:.2f}s, 平均 {elapsed / args.requests * 1000:.1f} ms, 调用 ChatTTS {calls} 次")
+        tts.cache_enabled = True
+        elapsed, calls = run(tts, texts, output_dir)
+        stats = tts.cache.stats()
+        print(f"开缓存: {elapsed:.2f}s, 平均 {elapsed / args.requests * 1000:.1f} ms, 调用 ChatTTS {calls} 次")
+        print(f"命中率 {stats['hit_rate']:.1%} ({stats['hits']}/{stats['hits'] + stats['misses']}), 节省 {stats['bytes_saved'] / 1048576:.1f} MB, 缓存占用 {(stats['size'] or 0) / 1048576:.1f} MB")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
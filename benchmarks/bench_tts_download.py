@@ -0,0 +1,94 @@
+# 音频下载测试: 本地桩服务器模拟 ChatTTS 一次返回多个音频文件, 每个文件按固定的首字节延迟和速率发送, 对比逐个下载和并行下载的合成总耗时
+# 运行: python benchmarks/bench_tts_download.py [--files 6] [--file-kb 512] [--latency-ms 80] [--kbps 4096] [--workers 4] [--runs 3]
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from addon_package import load_module, private_config
+
+TextToSpeech = load_module('text_to_speech').TextToSpeech
+
+logging.getLogger().setLevel(logging.WARNING)
+
+class StubHandler(BaseHTTPRequestHandler):
+    # POST /tts: 立即返回 --files 个音频地址; GET /audio/<名称>: 等待 --latency-ms 后按 --kbps 的速率分块发送
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    options = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length'] or 0))
+        port = self.server.server_address[1]
+        stamp = time.monotonic_ns()
+        urls = [{'url': f"http://127.0.0.1:{port}/audio/{stamp}_{index}.wav"} for index in range(self.options.files)]
+        payload = json.dumps({'code': 0, 'msg': 'ok', 'audio_files': urls}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        size = self.options.file_kb * 1024
+        chunk = 64 * 1024
+        time.sleep(self.options.latency_ms / 1000)
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/wav')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        for offset in range(0, size, chunk):
+            length = min(chunk, size - offset)
+            self.wfile.write(b"\0" * length)
+            time.sleep(length / 1024 / self.options.kbps)
+
+def run(tts, output_dir, runs):
+    results = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        audio_files = tts.synthesize("你好", output_dir=output_dir)
+        results.append(time.perf_counter() - start)
+    return sorted(results)[len(results) // 2], audio_files
+
+def main():
+    parser = argparse.ArgumentParser(description="音频下载测试")
+    parser.add_argument('--port', type=int, default=9992)
+    parser.add_argument('--files', type=int, default=6, help="每次合成返回的音频文件数")
+    parser.add_argument('--file-kb', type=int, default=512, help="每个音频文件的大小")
+    parser.add_argument('--latency-ms', type=float, default=80.0, help="每个文件的首字节延迟")
+    parser.add_argument('--kbps', type=float, default=4096.0, help="每个连接的下载速率 (KB/s)")
+    parser.add_argument('--workers', type=int, default=4, help="并行下载的线程数")
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    StubHandler.options = args
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    output_dir = tempfile.mkdtemp(prefix="bench_tts_download_")
+
+    print(f"每次合成 {args.files} 个文件 x {args.file_kb} KB, 首字节 {args.latency_ms:.0f} ms, 每个连接 {args.kbps:.0f} KB/s")
+    try:
+        for name, workers in (("逐个下载", 1), (f"并行下载 ({args.workers} 线程)", args.workers)):
+            tts = TextToSpeech("ChatTTS")
+            private_config(tts, {'chattts': {'url': f"http://127.0.0.1:{args.port}/tts", 'download_workers': workers}})
+            tts.cache_enabled = False
+            elapsed, audio_files = run(tts, output_dir, args.runs)
+            in_order = [os.path.basename(path).split('_')[1] for path in audio_files] == [f"{index}.wav" for index in range(args.files)]
+            leftovers = [name for name in os.listdir(output_dir) if name.endswith('.part')]
+            print(f"{name}: {elapsed:.2f}s (中位数, {args.runs} 次), 文件 {len(audio_files)} 个, 顺序{'正确' if in_order else '错误'}, 残留临时文件 {len(leftovers)} 个")
+    finally:
+        server.shutdown()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
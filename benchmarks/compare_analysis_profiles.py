@@ -0,0 +1,79 @@
+# 分析配置对比工具: 以 standard 为基准, 报告其它配置在一组WAV文件上的口型一致率和加速比
+# 运行: python benchmarks/compare_analysis_profiles.py [--profile fast] 文件或目录...
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lip_sync_core import LipSyncCore, ANALYSIS_PROFILES
+
+logging.getLogger("LipSyncLogger").setLevel(logging.WARNING)
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.lower().endswith('.wav'))
+        else:
+            files.append(path)
+    return files
+
+def timed_analysis(core, audio_file):
+    start = time.perf_counter()
+    visemes = core.analyze_audio(audio_file)
+    return visemes, time.perf_counter() - start
+
+def compare(audio_file, reference, candidate):
+    expected, reference_time = timed_analysis(reference, audio_file)
+    result, candidate_time = timed_analysis(candidate, audio_file)
+    count = min(len(expected), len(result))
+    expected_visemes = [viseme for _, viseme, _ in expected[:count]]
+    result_visemes = [viseme for _, viseme, _ in result[:count]]
+    return {
+        'frames': count,
+        'same_viseme': sum(a == b for a, b in zip(expected_visemes, result_visemes)),
+        'same_voicing': sum((a is None) == (b is None) for a, b in zip(expected_visemes, result_visemes)),
+        'strength_error': float(np.mean([abs(a[2] - b[2]) for a, b in zip(expected[:count], result[:count])])) if count else 0.0,
+        'reference_time': reference_time,
+        'candidate_time': candidate_time,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="对比分析配置的口型一致率和速度")
+    parser.add_argument('paths', nargs='+', help="WAV文件或包含WAV文件的目录")
+    parser.add_argument('--profile', default='fast', choices=[name for name in ANALYSIS_PROFILES if name != 'standard'])
+    parser.add_argument('--frame-rate', type=float, default=24.0)
+    parser.add_argument('--language', default='chinese', choices=['chinese', 'english'])
+    args = parser.parse_args()
+
+    reference = LipSyncCore(frame_rate=args.frame_rate, language=args.language, profile='standard')
+    candidate = LipSyncCore(frame_rate=args.frame_rate, language=args.language, profile=args.profile)
+    files = collect_files(args.paths)
+    if not files:
+        sys.exit("没有找到WAV文件")
+
+    # 预热 numba JIT, 避免第一次分析的编译时间计入对比
+    reference.analyze_audio(files[0])
+    candidate.analyze_audio(files[0])
+
+    totals = {'frames': 0, 'same_viseme': 0, 'same_voicing': 0, 'reference_time': 0.0, 'candidate_time': 0.0}
+    print(f"{'文件':<32} {'帧数':>8} {'口型一致':>8} {'有声一致':>8} {'强度误差':>8} {'加速比':>7}")
+    for audio_file in files:
+        stats = compare(audio_file, reference, candidate)
+        for key in totals:
+            totals[key] += stats[key]
+        frames = max(stats['frames'], 1)
+        print(f"{os.path.basename(audio_file):<32} {stats['frames']:>8} {stats['same_viseme'] / frames:>8.1%} "
+              f"{stats['same_voicing'] / frames:>8.1%} {stats['strength_error']:>8.3f} "
+              f"{stats['reference_time'] / stats['candidate_time']:>6.2f}x")
+
+    frames = max(totals['frames'], 1)
+    print(f"合计 {len(files)} 个文件, {totals['frames']} 帧: standard {totals['reference_time']:.2f}s, "
+          f"{args.profile} {totals['candidate_time']:.2f}s, 加速比 {totals['reference_time'] / totals['candidate_time']:.2f}x")
+    print(f"口型一致率 {totals['same_viseme'] / frames:.1%}, 有声/静音一致率 {totals['same_voicing'] / frames:.1%}")
+
+if __name__ == "__main__":
+    main()
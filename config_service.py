@@ -0,0 +1,146 @@
+import os
+import json
+import logging
+import weakref
+import threading
+
+# 全插件共用的配置: config.json 只解析一次, 之后读取的都是内存里的对象; 后台线程定期检查修改时间, 文件变化后重新加载并通知订阅者
+# 插件内的模块一律按包内相对路径导入本模块 (from .config_service import config_service), 经由 sys.path 导入会得到另一个实例
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.json')
+
+NUMBER = (int, float)
+# 段名 -> {键: (允许的类型, 是否必填)}; 段本身可以省略, 出现的段必须满足这里的要求, 未列出的键不检查
+CONFIG_SCHEMA = {
+    'openai': {'api_key': (str, True), 'url': (str, False), 'model': (str, False), 'max_tokens': (int, False)},
+    'ollama': {'url': (str, True), 'model': (str, True)},
+    'dify': {'url': (str, True), 'api_key': (str, True)},
+    'whisper': {'url': (str, True)},
+    'stt_preprocess': {'enabled': (bool, False), 'sample_rate': (int, False), 'top_db': (NUMBER, False),
+                       'pad_ms': (NUMBER, False), 'format': (str, False)},
+    'chattts': {'url': (str, True), 'download_workers': (int, False)},
+    'http': {'connect_timeout': (NUMBER, False), 'read_timeout': (NUMBER, False), 'pool_maxsize': (int, False),
+             'retries': (int, False), 'backoff_factor': (NUMBER, False)},
+    'tts_cache': {'enabled': (bool, False), 'max_bytes': (int, False)},
+    'llm_cache': {'ttl': (NUMBER, False), 'max_entries': (int, False), 'backends': (dict, False)},
+    'pipeline': {'queue_size': (int, False), 'submit_timeout': (NUMBER, False), 'workers': (dict, False),
+                 'script_chunk_chars': (int, False)},
+}
+
+class ConfigError(ValueError):
+    pass
+
+def validate_config(config, schema=CONFIG_SCHEMA):
+    if not isinstance(config, dict):
+        raise ConfigError("配置文件的顶层必须是对象")
+    problems = []
+    for section, keys in schema.items():
+        if section not in config:
+            continue
+        values = config[section]
+        if not isinstance(values, dict):
+            problems.append(f"{section} 必须是对象")
+            continue
+        for key, (types, required) in keys.items():
+            if key not in values:
+                if required:
+                    problems.append(f"缺少 {section}.{key}")
+            elif not isinstance(values[key], types) or (isinstance(values[key], bool) and types is not bool):
+                problems.append(f"{section}.{key} 的类型不正确: {values[key]!r}")
+    if problems:
+        raise ConfigError("; ".join(problems))
+    return config
+
+class ConfigService:
+    def __init__(self, path=CONFIG_PATH, schema=CONFIG_SCHEMA, poll_interval=2.0):
+        self.path = path
+        self.schema = schema
+        self.poll_interval = poll_interval
+        self.reloads = 0
+        self._config = None
+        self._mtime = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def get(self, section=None):
+        # 热路径只读内存, 不访问磁盘; 返回的字典是共享的, 不要修改
+        config = self._config
+        if config is None:
+            config = self._load_initial()
+        return config.get(section, {}) if section else config
+
+    def subscribe(self, callback):
+        # callback(新配置) 在配置重新加载后调用; 绑定方法只保存弱引用, 服务对象被丢弃后自动退订
+        ref = weakref.WeakMethod(callback) if hasattr(callback, '__self__') else (lambda: callback)
+        with self._lock:
+            self._subscribers.append(ref)
+
+    def reload(self):
+        # 解析失败时保留上一次的配置, 文件修好后会再次重新加载
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logging.error(f"无法读取配置文件: {str(e)}")
+            return False
+        try:
+            config = self._read()
+        except (OSError, ValueError) as e:
+            logging.error(f"重新加载配置失败, 继续使用原来的配置: {str(e)}")
+            self._mtime = mtime  # 同一次修改只报告一次
+            return False
+        with self._lock:
+            self._config = config
+            self._mtime = mtime
+            self.reloads += 1
+            subscribers = list(self._subscribers)
+        logging.info(f"配置已重新加载: {self.path}")
+        for ref in subscribers:
+            callback = ref()
+            if callback is None:
+                with self._lock:
+                    self._subscribers.remove(ref)
+                continue
+            try:
+                callback(config)
+            except Exception as e:
+                logging.error(f"通知配置变化时出错: {str(e)}")
+        return True
+
+    def stop(self):
+        # 停止检查线程并丢弃缓存, 插件重新启用后第一次读取时重新加载
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._config = None
+        if thread is not None:
+            self._stop_event.set()
+            thread.join(timeout=self.poll_interval + 1)
+
+    def _read(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return validate_config(json.load(f), self.schema)
+
+    def _load_initial(self):
+        with self._lock:
+            if self._config is None:
+                self._mtime = os.stat(self.path).st_mtime_ns
+                self._config = self._read()
+                logging.info(f"配置已加载: {self.path}")
+            if self._thread is None:
+                # 第一次读取配置时才启动检查线程
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._watch, name="ConfigWatcher", daemon=True)
+                self._thread.start()
+            return self._config
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                continue
+            if mtime != self._mtime:
+                self.reload()
+
+config_service = ConfigService()
@@ -1,114 +1,164 @@
 import logging
-import openai
-import requests
 import json
-import subprocess
-import os
+from contextlib import closing
+from .http_client import get_client
+from .config_service import config_service
+from .response_cache import ResponseCache
+
+OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+# backends 按后端分别开关; 有效期内相同的问题直接复用上次的回复
+CACHE_DEFAULTS = {'ttl': 30.0, 'max_entries': 256, 'backends': {'OpenAI': True, 'Ollama': True, 'Dify': True}}
+
+def iter_sse(response):
+    # 边接收边解析 Server-Sent Events, 每遇到空行交出一个事件的 data; event/id 字段和注释行不需要
+    data = []
+    for line in response.iter_lines():
+        line = line.decode('utf-8')
+        if not line:
+            if data:
+                yield "\n".join(data)
+                data = []
+        elif line.startswith('data:'):
+            data.append(line[6:] if line.startswith('data: ') else line[5:])
+    if data:
+        yield "\n".join(data)
+
+def check_response(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text[:500]}")
 
 class ContentGenerator:
     def __init__(self, default_method="Ollama"):
         self.default_method = default_method
-        self.config = self._load_config()
+        # 共用的配置只解析一次, config.json 修改后通过订阅拿到新的配置, 不需要重新创建服务
+        self.config = config_service.get()
+        config_service.subscribe(self._config_changed)
+        self.http = get_client()
+        cache_config = self._cache_config(self.config)
+        self.cache = ResponseCache(cache_config['ttl'], cache_config['max_entries'])
+
+    def _config_changed(self, config):
+        self.config = config
+        cache_config = self._cache_config(config)
+        self.cache.ttl = cache_config['ttl']
+        self.cache.max_entries = cache_config['max_entries']
+        self.cache.clear()  # 模型或服务地址可能变了, 旧的回复不再可信
 
-    def _load_config(self):
-        config_path = os.path.join(os.path.dirname(__file__), 'config.json')
-        with open(config_path, 'r') as f:
-            return json.load(f)
+    def _cache_config(self, config):
+        cache_config = {**CACHE_DEFAULTS, **config.get('llm_cache', {})}
+        cache_config['backends'] = {**CACHE_DEFAULTS['backends'], **cache_config['backends']}
+        return cache_config
 
-    def generate(self, text, method=None):
+    def _cache_key(self, method, text):
+        # Dify 没有模型名, 用应用的 API key 区分不同的应用
+        config = self.config.get(method.lower(), {})
+        if method == "Dify":
+            model = (config.get('url'), config.get('api_key'))
+        else:
+            model = (config.get('url'), config.get('model'))
+        return (method, model, text)
+
+    def stream(self, text, method=None):
+        # 返回逐段产出回复文本的迭代器, 收到第一段就可以开始下游的处理; 网络或接口错误在迭代时抛出
+        # 开启缓存时必须把迭代器读完或关闭, 相同问题的其他请求在等待这一次的结果
         method = method or self.default_method
+        if method in ("OpenAI", "Ollama", "Dify") and self._cache_config(self.config)['backends'].get(method):
+            return self.cache.stream(self._cache_key(method, text), lambda: self._stream(text, method))
+        return self._stream(text, method)
+
+    def _stream(self, text, method):
         if method == "OpenAI":
-            return self._generate_openai(text)
+            return self._stream_openai(text)
         elif method == "Ollama":
-            return self._generate_ollama(text)
+            return self._stream_ollama(text)
         elif method == "Dify":
-            return self._generate_dify(text)
+            return self._stream_dify(text)
         else:
             raise ValueError(f"Unsupported content generation method: {method}")
 
-    def _generate_openai(self, text):
-        logging.info("使用OpenAI生成内容")
+    def generate(self, text, method=None, on_token=None):
+        # 读完 stream() 返回完整回复, 出错时返回 None; on_token(片段) 在每收到一段文本时调用
+        method = method or self.default_method
+        chunks = self.stream(text, method)
+        logging.info(f"使用{method}生成内容")
+        full_response = ""
         try:
-            openai.api_key = self.config['openai']['api_key']
-            response = openai.Completion.create(
-                engine="text-davinci-002",
-                prompt=text,
-                max_tokens=100
-            )
-            generated_content = response.choices[0].text.strip()
-            logging.info(f"生成的内容: {generated_content}")
-            return generated_content
+            with closing(chunks):
+                for chunk in chunks:
+                    full_response += chunk
+                    if on_token:
+                        on_token(chunk)
         except Exception as e:
-            logging.error(f"使用OpenAI生成内容时出错: {str(e)}")
+            logging.error(f"使用{method}生成内容时出错: {str(e)}")
             return None
+        logging.info(f"生成的内容: {full_response}")
+        return full_response
 
-    def _generate_ollama(self, text):
-        logging.info("使用Ollama生成内容")
-        try:
-            response = requests.post(
-                self.config['ollama']['url'], 
-                json={'model': self.config['ollama']['model'], 'prompt': text},
-                stream=True
-            )
-            if response.status_code == 200:
-                full_response = ""
-                for line in response.iter_lines():
-                    if line:
-                        json_response = json.loads(line)
-                        if 'response' in json_response:
-                            full_response += json_response['response']
-                        if json_response.get('done', False):
-                            break
-                logging.info(f"生成的内容: {full_response}")
-                return full_response
-            else:
-                logging.error(f"使用Ollama生成内容时出错: {response.text}")
-                return None
-        except Exception as e:
-            logging.error(f"使用Ollama生成内容时出错: {str(e)}")
-            return None
+    def _stream_openai(self, text):
+        config = self.config['openai']
+        payload = {
+            'model': config.get('model', 'gpt-4o-mini'),
+            'messages': [{'role': 'user', 'content': text}],
+            'stream': True
+        }
+        if 'max_tokens' in config:
+            payload['max_tokens'] = config['max_tokens']
+        with self.http.post(
+            config.get('url', OPENAI_URL),
+            json=payload,
+            headers={'Authorization': f"Bearer {config['api_key']}"},
+            stream=True
+        ) as response:
+            check_response(response)
+            # 读到流的结尾而不是中途 break, 连接才能回到连接池复用
+            for data in iter_sse(response):
+                if data == '[DONE]':
+                    continue
+                choices = json.loads(data).get('choices')
+                content = choices[0].get('delta', {}).get('content') if choices else None
+                if content:
+                    yield content
 
-    def _generate_dify(self, text):
-        logging.info("使用Dify Agent生成内容")
-        url = self.config['dify']['url']
-        api_key = self.config['dify']['api_key']
-        
+    def _stream_ollama(self, text):
+        with self.http.post(
+            self.config['ollama']['url'],
+            json={'model': self.config['ollama']['model'], 'prompt': text},
+            stream=True
+        ) as response:
+            check_response(response)
+            # 每行一个 JSON 对象
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                json_response = json.loads(line)
+                if 'error' in json_response:
+                    raise RuntimeError(json_response['error'])
+                if json_response.get('response'):
+                    yield json_response['response']
+
+    def _stream_dify(self, text):
         data = {
             "query": text,
             "user": "user123",
             "inputs": {},
             "response_mode": "streaming"
         }
-        
-        curl_command = [
-            'curl', '-X', 'POST', url,
-            '-H', 'Content-Type: application/json',
-            '-H', f'Authorization: Bearer {api_key}',
-            '-d', json.dumps(data)
-        ]
-        
-        try:
-            result = subprocess.run(curl_command, capture_output=True, text=True)
-            logging.debug(f"Curl command output: {result.stdout}")
-            logging.debug(f"Curl command error: {result.stderr}")
-            
-            if result.returncode == 0:
-                response_lines = result.stdout.split('\n')
-                full_response = ""
-                for line in response_lines:
-                    if line.startswith("data: "):
-                        try:
-                            data = json.loads(line[6:])
-                            if data['event'] == 'agent_message':
-                                full_response += data['answer']
-                        except json.JSONDecodeError:
-                            logging.warning(f"无法解析JSON: {line}")
-                
-                logging.info(f"生成的内容: {full_response}")
-                return full_response
-            else:
-                logging.error(f"使用Dify Agent生成内容时出错: {result.stderr}")
-                return None
-        except Exception as e:
-            logging.error(f"执行curl命令时出错: {str(e)}")
-            return None
\ No newline at end of file
+        with self.http.post(
+            self.config['dify']['url'],
+            json=data,
+            headers={'Authorization': f"Bearer {self.config['dify']['api_key']}"},
+            stream=True
+        ) as response:
+            check_response(response)
+            for data in iter_sse(response):
+                try:
+                    event = json.loads(data)
+                except json.JSONDecodeError:
+                    logging.warning(f"无法解析JSON: {data}")
+                    continue
+                # Agent 应用推送 agent_message, 聊天应用推送 message
+                if event.get('event') in ('agent_message', 'message'):
+                    if event.get('answer'):
+                        yield event['answer']
+                elif event.get('event') == 'error':
+                    raise RuntimeError(event.get('message', data))
@@ -1,74 +1,268 @@
 import bpy
+import os
+import time
+import queue
+import shutil
 import logging
+import tempfile
 import threading
 from bpy_extras.io_utils import ImportHelper
 from .file_handler import FileHandlerServer
 from .speech_to_text import SpeechToText
 from .content_generator import ContentGenerator
 from .text_to_speech import TextToSpeech
+from .job_scheduler import JobScheduler, OrderedStreams
+from .job_registry import job_registry
+from .event_stream import EventBroadcaster
+from .speech_pipeline import SentencePipeline, split_script, synthesize_chunks
+from .config_service import config_service
 
 # 设置日志
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+ADDON_DIR = os.path.dirname(__file__)
+VOICE_DIR = os.path.join(ADDON_DIR, "Voice")
+# 合成好的音频先放在暂存目录, 按请求顺序移动到 Voice, 与 Voice 在同一磁盘上以保证移动是原子的
+STAGING_DIR = os.path.join(ADDON_DIR, "Cache", "staging")
+
+PIPELINE_DEFAULTS = {
+    'queue_size': 8,
+    'submit_timeout': 5.0,
+    'workers': {'transcribe': 1, 'generate': 1, 'synthesize': 1},
+    'script_chunk_chars': 120,  # 文本文件按句子拼成不超过这么多字的块, 每块一次合成请求
+}
+
+def load_pipeline_config():
+    config = {**PIPELINE_DEFAULTS, 'workers': dict(PIPELINE_DEFAULTS['workers'])}
+    section = config_service.get('pipeline')
+    config['workers'].update(section.get('workers', {}))
+    config.update({key: value for key, value in section.items() if key != 'workers'})
+    return config
+
 class ContentManager:
     def __init__(self):
         self.file_handler = None
-        self.speech_to_text = SpeechToText("Whisper")
-        self.content_generator = ContentGenerator("Ollama")
-        self.text_to_speech = TextToSpeech("ChatTTS")
+        self.events = None
+        # 服务在第一次使用时才创建(读取配置、导入网络库), 插件注册时不做任何耗时操作
+        self._speech_to_text_method = "Whisper"
+        self._content_generation_method = "Ollama"
+        self._text_to_speech_method = "ChatTTS"
+        self._speech_to_text = None
+        self._content_generator = None
+        self._text_to_speech = None
+        # 流水线、逐句合成和文本文件的工作线程可能同时第一次用到某个服务, 创建服务和切换方法都要持有这个锁
+        self._services_lock = threading.Lock()
+        self._scheduler = None
+        self._scheduler_lock = threading.Lock()
+        self._submit_timeout = None
+        self._submit_lock = threading.Lock()
+        self._sentence_pipeline = None
+        # 合成好的音频(整段回复或逐句的片段)按请求顺序、句子顺序移动到 Voice
+        self._clip_streams = OrderedStreams(self._deliver_clip)
+        # 文本文件的音频按文件顺序、块顺序交付, 与监听到的请求互不等待
+        self._script_streams = OrderedStreams(self._deliver_clip)
+        self.script_progress = None
         self.processing_thread = None
 
+    @property
+    def speech_to_text(self):
+        service = self._speech_to_text
+        if service is None:
+            with self._services_lock:
+                if self._speech_to_text is None:
+                    self._speech_to_text = SpeechToText(self._speech_to_text_method)
+                service = self._speech_to_text
+        return service
+
+    @property
+    def content_generator(self):
+        service = self._content_generator
+        if service is None:
+            with self._services_lock:
+                if self._content_generator is None:
+                    self._content_generator = ContentGenerator(self._content_generation_method)
+                service = self._content_generator
+        return service
+
+    @property
+    def text_to_speech(self):
+        service = self._text_to_speech
+        if service is None:
+            with self._services_lock:
+                if self._text_to_speech is None:
+                    self._text_to_speech = TextToSpeech(self._text_to_speech_method)
+                service = self._text_to_speech
+        return service
+
     def start_listening(self, port):
         if self.file_handler:
             self.stop_listening()
-        self.file_handler = FileHandlerServer(callback=self.handle_input, port=port)
-        return self.file_handler.start()
+        # 任务进度通过 SSE 推送给前端: 登记表的每次状态变化和生成的文本片段都转发给事件推送
+        self.events = EventBroadcaster(snapshot=job_registry.get)
+        job_registry.add_listener(self.events.publish)
+        self.file_handler = FileHandlerServer(callback=self.handle_input, status_provider=job_registry.get, events=self.events, port=port)
+        if self.file_handler.start():
+            return True
+        job_registry.remove_listener(self.events.publish)
+        self.file_handler = None
+        self.events = None
+        return False
 
     def stop_listening(self):
         if self.file_handler:
             self.file_handler.stop()
             self.file_handler = None
+        if self.events:
+            job_registry.remove_listener(self.events.publish)
+            self.events = None
 
     def is_listening(self):
         return self.file_handler is not None and self.file_handler.is_running()
 
+    @property
+    def scheduler(self):
+        with self._scheduler_lock:
+            if self._scheduler is None:
+                config = load_pipeline_config()
+                workers = config['workers']
+                self._submit_timeout = config['submit_timeout']
+                self._scheduler = JobScheduler([
+                    ('transcribe', self._transcribe_stage, workers['transcribe']),
+                    ('generate', self._generate_stage, workers['generate']),
+                    ('synthesize', self._synthesize_stage, workers['synthesize']),
+                ], deliver=self._deliver_audio, queue_size=config['queue_size'])
+                self._sentence_pipeline = SentencePipeline(workers=workers['synthesize'])
+            return self._scheduler
+
+    def pipeline_stats(self):
+        if not self._scheduler:
+            return None
+        # 三个服务共用同一个 HTTP 客户端, 任取一个已经创建的服务读取连接统计
+        services = [service for service in (self._speech_to_text, self._content_generator, self._text_to_speech) if service]
+        return {**self._scheduler.stats(), 'buffered_clips': self._clip_streams.pending(),
+                'http': services[0].http.stats() if services else None,
+                'tts_cache': self._text_to_speech.cache.stats() if self._text_to_speech else None,
+                'llm_cache': self._content_generator.cache.stats() if self._content_generator else None,
+                'stt': self._speech_to_text.stats() if self._speech_to_text else None}
+
     def handle_input(self, input_data):
+        # 只负责排队, 转写、生成和合成都在调度器的工作线程中进行; 返回任务ID, 队列已满时返回 None
         logging.info(f"Received input: {input_data}")
-        self.process_input(input_data)
-
-    def process_input(self, input_data):
+        job_id = job_registry.create()
+        scene = bpy.context.scene
+        job = {'job_id': job_id, 'input': input_data, 'method': scene.content_generation,
+               'pipelined': scene.sentence_pipelining, 'received': time.monotonic()}
+        scheduler = self.scheduler
+        with self._submit_lock:
+            # 音频流的序号和调度器的序号按同一顺序分配
+            job['stream'] = self._clip_streams.open()
+            try:
+                scheduler.submit(job, timeout=self._submit_timeout)
+            except queue.Full:
+                logging.error("任务队列已满, 丢弃本次输入")
+                self._clip_streams.finish(job['stream'], 0)
+                job_registry.fail(job_id, "任务队列已满")
+                return None
+        return job_id
+
+    def _transcribe_stage(self, job):
+        input_data = job['input']
         if input_data['type'] == 'audio':
-            text = self.speech_to_text.transcribe(input_data['filename'])
+            try:
+                job['text'] = self.speech_to_text.transcribe(input_data['filename'])
+            finally:
+                if input_data.get('spooled'):
+                    # 服务器暂存的上传文件转写后就不再需要
+                    os.remove(input_data['filename'])
         elif input_data['type'] == 'text':
-            text = input_data['content']
+            job['text'] = input_data['content']
         else:
             logging.error(f"Unsupported input type: {input_data['type']}")
-            return
-
-        if text:
-            current_method = bpy.context.scene.content_generation
-            generated_content = self.content_generator.generate(text, current_method)
-            if generated_content:
-                self.generate_speech(generated_content)
-            else:
-                logging.error("未能生成内容")
-        else:
+            return None
+        if not job['text']:
             logging.error("未能获取文本")
-
-    def generate_speech(self, text):
-        audio_files = self.text_to_speech.synthesize(text)
-        if audio_files:
-            logging.info(f"生成的音频文件: {audio_files}")
+            return None
+        job_registry.mark(job['job_id'], 'transcribed', text=job['text'])
+        return job
+
+    def _generate_stage(self, job):
+        on_token = lambda token: job_registry.publish(job['job_id'], 'token', {'text': token})
+        if job['pipelined']:
+            # 逐句合成: 模型每输出一句就交给合成线程, 合成阶段只需等这些句子合成完
+            job['content'], job['clips'] = self._sentence_pipeline.run(
+                lambda handle_token: self.content_generator.generate(job['text'], job['method'], on_token=handle_token),
+                lambda index, sentence: self._synthesize_clip(job, sentence),
+                lambda index, clip: self._clip_streams.put(job['stream'], index, clip),
+                on_token=on_token)
         else:
+            job['content'] = self.content_generator.generate(job['text'], job['method'], on_token=on_token)
+        if not job['content']:
+            logging.error("未能生成内容")
+            return None
+        job_registry.mark(job['job_id'], 'generated', content=job['content'])
+        return job
+
+    def _synthesize_stage(self, job):
+        if job['pipelined']:
+            clips = [future.result() for future in job['clips']]
+            if not any(clips):
+                logging.error("未能生成音频文件")
+                return None
+            return job
+        job['clip'] = self._synthesize_clip(job, job['content'])
+        if job['clip'] is None:
             logging.error("未能生成音频文件")
-            bpy.app.timers.register(lambda: self.show_error_message("未能生成音频文件"))
+            return None
+        return job
+
+    def _synthesize_clip(self, job, text):
+        # 每段语音合成到自己的暂存目录, 交付时再整体移动到 Voice
+        os.makedirs(STAGING_DIR, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(dir=STAGING_DIR)
+        audio_files = self.text_to_speech.synthesize(text, output_dir=staging_dir)
+        if not audio_files:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return None
+        return {'job_id': job['job_id'], 'received': job['received'], 'staging_dir': staging_dir, 'audio_files': audio_files}
+
+    def _deliver_audio(self, job):
+        # 按提交顺序调用: 结束这个任务的音频流, 逐句合成的片段在合成时已经交给了音频流
+        waits = ", ".join(f"{name} {wait:.2f}s" for name, wait in job.waits.items())
+        payload = job.payload
+        if job.error:
+            logging.error(f"任务 {job.seq} 失败: {job.error} (排队等待: {waits})")
+            self._clip_streams.finish(payload['stream'], len(payload.get('clips', ())))
+            job_registry.fail(payload['job_id'], job.error)
+            bpy.app.timers.register(lambda: self.show_error_message(job.error))
+            return
+        if payload['pipelined']:
+            self._clip_streams.finish(payload['stream'], len(payload['clips']))
+        else:
+            self._clip_streams.put(payload['stream'], 0, payload['clip'])
+            self._clip_streams.finish(payload['stream'], 1)
+        job_registry.mark(payload['job_id'], 'synthesized')
+        logging.info(f"任务 {job.seq} 完成 (排队等待: {waits})")
+
+    def _deliver_clip(self, stream, index, clip):
+        # 按请求顺序、句子顺序调用: 把暂存的音频移动到 Voice, 唇形同步的文件夹监听会按这个顺序看到它们
+        if clip is None:
+            return
+        os.makedirs(VOICE_DIR, exist_ok=True)
+        delivered = [os.path.join(VOICE_DIR, os.path.basename(audio_file)) for audio_file in clip['audio_files']]
+        # 先登记音频文件, 唇形同步看到文件时才能找到对应的任务
+        job_registry.add_audio_files(clip['job_id'], delivered)
+        for audio_file, target in zip(clip['audio_files'], delivered):
+            os.replace(audio_file, target)
+        shutil.rmtree(clip['staging_dir'], ignore_errors=True)
+        logging.info(f"任务 {clip['job_id']} 第 {index + 1} 段音频已送达, 距收到请求 {time.monotonic() - clip['received']:.2f}s: {delivered}")
 
     def process_text_file(self, filepath):
+        parallelism = bpy.context.scene.script_parallelism
         def process_in_background():
             try:
                 with open(filepath, 'r', encoding='utf-8') as file:
                     text = file.read()
-                self.generate_speech(text)
+                self.synthesize_script(text, parallelism)
                 bpy.app.timers.register(self.update_ui)
             except Exception as e:
                 logging.error(f"处理文本文件时出错: {str(e)}")
@@ -77,6 +271,48 @@ class ContentManager:
         self.processing_thread = threading.Thread(target=process_in_background)
         self.processing_thread.start()
 
+    def synthesize_script(self, text, parallelism=4):
+        # 长文本切成句子大小的块, 最多 parallelism 个块同时合成; 合成好的块按顺序移动到 Voice, 唇形同步随即开始处理
+        chunks = split_script(text, load_pipeline_config()['script_chunk_chars'])
+        if not chunks:
+            raise ValueError("文本文件中没有可以合成的内容")
+        job_id = job_registry.create()
+        job = {'job_id': job_id, 'received': time.monotonic()}
+        job_registry.mark(job_id, 'generated', content=text)
+        stream = self._script_streams.open()
+        self.script_progress = {'job_id': job_id, 'done': 0, 'total': len(chunks), 'elapsed': None}
+        logging.info(f"开始合成文本文件: {len(text)} 字, {len(chunks)} 段, 并发 {parallelism}")
+
+        def on_progress(done, total):
+            self.script_progress['done'] = done
+            self.script_progress['elapsed'] = time.monotonic() - job['received']
+            job_registry.publish(job_id, 'progress', {'done': done, 'total': total})
+            logging.info(f"文本文件合成进度: {done}/{total}, 已用时 {self.script_progress['elapsed']:.1f}s")
+            bpy.app.timers.register(self.update_ui)
+
+        try:
+            clips = synthesize_chunks(
+                chunks,
+                lambda index, chunk: self._synthesize_clip(job, chunk),
+                lambda index, clip: self._script_streams.put(stream, index, clip),
+                workers=parallelism, on_progress=on_progress)
+        finally:
+            self._script_streams.finish(stream, len(chunks))
+        elapsed = time.monotonic() - job['received']
+        failed = clips.count(None)
+        if failed == len(clips):
+            job_registry.fail(job_id, "未能生成音频文件")
+            logging.error("未能生成音频文件")
+            bpy.app.timers.register(lambda: self.show_error_message("未能生成音频文件"))
+            return
+        job_registry.mark(job_id, 'synthesized')
+        message = f"文本文件合成完成: {len(clips) - failed}/{len(clips)} 段, 总用时 {elapsed:.1f}s"
+        if failed:
+            logging.warning(message)
+        else:
+            logging.info(message)
+        bpy.app.timers.register(lambda: self.show_success_message(message))
+
     def update_ui(self):
         for area in bpy.context.screen.areas:
             if area.type == 'VIEW_3D':
@@ -92,14 +328,33 @@ class ContentManager:
             self.layout.label(text=message)
         bpy.context.window_manager.popup_menu(draw, title="处理错误", icon='ERROR')
 
+    def shutdown(self):
+        self.stop_listening()
+        if self._scheduler:
+            self._scheduler.stop()
+            self._scheduler = None
+            self._sentence_pipeline.shutdown()
+            self._sentence_pipeline = None
+        config_service.stop()
+
+    # 切换后端只改服务使用的方法, 不重新创建服务, 也不访问磁盘
     def update_speech_to_text(self, method):
-        self.speech_to_text = SpeechToText(method)
+        with self._services_lock:
+            self._speech_to_text_method = method
+            if self._speech_to_text is not None:
+                self._speech_to_text.method = method
 
     def update_content_generation_method(self, method):
-        self.content_generator = ContentGenerator(method)
+        with self._services_lock:
+            self._content_generation_method = method
+            if self._content_generator is not None:
+                self._content_generator.default_method = method
 
     def update_text_to_speech(self, method):
-        self.text_to_speech = TextToSpeech(method)
+        with self._services_lock:
+            self._text_to_speech_method = method
+            if self._text_to_speech is not None:
+                self._text_to_speech.method = method
 
 content_manager = ContentManager()
 
@@ -123,11 +378,40 @@ class CONTENT_PT_panel(bpy.types.Panel):
             else:
                 layout.operator("content.toggle_listening", text="开始监听")
         else:
+            layout.prop(scene, "script_parallelism")
             layout.operator("content.select_and_process_text_file", text="Select and Process Text File")
+            progress = content_manager.script_progress
+            if progress:
+                elapsed = f", 用时 {progress['elapsed']:.1f}s" if progress['elapsed'] is not None else ""
+                layout.label(text=f"合成进度: {progress['done']}/{progress['total']}{elapsed}")
 
         layout.prop(scene, "speech_to_text")
         layout.prop(scene, "content_generation")
         layout.prop(scene, "text_to_speech")
+        layout.prop(scene, "sentence_pipelining")
+
+        stats = content_manager.pipeline_stats()
+        if stats:
+            box = layout.box()
+            box.label(text=f"任务队列 (等待按序交付: {stats['awaiting_delivery']} 个任务, {stats['buffered_clips']} 段音频)")
+            for name, stage in stats['stages'].items():
+                box.label(text=f"{name}: 排队 {stage['queue_depth']}, 平均等待 {stage['avg_wait']:.2f}s, 最长等待 {stage['max_wait']:.2f}s")
+            if stats['http']:
+                http = stats['http']
+                box.label(text=f"HTTP: {http['requests']} 个请求, 新建 {http['connections']} 个连接, 复用率 {http['reuse_ratio']:.0%}, 重试 {http['retries']} 次")
+            if stats['stt'] and stats['stt']['requests']:
+                stt = stats['stt']
+                preprocess = stt['preprocess']
+                box.label(text=f"语音识别: 平均 {stt['avg_latency']:.2f}s, 预处理后上传 {preprocess['ratio']:.0%} 的字节 ({preprocess['files']} 个文件)")
+            if stats['tts_cache']:
+                cache = stats['tts_cache']
+                box.label(text=f"语音缓存: 命中率 {cache['hit_rate']:.0%} ({cache['hits']}/{cache['hits'] + cache['misses']}), 节省 {cache['bytes_saved'] / 1048576:.1f} MB")
+            if stats['llm_cache']:
+                cache = stats['llm_cache']
+                box.label(text=f"回复缓存: 命中 {cache['hits']}, 合并 {cache['coalesced']}, 未命中 {cache['misses']}, 缓存 {cache['entries']} 条")
+            if content_manager.events:
+                events = content_manager.events.stats()
+                box.label(text=f"进度推送: {events['subscribers']} 个订阅, 已推送 {events['published']} 条事件")
 
 class CONTENT_OT_toggle_listening(bpy.types.Operator):
     bl_idname = "content.toggle_listening"
@@ -217,6 +501,20 @@ def register():
         update=lambda self, context: content_manager.update_text_to_speech(self.text_to_speech)
     )
 
+    bpy.types.Scene.sentence_pipelining = bpy.props.BoolProperty(
+        name="逐句合成",
+        description="模型每生成一句就开始合成语音, 不等整段回复生成完",
+        default=True
+    )
+
+    bpy.types.Scene.script_parallelism = bpy.props.IntProperty(
+        name="合成并发数",
+        description="处理文本文件时同时发出的语音合成请求数",
+        default=4,
+        min=1,
+        max=16
+    )
+
 def unregister():
     bpy.utils.unregister_class(CONTENT_PT_panel)
     bpy.utils.unregister_class(CONTENT_OT_toggle_listening)
@@ -228,8 +526,10 @@ def unregister():
     del bpy.types.Scene.speech_to_text
     del bpy.types.Scene.content_generation
     del bpy.types.Scene.text_to_speech
+    del bpy.types.Scene.sentence_pipelining
+    del bpy.types.Scene.script_parallelism
 
-    content_manager.stop_listening()
+    content_manager.shutdown()
 
 if __name__ == "__main__":
     register()
\ No newline at end of file
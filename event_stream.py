@@ -0,0 +1,140 @@
+import json
+import asyncio
+import logging
+import threading
+
+# 任务进度推送(Server-Sent Events): 所有订阅连接都由一个后台线程里的 asyncio 事件循环负责写出, 观看者再多也不额外占用线程
+# HTTP 工作线程只负责校验请求和写出响应头, 然后把套接字交给这里, 自己立即回到线程池
+
+TERMINAL_EVENTS = ('applied', 'failed')
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+
+class EventSubscriber(asyncio.Protocol):
+    def __init__(self, broadcaster, job_id):
+        self.broadcaster = broadcaster
+        self.job_id = job_id  # None 表示订阅所有任务
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.broadcaster.connected(self)
+
+    def data_received(self, data):
+        pass  # 请求已经读完, 客户端之后发来的内容直接忽略
+
+    def connection_lost(self, exc):
+        self.broadcaster.subscribers.discard(self)
+
+    def send(self, payload):
+        # 写入不会阻塞: 发不出去的部分留在传输层缓冲区, 缓冲区过大说明观看者读得太慢, 直接断开
+        if self.transport.is_closing():
+            return
+        if self.transport.get_write_buffer_size() > self.broadcaster.max_buffer:
+            logging.warning("事件订阅者积压过多, 断开连接")
+            self.broadcaster.dropped += 1
+            self.transport.abort()
+            return
+        self.transport.write(payload)
+
+class EventBroadcaster:
+    def __init__(self, snapshot=None, max_clients=256, max_buffer=1024 * 1024, heartbeat=15.0):
+        # snapshot(job_id) 返回任务当前状态, 订阅时先发一次, 晚到的观看者也能看到已经完成的阶段
+        self.snapshot = snapshot
+        self.max_clients = max_clients
+        self.max_buffer = max_buffer
+        self.heartbeat = heartbeat
+        self.loop = None
+        self.thread = None
+        self.subscribers = set()
+        self.published = 0
+        self.dropped = 0
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name="EventBroadcaster", daemon=True)
+        self.thread.start()
+        logging.info("任务事件推送已启动")
+
+    def stop(self):
+        if self.thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_all(), self.loop).result(timeout=2)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=2)
+        self.loop.close()
+        self.loop = None
+        self.thread = None
+        logging.info("任务事件推送已停止")
+
+    def is_full(self):
+        return len(self.subscribers) >= self.max_clients
+
+    def stats(self):
+        return {'subscribers': len(self.subscribers), 'published': self.published, 'dropped': self.dropped}
+
+    def publish(self, job_id, event, data):
+        # 可以在任意线程调用; 事件只编码一次, 再写给所有订阅者
+        loop = self.loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._dispatch, job_id, event, format_event(event, data))
+        except RuntimeError:
+            pass  # 事件循环已经关闭
+
+    def attach(self, sock, job_id):
+        # 接管已经写出响应头的连接; 调用方之后不能再使用这个套接字
+        loop = self.loop
+        if loop is None:
+            sock.close()
+            return
+        asyncio.run_coroutine_threadsafe(self._accept(sock, job_id), loop)
+
+    def connected(self, subscriber):
+        # 在事件循环线程中调用, 与 _dispatch 不会交错: 快照之后的事件一条都不会漏
+        if self.snapshot is not None and subscriber.job_id is not None:
+            status = self.snapshot(subscriber.job_id)
+            if status is not None:
+                subscriber.send(format_event('status', status))
+                if status['state'] in TERMINAL_EVENTS:
+                    subscriber.transport.close()
+                    return
+        self.subscribers.add(subscriber)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_later(self.heartbeat, self._send_heartbeat)
+        self.loop.run_forever()
+
+    async def _accept(self, sock, job_id):
+        try:
+            await self.loop.connect_accepted_socket(lambda: EventSubscriber(self, job_id), sock)
+        except OSError as e:
+            logging.info(f"事件订阅连接失败: {str(e)}")
+            sock.close()
+
+    def _dispatch(self, job_id, event, payload):
+        self.published += 1
+        for subscriber in list(self.subscribers):
+            if subscriber.job_id is None:
+                subscriber.send(payload)
+            elif subscriber.job_id == job_id:
+                subscriber.send(payload)
+                if event in TERMINAL_EVENTS:
+                    # 单个任务的流在任务结束后关闭, 缓冲区里的内容发完后才真正断开
+                    subscriber.transport.close()
+
+    def _send_heartbeat(self):
+        # 定期写一行注释: 保持代理不断开连接, 也能及时发现已经离开的观看者
+        for subscriber in list(self.subscribers):
+            subscriber.send(b": keep-alive\n\n")
+        self.loop.call_later(self.heartbeat, self._send_heartbeat)
+
+    async def _close_all(self):
+        for subscriber in list(self.subscribers):
+            subscriber.transport.close()
+        await asyncio.sleep(0)  # 让 connection_lost 回调执行完
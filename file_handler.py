@@ -1,63 +1,90 @@
 import os
+import sys
+import time
 import logging
 from http.server import HTTPServer, SimpleHTTPRequestHandler
-import cgi
 import socket
 import html
-from urllib.parse import parse_qs
+import json
+from email.message import Message
+from urllib.parse import parse_qs, urlsplit
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from .multipart_parser import StreamingMultipartParser, MultipartError, UploadTooLarge
+
+# 上传的录音先写入暂存目录, 转写完成后删除; 启动时清理上次遗留的过期文件
+SPOOL_DIR = os.path.join(os.path.dirname(__file__), 'Cache', 'uploads')
+SPOOL_MAX_AGE = 24 * 3600
+MAX_UPLOAD_BYTES = 100 * 1024 * 1024
+MAX_FIELD_BYTES = 1024 * 1024
+# 等待工作线程的连接数上限, 超过时直接回复 503 并关闭, 不再无限制地排进线程池队列
+MAX_WAITING_CONNECTIONS = 64
+BUSY_RESPONSE = b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nRetry-After: 1\r\nConnection: close\r\n\r\n"
 
 class FileHandler(SimpleHTTPRequestHandler):
-    def __init__(self, *args, callback=None, **kwargs):
+    # HTTP/1.1 长连接: 每个响应都必须带 Content-Length; 空闲连接超时后关闭, 释放工作线程
+    protocol_version = "HTTP/1.1"
+    timeout = 30
+    disable_nagle_algorithm = True  # 响应头和正文分两次写出, 不关掉 Nagle 会和客户端的延迟确认叠加出约40ms延迟
+
+    def __init__(self, *args, callback=None, status_provider=None, events=None, spool_dir=SPOOL_DIR, max_upload_bytes=MAX_UPLOAD_BYTES, **kwargs):
         self.callback = callback
+        self.status_provider = status_provider
+        self.events = events
+        self.spool_dir = spool_dir
+        self.max_upload_bytes = max_upload_bytes
         super().__init__(*args, **kwargs)
 
     def do_POST(self):
         logging.info("Received POST request")
-        content_type = self.headers['Content-Type']
+        content_type = self.headers['Content-Type'] or ''
         logging.debug(f"Content-Type: {content_type}")
-        
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.send_header('Content-type', 'text/html; charset=utf-8')
-        self.end_headers()
+        result = None
+        spooled = []  # 已暂存但还没有交给任务的上传文件, 出错时删除
+
+        # 只接受带 Content-Length 的请求, 超过上限的请求不读请求体直接拒绝
+        if self.headers['Content-Length'] is None:
+            self.send_error(411, "Content-Length required")
+            return None
+        try:
+            content_length = int(self.headers['Content-Length'])
+        except ValueError:
+            self.send_error(400, "Invalid Content-Length")
+            return None
+        is_multipart = 'multipart/form-data' in content_type
+        limit = self.max_upload_bytes if is_multipart else MAX_FIELD_BYTES
+        if content_length > limit:
+            logging.warning(f"Request body too large: {content_length} bytes")
+            self.send_error(413, f"Request body exceeds {limit} bytes")
+            return None
 
         try:
-            if 'multipart/form-data' in content_type:
-                form = cgi.FieldStorage(
-                    fp=self.rfile,
-                    headers=self.headers,
-                    environ={'REQUEST_METHOD': 'POST',
-                            'CONTENT_TYPE': self.headers['Content-Type']}
-                )
+            if is_multipart:
+                message = Message()
+                message['Content-Type'] = content_type
+                parser = StreamingMultipartParser(message.get_param('boundary'), self.spool_dir, self.max_upload_bytes, MAX_FIELD_BYTES)
+                fields, files = parser.parse(self.rfile, content_length)
+                spooled = [upload.path for upload in files.values()]
                 
-                logging.debug(f"Form keys: {list(form.keys())}")
+                logging.debug(f"Form keys: {list(fields) + list(files)}")
                 
-                if 'audio' in form:
-                    audio_item = form['audio']
-                    if audio_item.filename:
-                        file_name = os.path.basename(audio_item.filename)
-                        file_content = audio_item.file.read()
-                        
-                        with open(file_name, 'wb') as f:
-                            f.write(file_content)
-                        
-                        logging.info(f"Received audio file: {file_name}")
-                        print(f"Received audio file: {file_name}")
-                        result = {'type': 'audio', 'filename': file_name}
-                    else:
-                        logging.warning("Audio field is present but no file was uploaded")
-                elif 'text' in form:
-                    text = form['text'].value
+                if 'audio' in files:
+                    # 文件已经完整写入暂存目录, 之后才交给回调开始转写
+                    upload = files.pop('audio')
+                    logging.info(f"Received audio file: {upload.filename} -> {upload.path}, {upload.size} bytes")
+                    print(f"Received audio file: {upload.filename}")
+                    result = {'type': 'audio', 'filename': upload.path, 'original_filename': upload.filename, 'spooled': True}
+                elif 'text' in fields:
+                    text = fields['text']
                     logging.info(f"Received text: {text}")
                     print(f"Received text: {text}")
                     result = {'type': 'text', 'content': text}
                 else:
-                    logging.warning(f"No 'audio' or 'text' field in form data. Available fields: {list(form.keys())}")
+                    logging.warning(f"No 'audio' or 'text' field in form data. Available fields: {list(fields) + list(files)}")
+                for upload in files.values():
+                    os.remove(upload.path)
+                    spooled.remove(upload.path)
             else:
-                content_length = int(self.headers['Content-Length'])
                 post_data = self.rfile.read(content_length).decode('utf-8')
                 logging.debug(f"POST data: {post_data}")
                 
@@ -70,24 +97,104 @@ class FileHandler(SimpleHTTPRequestHandler):
                 else:
                     logging.warning("No 'text' field in form data")
 
-            self.wfile.write('请求处理成功'.encode('utf-8'))
-
-            if self.callback and result:
-                self.callback(result)
+            if result is None:
+                self.send_error(400, "Missing field", "请求中没有 'audio' 或 'text' 字段")
+                return None
 
+            # 回调只负责排队并返回任务ID, 处理在流水线中进行, 客户端通过 GET /jobs/<id> 查询进度
+            job_id = self.callback(result) if self.callback else None
+            if job_id is None:
+                self._discard(spooled)
+                self.send_error(503, "Job queue full", "任务队列已满, 请稍后重试")
+                return None
+            spooled = []  # 文件已归任务所有, 由转写阶段负责删除
+            self.send_json(202, {'job_id': job_id, 'status_url': f"/jobs/{job_id}"}, {'Location': f"/jobs/{job_id}"})
+        except UploadTooLarge as e:
+            logging.warning(f"Upload rejected: {str(e)}")
+            self.send_error(413, "Upload too large", str(e))
+            return None
+        except MultipartError as e:
+            logging.warning(f"Malformed upload: {str(e)}")
+            self.send_error(400, "Malformed multipart body", str(e))
             return None
         except Exception as e:
             logging.error(f"Error processing request: {str(e)}")
             logging.error(f"Error type: {type(e).__name__}")
             logging.error(f"Error details: {e.args}")
-            self.send_error(500, f"Internal server error: {str(e)}".encode('utf-8'))
+            self._discard(spooled)
+            self.send_error(500, "Internal server error", str(e))
             return None
+        return None
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/events':
+            return self.send_event_stream(None)
+        if not path.startswith('/jobs/'):
+            return super().do_GET()
+        job_id, _, tail = path[len('/jobs/'):].partition('/')
+        if tail not in ('', 'events'):
+            self.send_error(404, "Not found")
+            return None
+        status = self.status_provider(job_id) if self.status_provider else None
+        if status is None:
+            self.send_error(404, "Job not found")
+            return None
+        if tail == 'events':
+            return self.send_event_stream(job_id)
+        self.send_json(200, status, {'Cache-Control': 'no-store'})
+        return None
+
+    def send_event_stream(self, job_id):
+        # /jobs/<id>/events 推送单个任务的进度, 任务结束后关闭; /events 推送所有任务, 一直保持
+        if self.events is None:
+            self.send_error(404, "Event stream not available")
+            return None
+        if self.events.is_full():
+            self.send_error(503, "Too many event stream clients")
+            return None
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('X-Accel-Buffering', 'no')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        # 把套接字交给事件循环, 工作线程立即回到线程池; 服务器之后关闭的是已经分离的空套接字对象
+        self.close_connection = True
+        self.events.attach(socket.socket(fileno=self.connection.detach()), job_id)
+        return None
+
+    def send_json(self, code, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Expose-Headers', 'Location')
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if self.server.connections_waiting():
+            # 有连接在排队时不保持长连接, 让出工作线程, 避免少数客户端长期占满线程池
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _discard(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
 
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header("Access-Control-Allow-Headers", "X-Requested-With, Content-Type")
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
     def send_error(self, code, message=None, explain=None):
@@ -101,9 +208,9 @@ class FileHandler(SimpleHTTPRequestHandler):
             explain = long
         self.log_error("code %d, message %s", code, message)
         self.send_response(code, message)
+        self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Connection', 'close')
         self.send_header('Content-Type', 'text/html;charset=utf-8')
-        self.end_headers()
 
         content = (self.error_message_format % {
             'code': code,
@@ -111,50 +218,158 @@ class FileHandler(SimpleHTTPRequestHandler):
             'explain': html.escape(explain, quote=False)
         })
         body = content.encode('UTF-8', 'replace')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
         self.wfile.write(body)
 
+class PooledHTTPServer(HTTPServer):
+    # 连接交给固定大小的线程池处理, 并发连接数有上限; 超出的连接在线程池队列中等待, 等待的连接也有上限
+    request_queue_size = 128  # 默认的 listen 队列只有5, 大量客户端同时连接时会触发1秒的SYN重传
+
+    def __init__(self, server_address, handler_class, max_workers=16, max_waiting=MAX_WAITING_CONNECTIONS):
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="FileHandlerServer")
+        self.max_waiting = max_waiting
+        self.active_connections = set()
+        self.waiting = 0
+        self.rejected = 0
+        self.connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self.connections_lock:
+            busy = self.waiting >= self.max_waiting
+            if busy:
+                self.rejected += 1
+            else:
+                self.active_connections.add(request)
+                self.waiting += 1
+        if busy:
+            logging.warning(f"Too many waiting connections, rejected {client_address[0]}")
+            self.reject_request(request)
+            return
+        try:
+            self.executor.submit(self.process_request_worker, request, client_address)
+        except RuntimeError:
+            # 线程池已经关闭, 服务器正在停止
+            with self.connections_lock:
+                self.active_connections.discard(request)
+                self.waiting -= 1
+            self.shutdown_request(request)
+
+    def reject_request(self, request):
+        try:
+            request.settimeout(1)
+            request.sendall(BUSY_RESPONSE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def connections_waiting(self):
+        return self.waiting > 0
+
+    def process_request_worker(self, request, client_address):
+        with self.connections_lock:
+            self.waiting -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self.connections_lock:
+                self.active_connections.discard(request)
+            self.shutdown_request(request)
+
+    def handle_error(self, request, client_address):
+        # 客户端中途断开是常见情况, 不打印完整的异常堆栈
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            logging.info(f"Client {client_address[0]} disconnected")
+            return
+        super().handle_error(request, client_address)
+
+    def close_connections(self):
+        # 唤醒阻塞在读取上的长连接, 让工作线程尽快退出
+        with self.connections_lock:
+            connections = list(self.active_connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close_pending(self):
+        # 线程池关闭后调用: 被取消、从未交给工作线程的连接不会经过 process_request_worker 的清理, 在这里关闭它们的套接字
+        with self.connections_lock:
+            connections = list(self.active_connections)
+            self.active_connections.clear()
+            self.waiting = 0
+        for connection in connections:
+            self.shutdown_request(connection)
+
 class FileHandlerServer:
-    def __init__(self, port=9990, callback=None):
+    def __init__(self, port=9990, callback=None, status_provider=None, events=None, max_workers=16, spool_dir=SPOOL_DIR, max_upload_bytes=MAX_UPLOAD_BYTES, max_waiting=MAX_WAITING_CONNECTIONS):
+        # callback(result) 把请求放入队列并返回任务ID, 返回 None 表示队列已满; status_provider(job_id) 返回任务状态字典
+        # events 是 EventBroadcaster, 提供 /events 和 /jobs/<id>/events 的 SSE 推送, 随服务器一起启动和停止
         self.port = port
         self.server = None
         self.server_thread = None
-        self.stop_event = None
         self.callback = callback
+        self.status_provider = status_provider
+        self.events = events
+        self.max_workers = max_workers
+        self.max_waiting = max_waiting
+        self.spool_dir = spool_dir
+        self.max_upload_bytes = max_upload_bytes
 
     def start(self):
         if self.server is None:
             try:
-                self.stop_event = threading.Event()
-                handler = lambda *args: FileHandler(*args, callback=self.callback)
-                self.server = HTTPServer(("localhost", self.port), handler)
-                self.server_thread = threading.Thread(target=self.run_server)
+                self.clean_spool()
+                handler = lambda *args: FileHandler(*args, callback=self.callback, status_provider=self.status_provider, events=self.events, spool_dir=self.spool_dir, max_upload_bytes=self.max_upload_bytes)
+                self.server = PooledHTTPServer(("localhost", self.port), handler, max_workers=self.max_workers, max_waiting=self.max_waiting)
+                if self.events is not None:
+                    self.events.start()
+                self.server_thread = threading.Thread(target=self.run_server, daemon=True)
                 self.server_thread.start()
                 logging.info("Server started successfully")
                 return True
             except OSError:
                 logging.error("Failed to start server. Port might be in use.")
+                self.server = None
                 return False
         return True
 
     def run_server(self):
         logging.info("Server is running")
-        while self.stop_event and not self.stop_event.is_set():
-            self.server.handle_request()
+        self.server.serve_forever(poll_interval=0.2)
 
     def stop(self):
         if self.server:
             logging.info("Stopping server...")
-            self.stop_event.set()
-            try:
-                with socket.create_connection(("localhost", self.port), timeout=1):
-                    pass
-            except:
-                logging.warning("Failed to send dummy request to unblock server")
+            # shutdown() 让 serve_forever 在下一次轮询时退出, 不需要再连一次自己来唤醒
+            self.server.shutdown()
+            self.server.close_connections()
+            self.server.executor.shutdown(wait=True, cancel_futures=True)
+            self.server.close_pending()
             self.server.server_close()
+            self.server_thread.join(timeout=1)
+            if self.events is not None:
+                self.events.stop()
             self.server = None
             self.server_thread = None
-            self.stop_event = None
             logging.info("Server stopped")
 
+    def clean_spool(self):
+        if not os.path.isdir(self.spool_dir):
+            return
+        expired = time.time() - SPOOL_MAX_AGE
+        with os.scandir(self.spool_dir) as it:
+            for entry in it:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < expired:
+                        os.remove(entry.path)
+                        logging.info(f"Removed stale upload: {entry.name}")
+                except OSError:
+                    pass
+
     def is_running(self):
-        return self.server is not None and self.server_thread is not None and self.server_thread.is_alive()
\ No newline at end of file
+        return self.server is not None and self.server_thread is not None and self.server_thread.is_alive()
@@ -0,0 +1,134 @@
+import time
+import logging
+import threading
+from .config_service import config_service
+
+# 语音识别、内容生成和语音合成共用一个 HTTP 会话: 每个主机一个连接池, 连接保持复用, 统一的超时和重试策略
+# requests 在第一次发请求时才导入, 导入本模块不做任何耗时操作
+
+HTTP_DEFAULTS = {
+    'connect_timeout': 5.0,
+    'read_timeout': 120.0,  # 两次收到数据之间的最长间隔, 语音合成和流式生成都可能很久才有第一个字节
+    'pool_maxsize': 8,  # 每个主机最多保持的空闲连接数
+    'retries': 2,
+    'backoff_factor': 0.3,
+}
+RETRY_STATUS = (502, 503, 504)
+
+def load_http_config(config=None):
+    return {**HTTP_DEFAULTS, **(config or config_service.get()).get('http', {})}
+
+class ClientStats:
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.retries = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.lock = threading.Lock()
+
+    def connection_opened(self):
+        with self.lock:
+            self.connections += 1
+
+    def request_done(self, elapsed, retries=0, error=False):
+        with self.lock:
+            self.requests += 1
+            self.retries += retries
+            self.errors += error
+            self.total_time += elapsed
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'connections': self.connections,
+                'reuse_ratio': 1 - self.connections / self.requests if self.requests else 0.0,
+                'retries': self.retries,
+                'errors': self.errors,
+                'avg_time': self.total_time / self.requests if self.requests else 0.0,
+            }
+
+def _create_session(stats, pool_maxsize, retry):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    def counting_pool(pool_class):
+        # 每成功建立一个连接计数一次, 与请求数对比即可看出连接复用的情况
+        class CountingPool(pool_class):
+            def _new_conn(self):
+                conn = super()._new_conn()
+                connect = conn.connect
+                def counted_connect():
+                    connect()
+                    stats.connection_opened()
+                conn.connect = counted_connect
+                return conn
+        return CountingPool
+
+    class CountingAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                scheme: counting_pool(pool_class) for scheme, pool_class in self.poolmanager.pool_classes_by_scheme.items()
+            }
+
+    session = requests.Session()
+    adapter = CountingAdapter(pool_maxsize=pool_maxsize, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class HttpClient:
+    def __init__(self, connect_timeout=5.0, read_timeout=120.0, pool_maxsize=8, retries=2, backoff_factor=0.3):
+        from urllib3.util.retry import Retry
+        self.timeout = (connect_timeout, read_timeout)
+        self.stats_data = ClientStats()
+        # 连接失败时所有请求都重试; 读取失败和 502/503/504 只重试幂等的 GET, POST 可能已经被服务器处理过
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=backoff_factor, status_forcelist=RETRY_STATUS,
+                      allowed_methods=frozenset({'GET', 'HEAD', 'OPTIONS'}), raise_on_status=False)
+        self.session = _create_session(self.stats_data, pool_maxsize, retry)
+
+    def request(self, method, url, **kwargs):
+        # 参数与 requests 相同, 没有指定 timeout 时使用配置的超时; stream=True 时计时只到收到响应头
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except Exception:
+            self.stats_data.request_done(time.perf_counter() - start, error=True)
+            raise
+        retries = getattr(response.raw, 'retries', None)
+        self.stats_data.request_done(time.perf_counter() - start, len(retries.history) if retries else 0)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        return self.stats_data.to_dict()
+
+    def _config_changed(self, config):
+        # 超时可以随配置立即生效; 连接池大小和重试策略要重新启用插件后才生效
+        http = load_http_config(config)
+        self.timeout = (http['connect_timeout'], http['read_timeout'])
+
+    def close(self):
+        self.session.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            config = load_http_config()
+            _client = HttpClient(**{key: config[key] for key in HTTP_DEFAULTS})
+            config_service.subscribe(_client._config_changed)
+            logging.info(f"HTTP客户端已创建: 超时 {_client.timeout}, 每个主机最多保持 {config['pool_maxsize']} 个连接, 重试 {config['retries']} 次")
+        return _client
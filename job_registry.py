@@ -0,0 +1,151 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+
+# 任务依次经过的阶段; transcribed/generated/synthesized 由内容流水线标记, analyzed/applied 由唇形同步标记
+STAGES = ('transcribed', 'generated', 'synthesized', 'analyzed', 'applied')
+
+def _file_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+class JobStatus:
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.created = time.time()
+        self.stages = {}  # 阶段 -> 完成时间(Unix时间戳)
+        self.error = None
+        self.audio_files = []
+        self.file_stages = {}  # 音频文件 -> 已完成的唇形同步阶段
+
+    @property
+    def state(self):
+        if self.error:
+            return 'failed'
+        for stage in reversed(STAGES):
+            if stage in self.stages:
+                return stage
+        return 'queued'
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'state': self.state,
+            'created': self.created,
+            'stages': {stage: self.stages[stage] for stage in STAGES if stage in self.stages},
+            'error': self.error,
+            'audio_files': [os.path.basename(path) for path in self.audio_files],
+        }
+
+class JobRegistry:
+    # 记录每个请求的处理进度, 供 GET /jobs/<id> 查询; 只保留最近 max_jobs 个任务
+    def __init__(self, max_jobs=1000):
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.jobs_by_file = {}
+        self.lock = threading.Lock()
+        self.listeners = []  # listener(job_id, event, data), 用于推送进度事件
+
+    def add_listener(self, listener):
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def publish(self, job_id, event, data):
+        # 在锁外调用, 监听者不能阻塞调用线程
+        for listener in list(self.listeners):
+            try:
+                listener(job_id, event, {'job_id': job_id, **data})
+            except Exception as e:
+                logging.error(f"推送任务事件时出错: {str(e)}")
+
+    def create(self):
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.jobs[job_id] = JobStatus(job_id)
+            while len(self.jobs) > self.max_jobs:
+                _, evicted = self.jobs.popitem(last=False)
+                for path in evicted.audio_files:
+                    self.jobs_by_file.pop(_file_key(path), None)
+        return job_id
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def mark(self, job_id, stage, audio_files=None, **details):
+        # details 只随事件推送(例如转写出的文本), 不保存在任务状态中
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.stages[stage] = time.time()
+            if audio_files:
+                self._add_files(job, audio_files)
+            data = {'time': job.stages[stage], 'audio_files': [os.path.basename(path) for path in job.audio_files], **details}
+            completed = self._complete_file_stages(job)
+        logging.debug(f"任务 {job_id} 进入阶段: {stage}")
+        self.publish(job_id, stage, data)
+        for stage, data in completed:
+            self.publish(job_id, stage, data)
+
+    def add_audio_files(self, job_id, audio_files):
+        # 逐句合成时音频文件一段段登记; 必须在文件移动到 Voice 之前登记, 唇形同步看到文件时才能找到对应的任务
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            self._add_files(job, audio_files)
+        for path in audio_files:
+            self.publish(job_id, 'audio_file', {'audio_file': os.path.basename(path)})
+
+    def mark_file(self, audio_file, stage):
+        # 唇形同步按音频文件标记
+        key = _file_key(audio_file)
+        with self.lock:
+            job_id = self.jobs_by_file.get(key)
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.file_stages[key].add(stage)
+            completed = self._complete_file_stages(job)
+        logging.debug(f"任务 {job_id} 的音频 {os.path.basename(audio_file)} 进入阶段: {stage}")
+        # 每个音频文件完成时推送 file_<阶段>, 全部完成时再推送任务级的阶段事件
+        self.publish(job_id, f"file_{stage}", {'audio_file': os.path.basename(audio_file)})
+        for stage, data in completed:
+            self.publish(job_id, stage, data)
+
+    def _add_files(self, job, audio_files):
+        for path in audio_files:
+            key = _file_key(path)
+            if key not in job.file_stages:
+                job.audio_files.append(path)
+                job.file_stages[key] = set()
+                self.jobs_by_file[key] = job.job_id
+
+    def _complete_file_stages(self, job):
+        # 合成结束(不会再有新的音频文件)并且所有音频文件都完成某阶段后, 任务才算完成该阶段
+        if 'synthesized' not in job.stages or not job.file_stages:
+            return []
+        completed = []
+        for stage in ('analyzed', 'applied'):
+            if stage not in job.stages and all(stage in stages for stages in job.file_stages.values()):
+                job.stages[stage] = time.time()
+                completed.append((stage, {'time': job.stages[stage], 'audio_files': [os.path.basename(path) for path in job.audio_files]}))
+        return completed
+
+    def fail(self, job_id, error):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.error = error
+        self.publish(job_id, 'failed', {'error': error})
+
+job_registry = JobRegistry()
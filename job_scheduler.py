@@ -0,0 +1,213 @@
+import time
+import queue
+import logging
+import itertools
+import threading
+
+STOP_TIMEOUT = 2.0  # 停止时最多等待工作线程这么多秒, 卡住的线程是守护线程, 不再等待
+POLL_INTERVAL = 0.5  # 向已满的下一阶段队列转交时, 每隔这么久检查一次是否已经停止
+
+class Job:
+    def __init__(self, seq, payload):
+        self.seq = seq
+        self.payload = payload
+        self.result = payload
+        self.error = None
+        self.submitted_at = time.monotonic()
+        self.enqueued_at = self.submitted_at
+        self.waits = {}  # 阶段名 -> 在该阶段队列中等待的秒数
+
+class StageStats:
+    def __init__(self):
+        self.processed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_busy = 0.0
+
+class OrderedDelivery:
+    # 按序号依次交付结果: 后提交的任务先完成时先保存起来, 等前面的任务都交付后再交付
+    def __init__(self, deliver, first_seq=1):
+        self.deliver = deliver
+        self.next_seq = first_seq
+        self.waiting = {}
+        self.lock = threading.Lock()
+
+    def complete(self, job):
+        with self.lock:
+            self.waiting[job.seq] = job
+            while self.next_seq in self.waiting:
+                ready = self.waiting.pop(self.next_seq)
+                self.next_seq += 1
+                try:
+                    self.deliver(ready)
+                except Exception as e:
+                    logging.error(f"交付任务 {ready.seq} 时出错: {str(e)}")
+
+    def pending(self):
+        with self.lock:
+            return len(self.waiting)
+
+class OrderedStreams:
+    # 每个流产出一串片段(例如逐句合成的语音), 所有片段按 (流序号, 片段序号) 的顺序交付:
+    # 当前的流交付完并且结束后, 才交付下一个流的片段; 后面的流先完成的片段先保存起来
+    def __init__(self, deliver, first_ticket=1):
+        self.deliver = deliver  # deliver(流序号, 片段序号, 片段)
+        self.tickets = itertools.count(first_ticket)
+        self.head = first_ticket
+        self.next_index = 0
+        self.waiting = {}  # 流序号 -> {片段序号: 片段}
+        self.totals = {}  # 已结束的流 -> 片段总数
+        self.lock = threading.Lock()
+
+    def open(self):
+        # 流序号按调用顺序分配, 交付顺序与之相同
+        return next(self.tickets)
+
+    def put(self, ticket, index, item):
+        with self.lock:
+            self.waiting.setdefault(ticket, {})[index] = item
+            self._flush()
+
+    def finish(self, ticket, count):
+        with self.lock:
+            self.totals[ticket] = count
+            self._flush()
+
+    def pending(self):
+        with self.lock:
+            return sum(len(items) for items in self.waiting.values())
+
+    def _flush(self):
+        while True:
+            items = self.waiting.get(self.head, {})
+            while self.next_index in items:
+                item = items.pop(self.next_index)
+                try:
+                    self.deliver(self.head, self.next_index, item)
+                except Exception as e:
+                    logging.error(f"交付第 {self.head} 个流的第 {self.next_index + 1} 段时出错: {str(e)}")
+                self.next_index += 1
+            if self.totals.get(self.head) is None or self.next_index < self.totals[self.head]:
+                return
+            del self.totals[self.head]
+            self.waiting.pop(self.head, None)
+            self.head += 1
+            self.next_index = 0
+
+class JobScheduler:
+    # 多阶段流水线: 每个阶段有自己的工作线程和有界队列, 结果按提交顺序交付
+    # stages: [(阶段名, 处理函数, 线程数)], 处理函数接收上一阶段的结果, 返回 None 表示任务失败
+    def __init__(self, stages, deliver, queue_size=8):
+        self.stage_names = [name for name, _, _ in stages]
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.stats_by_stage = {name: StageStats() for name in self.stage_names}
+        self.delivery = OrderedDelivery(deliver)
+        self.stats_lock = threading.Lock()
+        self.seq = itertools.count(1)
+        self.submit_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.threads = []
+        for index, (name, func, workers) in enumerate(stages):
+            for worker in range(max(1, workers)):
+                thread = threading.Thread(target=self._run_stage, args=(index, name, func), name=f"JobScheduler-{name}-{worker}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        logging.info(f"任务调度器已启动: {', '.join(f'{name}x{max(1, workers)}' for name, _, workers in stages)}, 队列上限 {queue_size}")
+
+    def submit(self, payload, timeout=None):
+        # 队列已满时最多等待 timeout 秒, 仍然放不进去则抛出 queue.Full
+        # 取序号和入队在同一把锁内完成, 保证序号与入队顺序一致
+        with self.submit_lock:
+            if self.stop_event.is_set():
+                raise queue.Full("任务调度器已停止")
+            job = Job(next(self.seq), payload)
+            self.queues[0].put(job, timeout=timeout)
+        logging.info(f"任务 {job.seq} 已加入队列, 当前排队: {self.queues[0].qsize()}")
+        return job.seq
+
+    def stop(self):
+        # 不能阻塞: 注销插件时调用, 队列已满或工作线程卡在处理函数里时也要立即返回
+        # 先置停止标志并清空排队中的任务, 再放入唤醒用的 None; 放不进去也没关系, 工作线程取到下一项时会检查停止标志
+        self.stop_event.set()
+        dropped = 0
+        for index, name in enumerate(self.stage_names):
+            dropped += self._drain(self.queues[index])
+            workers = sum(1 for thread in self.threads if thread.name.startswith(f"JobScheduler-{name}-"))
+            for _ in range(workers):
+                try:
+                    self.queues[index].put_nowait(None)
+                except queue.Full:
+                    break
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for thread in self.threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        alive = [thread.name for thread in self.threads if thread.is_alive()]
+        self.threads = []
+        if dropped:
+            logging.warning(f"停止时丢弃了 {dropped} 个排队中的任务")
+        if alive:
+            logging.warning(f"任务调度器停止时仍有线程未结束: {', '.join(alive)}")
+        logging.info("任务调度器已停止")
+
+    def stats(self):
+        with self.stats_lock:
+            stages = {}
+            for index, name in enumerate(self.stage_names):
+                stats = self.stats_by_stage[name]
+                stages[name] = {
+                    'queue_depth': self.queues[index].qsize(),
+                    'processed': stats.processed,
+                    'failed': stats.failed,
+                    'avg_wait': stats.total_wait / stats.processed if stats.processed else 0.0,
+                    'max_wait': stats.max_wait,
+                    'avg_busy': stats.total_busy / stats.processed if stats.processed else 0.0,
+                }
+        return {'stages': stages, 'awaiting_delivery': self.delivery.pending()}
+
+    def _drain(self, jobs):
+        dropped = 0
+        while True:
+            try:
+                dropped += jobs.get_nowait() is not None
+            except queue.Empty:
+                return dropped
+
+    def _run_stage(self, index, name, func):
+        while not self.stop_event.is_set():
+            job = self.queues[index].get()
+            if job is None or self.stop_event.is_set():
+                break
+            started = time.monotonic()
+            wait = started - job.enqueued_at
+            job.waits[name] = wait
+            try:
+                result = func(job.result)
+                if result is None:
+                    job.error = f"{name} 阶段没有产出结果"
+            except Exception as e:
+                result = None
+                job.error = f"{name} 阶段出错: {str(e)}"
+                logging.error(f"任务 {job.seq} {job.error}")
+
+            with self.stats_lock:
+                stats = self.stats_by_stage[name]
+                stats.processed += 1
+                stats.failed += job.error is not None
+                stats.total_wait += wait
+                stats.max_wait = max(stats.max_wait, wait)
+                stats.total_busy += time.monotonic() - started
+
+            job.result = result
+            if job.error is None and index + 1 < len(self.queues):
+                job.enqueued_at = time.monotonic()
+                # 下一阶段的队列满时分段等待, 停止后放弃转交, 不会一直阻塞在这里
+                while not self.stop_event.is_set():
+                    try:
+                        self.queues[index + 1].put(job, timeout=POLL_INTERVAL)
+                        break
+                    except queue.Full:
+                        continue
+            else:
+                # 完成或失败的任务都要交付, 否则会挡住后面的任务
+                self.delivery.complete(job)
@@ -3,12 +3,24 @@ import bpy
 import os
 import logging
 import time
+import queue
+import functools
+from bpy.app.handlers import persistent
 from bpy.props import StringProperty, BoolProperty, FloatProperty, IntProperty, EnumProperty, CollectionProperty, PointerProperty
 from bpy_extras.io_utils import ImportHelper
 
+# 分析模块还要在分析子进程 (spawn) 和命令行烘焙中以顶层模块名导入, 只有它们经由 sys.path 导入, 它们不持有共享状态
+# 插件内其他模块之间一律按包内相对路径导入, 配置服务和任务登记表这样的单例才不会被导入成两份
 sys.path.append(os.path.dirname(__file__))
 from lip_sync_core import LipSyncCore
 from lip_sync_idle_animation_generator import IdleAnimationGenerator
+from lip_sync_keyframe_reducer import KeyframeReducer
+from lip_sync_feature_cache import FeatureCache
+from lip_sync_bake import load_baked_visemes
+from lip_sync_worker import AnalysisWorker
+from lip_sync_folder_watcher import FolderWatcher
+# 任务进度与内容生成共用同一个登记表
+from .job_registry import job_registry
 
 # Configure logging
 logger = logging.getLogger("LipSyncLogger")
@@ -22,6 +34,46 @@ handler.setFormatter(formatter)
 
 logger.addHandler(handler)
 
+# 调整阈值、静音帧数或语言后重新分析时, 只需重做口型阶段
+feature_cache = FeatureCache(os.path.join(os.path.dirname(__file__), 'Cache', 'features'))
+
+# 后台分析进程: 分析不占用主线程, 只有写入动作在主线程的定时器中完成
+analysis_worker = AnalysisWorker()
+
+def _poll_analysis_worker():
+    analysis_worker.poll()
+    if analysis_worker.pending() or (analysis_worker.is_alive() and not analysis_worker.ready):
+        return 0.1
+    return None
+
+def _ensure_worker_polling():
+    if not bpy.app.timers.is_registered(_poll_analysis_worker):
+        bpy.app.timers.register(_poll_analysis_worker, first_interval=0.1)
+
+def start_analysis_worker():
+    analysis_worker.start()
+    _ensure_worker_polling()
+
+def _update_analysis_worker(self, context):
+    if self.use_analysis_worker:
+        start_analysis_worker()
+    else:
+        analysis_worker.stop()
+
+@persistent
+def _start_analysis_worker_on_load(dummy):
+    if any(scene.lip_sync.use_analysis_worker for scene in bpy.data.scenes):
+        start_analysis_worker()
+
+def core_options(lip_sync):
+    return {
+        'frame_rate': lip_sync.frame_rate,
+        'silence_threshold': lip_sync.silence_threshold,
+        'max_silence_frames': lip_sync.max_silence_frames,
+        'language': lip_sync.language,
+        'profile': lip_sync.analysis_profile,
+    }
+
 class IdleAnimation(bpy.types.PropertyGroup):
     name: StringProperty(name="名称")
     object: PointerProperty(name="对象", type=bpy.types.Object)
@@ -36,7 +88,20 @@ class LipSyncProperties(bpy.types.PropertyGroup):
     is_listening: BoolProperty(name="监听音频", default=False)
     frame_rate: FloatProperty(name="帧率", default=24.0)
     silence_threshold: FloatProperty(name="静音阈值", default=0.01, min=0.0, max=1.0)
+    use_keyframe_reduction: BoolProperty(name="精简关键帧", description="去掉冗余的保持关键帧, 并在容差范围内简化口型曲线; 精简后的曲线使用线性插值", default=False)
+    reduction_tolerance: FloatProperty(name="精简容差", description="简化曲线时允许的最大强度误差", default=0.01, min=0.0, max=1.0, precision=3)
     max_silence_frames: IntProperty(name="最大静音帧数", default=5, min=1)
+    analysis_profile: EnumProperty(
+        name="分析配置",
+        items=[
+            ('standard', "标准", "22050Hz 高质量重采样, 2048点FFT"),
+            ('fast', "快速", "11025Hz 快速重采样, 512点FFT, 适合直播等实时场景")
+        ],
+        default='standard'
+    )
+    use_feature_cache: BoolProperty(name="特征缓存", description="缓存音频的频谱特征, 修改参数后重新分析无需重新解码", default=True)
+    use_streaming_analysis: BoolProperty(name="流式分析", description="分块解码并分析音频, 适合很长的音频文件, 内存占用远小于整段分析, 结果相同; 需要先把文件读一遍估计调音偏差", default=False)
+    use_analysis_worker: BoolProperty(name="后台分析", description="在预热好的后台进程中分析音频, 分析期间界面不会卡住", default=False, update=_update_analysis_worker)
     monitor_folder: StringProperty(name="监听文件夹", default=os.path.join(os.path.dirname(__file__), 'Voice'), subtype='DIR_PATH')
     is_monitoring: BoolProperty(name="正在监听", default=False)
     idle_animations: CollectionProperty(type=IdleAnimation)
@@ -89,14 +154,8 @@ class LIPSYNC_OT_analyze_audio(bpy.types.Operator):
         return {'FINISHED'}
 
     def analyze_and_apply(self, context, audio_file):
-        lip_sync_core = LipSyncCore(
-            frame_rate=context.scene.lip_sync.frame_rate,
-            silence_threshold=context.scene.lip_sync.silence_threshold,
-            max_silence_frames=context.scene.lip_sync.max_silence_frames,
-            language=context.scene.lip_sync.language
-        )
-        
-        mouth_object = context.scene.lip_sync.mouth_object
+        lip_sync = context.scene.lip_sync
+        mouth_object = lip_sync.mouth_object
         
         if mouth_object is None or mouth_object.type != 'MESH':
             self.report({'ERROR'}, f"未选择有效的唇形网格对象")
@@ -109,48 +168,39 @@ class LIPSYNC_OT_analyze_audio(bpy.types.Operator):
             return
         
         logger.info(f"口型对象: {mouth_object.name}, 类型: {mouth_object.type}")
+
+        if lip_sync.use_analysis_worker:
+            # 交给后台进程分析, 结果由定时器在主线程写入动作
+            options = {
+                'core': core_options(lip_sync),
+                'streaming': lip_sync.use_streaming_analysis,
+                'cache_dir': feature_cache.cache_dir if lip_sync.use_feature_cache else None,
+            }
+            callback = functools.partial(_apply_worker_result, context.scene.name, mouth_object.name, audio_file)
+            analysis_worker.submit(audio_file, options, callback)
+            _ensure_worker_polling()
+            self.report({'INFO'}, f"已提交后台分析: {os.path.basename(audio_file)}")
+            return
+        
+        lip_sync_core = LipSyncCore(
+            feature_cache=feature_cache if lip_sync.use_feature_cache else None,
+            **core_options(lip_sync)
+        )
         
         try:
-            # 分析音频并生成口型数据
-            visemes = lip_sync_core.analyze_audio(audio_file)
+            # 分析音频并生成口型数据, 有参数一致的预烘焙结果时直接使用
+            visemes = load_baked_visemes(audio_file, lip_sync_core.analysis_params(lip_sync.use_streaming_analysis))
+            if visemes is not None:
+                logger.info(f"使用预先烘焙的口型数据: {audio_file}")
+            elif lip_sync.use_streaming_analysis:
+                visemes = list(lip_sync_core.analyze_audio_stream(audio_file))
+            else:
+                visemes = lip_sync_core.analyze_audio(audio_file)
             logger.info(f"生成的visemes数量: {len(visemes)}")
-            
-            # 应用口型数据到网格对象
-            action_name = f"LipSync_{int(time.time())}"
-            lip_sync_action = lip_sync_core.apply_visemes_to_mesh(mouth_object, visemes, action_name)
-            logger.info(f"创建的动作: {lip_sync_action.name}")
-            
-            # 创建NLA轨道和条带
-            track_name = f"LipSync_Track_{int(time.time())}"
-            strip_name = f"LipSync_Strip_{int(time.time())}"
-            lip_sync_core.create_nla_track(mouth_object, lip_sync_action, track_name, strip_name)
-            logger.info(f"创建了NLA轨道: {track_name}, 条带: {strip_name}")
-            
-            # 清除之前的音频(如果有)
-            if context.scene.sequence_editor:
-                for seq in context.scene.sequence_editor.sequences_all:
-                    if seq.type == 'SOUND':
-                        context.scene.sequence_editor.sequences.remove(seq)
-                logger.info("清除了之前的音频")
-
-            # 插入新的音频
-            if not context.scene.sequence_editor:
-                context.scene.sequence_editor_create()
-
-            sound_strip = context.scene.sequence_editor.sequences.new_sound(
-                name="LipSync Audio",
-                filepath=audio_file,
-                channel=1,
-                frame_start=1
-            )
-            logger.info(f"插入了新的音频: {audio_file}")
-            logger.info(f"音频条带名称: {sound_strip.name}, 持续时间: {sound_strip.frame_duration} 帧")
-
-            # 可选：设置音量或其他属性
-            sound_strip.volume = 1.0  # 设置音量为100%
-
-            self.report({'INFO'}, f"完成了唇形同步,并插入了音频")
-            logger.info(f"完成了唇形同步,并插入了音频")
+            job_registry.mark_file(audio_file, 'analyzed')
+
+            frames, codes, strengths = lip_sync_core.visemes_to_arrays(visemes)
+            apply_lipsync_result(context.scene, mouth_object, audio_file, lip_sync_core, frames, codes, strengths, self.report)
 
         except Exception as e:
             self.report({'ERROR'}, f"处理过程中发生错误: {str(e)}")
@@ -159,42 +209,113 @@ class LIPSYNC_OT_analyze_audio(bpy.types.Operator):
             logger.error(f"错误发生位置: {e.__traceback__.tb_frame.f_code.co_filename}, 行号: {e.__traceback__.tb_lineno}")
             return {'CANCELLED'}
 
+def apply_lipsync_result(scene, mouth_object, audio_file, lip_sync_core, frames, codes, strengths, report=None):
+    # 在主线程中把口型数组写入动作, 创建NLA轨道并插入音频
+    lip_sync = scene.lip_sync
+    action_name = f"LipSync_{int(time.time())}"
+    reducer = KeyframeReducer(lip_sync.reduction_tolerance) if lip_sync.use_keyframe_reduction else None
+    lip_sync_action = lip_sync_core.apply_viseme_arrays_to_mesh(mouth_object, frames, codes, strengths, action_name, reducer)
+    logger.info(f"创建的动作: {lip_sync_action.name}")
+    if reducer and report:
+        report({'INFO'}, f"精简关键帧: 移除了 {reducer.removed_count}/{reducer.keys_before} 个, 精简后的曲线使用线性插值")
+    
+    # 创建NLA轨道和条带
+    track_name = f"LipSync_Track_{int(time.time())}"
+    strip_name = f"LipSync_Strip_{int(time.time())}"
+    lip_sync_core.create_nla_track(mouth_object, lip_sync_action, track_name, strip_name)
+    logger.info(f"创建了NLA轨道: {track_name}, 条带: {strip_name}")
+    
+    # 清除之前的音频(如果有)
+    if scene.sequence_editor:
+        for seq in scene.sequence_editor.sequences_all:
+            if seq.type == 'SOUND':
+                scene.sequence_editor.sequences.remove(seq)
+        logger.info("清除了之前的音频")
+
+    # 插入新的音频
+    if not scene.sequence_editor:
+        scene.sequence_editor_create()
+
+    sound_strip = scene.sequence_editor.sequences.new_sound(
+        name="LipSync Audio",
+        filepath=audio_file,
+        channel=1,
+        frame_start=1
+    )
+    logger.info(f"插入了新的音频: {audio_file}")
+    logger.info(f"音频条带名称: {sound_strip.name}, 持续时间: {sound_strip.frame_duration} 帧")
+
+    # 可选：设置音量或其他属性
+    sound_strip.volume = 1.0  # 设置音量为100%
+
+    if report:
+        report({'INFO'}, f"完成了唇形同步,并插入了音频")
+    logger.info(f"完成了唇形同步,并插入了音频")
+    job_registry.mark_file(audio_file, 'applied')
+
+def _apply_worker_result(scene_name, object_name, audio_file, arrays, info):
+    # 后台分析结果的回调, 由定时器在主线程调用; 提交后场景或对象可能已被删除
+    if arrays is None:
+        logger.error(f"后台分析失败: {audio_file}, {info['error']}")
+        return
+    scene = bpy.data.scenes.get(scene_name)
+    mouth_object = bpy.data.objects.get(object_name)
+    if scene is None or mouth_object is None:
+        logger.warning(f"场景或口型对象已不存在, 丢弃分析结果: {audio_file}")
+        return
+
+    if info['cache_hit'] is not None:
+        if info['cache_hit']:
+            feature_cache.hits += 1
+        else:
+            feature_cache.misses += 1
+    logger.info(f"后台分析完成: {audio_file}, {info['count']} 帧, 用时 {info['elapsed']:.2f}s")
+    job_registry.mark_file(audio_file, 'analyzed')
+
+    try:
+        apply_lipsync_result(scene, mouth_object, audio_file, LipSyncCore(**core_options(scene.lip_sync)), *arrays)
+    except Exception as e:
+        logger.error(f"应用后台分析结果时发生错误: {type(e).__name__}: {str(e)}")
+
 class LIPSYNC_OT_monitor_folder(bpy.types.Operator):
     bl_idname = "lipsync.monitor_folder"
     bl_label = "监听文件夹"
     
     _timer = None
-    _last_files = set()
+    _watcher = None
 
     def modal(self, context, event):
         if event.type == 'TIMER':
-            if not context.scene.lip_sync.is_listening:
+            lip_sync = context.scene.lip_sync
+            if not lip_sync.is_listening or not lip_sync.is_monitoring or not self._watcher.is_running():
                 self.cancel(context)
                 return {'CANCELLED'}
             
-            monitor_folder = context.scene.lip_sync.monitor_folder
-            current_files = set(os.listdir(monitor_folder))
-            new_files = current_files - self._last_files
-            
-            if new_files:
-                for file in new_files:
-                    file_path = os.path.join(monitor_folder, file)
-                    if file.lower().endswith(('.wav', '.mp3')):
-                        logger.info(f"检测到新的音频文件: {file}")
-                        context.scene.lip_sync.audio_file = file_path
-                        bpy.ops.lipsync.analyze_audio()
-                
-                self._last_files = current_files
+            # 监听线程只交出已经写完的音频文件, 这里取空队列即可, 与文件夹中的文件数量无关
+            while True:
+                try:
+                    file_path = self._watcher.queue.get_nowait()
+                except queue.Empty:
+                    break
+                logger.info(f"分析新的音频文件: {file_path}")
+                lip_sync.audio_file = file_path
+                bpy.ops.lipsync.analyze_audio()
         
         return {'PASS_THROUGH'}
 
     def execute(self, context):
+        monitor_folder = bpy.path.abspath(context.scene.lip_sync.monitor_folder)
+        self._watcher = FolderWatcher(monitor_folder)
+        try:
+            self._watcher.start()
+        except OSError as e:
+            self.report({'ERROR'}, f"无法监听文件夹: {str(e)}")
+            logger.error(f"无法监听文件夹: {str(e)}")
+            return {'CANCELLED'}
         wm = context.window_manager
-        self._timer = wm.event_timer_add(1.0, window=context.window)
+        self._timer = wm.event_timer_add(0.25, window=context.window)
         wm.modal_handler_add(self)
-        self._last_files = set(os.listdir(context.scene.lip_sync.monitor_folder))
-        logger.info(f"开始监听文件夹: {context.scene.lip_sync.monitor_folder}")
-        logger.info(f"初始文件列表: {self._last_files}")
+        logger.info(f"开始监听文件夹: {monitor_folder}, 方式: {self._watcher.backend}")
         logger.info(f"监听状态: {context.scene.lip_sync.is_listening}")
         context.scene.lip_sync.is_monitoring = True
         return {'RUNNING_MODAL'}
@@ -204,6 +325,9 @@ class LIPSYNC_OT_monitor_folder(bpy.types.Operator):
         if self._timer is not None:
             wm.event_timer_remove(self._timer)
             self._timer = None
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
         logger.info("停止监听文件夹")
         context.scene.lip_sync.is_monitoring = False
 
@@ -280,7 +404,26 @@ def draw_panel(context, layout):
     layout.prop(lip_sync, "mouth_object", text="唇型对象")
     layout.prop(lip_sync, "frame_rate", text="帧率")
     layout.prop(lip_sync, "silence_threshold", text="静音阈值")
+    row = layout.row()
+    row.prop(lip_sync, "use_keyframe_reduction", text="精简关键帧")
+    sub = row.row()
+    sub.enabled = lip_sync.use_keyframe_reduction
+    sub.prop(lip_sync, "reduction_tolerance", text="容差")
     layout.prop(lip_sync, "max_silence_frames", text="最大静音帧数")
+    layout.prop(lip_sync, "analysis_profile", text="分析配置")
+    layout.prop(lip_sync, "use_streaming_analysis", text="流式分析")
+    row = layout.row()
+    row.prop(lip_sync, "use_analysis_worker", text="后台分析")
+    if lip_sync.use_analysis_worker:
+        if not analysis_worker.is_alive():
+            row.label(text="未启动", icon='ERROR')
+        elif not analysis_worker.ready:
+            row.label(text="预热中...")
+        else:
+            row.label(text=f"就绪, 等待中的任务: {analysis_worker.pending()}")
+    row = layout.row()
+    row.prop(lip_sync, "use_feature_cache", text="特征缓存")
+    row.label(text=f"命中 {feature_cache.hits} / 未命中 {feature_cache.misses}")
     layout.prop(lip_sync, "language", text="语言")
 
     layout.separator()
@@ -319,8 +462,14 @@ def register():
     for cls in classes:
         bpy.utils.register_class(cls)
     bpy.types.Scene.lip_sync = bpy.props.PointerProperty(type=LipSyncProperties)
+    bpy.app.handlers.load_post.append(_start_analysis_worker_on_load)
 
 def unregister():
+    if _start_analysis_worker_on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_start_analysis_worker_on_load)
+    if bpy.app.timers.is_registered(_poll_analysis_worker):
+        bpy.app.timers.unregister(_poll_analysis_worker)
+    analysis_worker.stop()
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
     del bpy.types.Scene.lip_sync
@@ -0,0 +1,160 @@
+# 命令行批量烘焙口型: 不依赖 bpy, 在多进程中分析音频并把口型轨道写入旁车文件(<音频>.visemes.json)
+# 运行: python lip_sync_bake.py Voice/ other.wav --jobs 8 --language chinese
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from lip_sync_core import LipSyncCore, ANALYSIS_PROFILES
+
+SIDECAR_SUFFIX = '.visemes.json'
+SIDECAR_VERSION = 1
+AUDIO_EXTENSIONS = ('.wav', '.mp3')
+
+logger = logging.getLogger("LipSyncLogger")
+
+def sidecar_path(audio_file, output_dir=None):
+    directory = output_dir or os.path.dirname(os.path.abspath(audio_file))
+    return os.path.join(directory, os.path.basename(audio_file) + SIDECAR_SUFFIX)
+
+def _audio_signature(audio_file):
+    stat = os.stat(audio_file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def write_sidecar(audio_file, visemes, params, output_dir=None):
+    path = sidecar_path(audio_file, output_dir)
+    data = {
+        'version': SIDECAR_VERSION,
+        'audio': os.path.basename(audio_file),
+        'audio_signature': _audio_signature(audio_file),
+        'params': params,
+        'visemes': [viseme for _, viseme, _ in visemes],
+        'strengths': [float(strength) for _, _, strength in visemes],
+    }
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(temp_path, path)
+    return path
+
+def _normalize_params(params):
+    # 插件的参数来自 Blender 的 FloatProperty(单精度, 0.01 读出来是 0.009999999776...), 命令行的是双精度;
+    # 浮点数统一转成单精度再保留6位小数后比较
+    return {key: round(float(np.float32(value)), 6) if isinstance(value, float) else value
+            for key, value in json.loads(json.dumps(params)).items()}
+
+def load_baked_visemes(audio_file, params, output_dir=None):
+    # 旁车文件存在、音频未改动且参数一致时返回烘焙好的口型, 否则返回 None
+    path = sidecar_path(audio_file, output_dir)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (data.get('version') != SIDECAR_VERSION
+            or data.get('audio_signature') != _audio_signature(audio_file)
+            or not isinstance(data.get('params'), dict)
+            or _normalize_params(data['params']) != _normalize_params(params)):
+        return None
+    return list(zip(range(len(data['visemes'])), data['visemes'], data['strengths']))
+
+def collect_audio_files(paths, recursive=False):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names) if name.lower().endswith(AUDIO_EXTENSIONS))
+                if not recursive:
+                    break
+        else:
+            files.append(path)
+    return files
+
+_worker_core = None
+
+def _init_worker(core_kwargs, log_level):
+    global _worker_core
+    logger.setLevel(log_level)
+    _worker_core = LipSyncCore(**core_kwargs)
+
+def _bake_file(audio_file, streaming, output_dir, force):
+    start = time.perf_counter()
+    params = _worker_core.analysis_params(streaming)
+    if not force and load_baked_visemes(audio_file, params, output_dir) is not None:
+        return {'file': audio_file, 'skipped': True, 'frames': 0, 'elapsed': time.perf_counter() - start}
+    if streaming:
+        visemes = list(_worker_core.analyze_audio_stream(audio_file))
+    else:
+        visemes = _worker_core.analyze_audio(audio_file)
+    path = write_sidecar(audio_file, visemes, params, output_dir)
+    return {'file': audio_file, 'sidecar': path, 'skipped': False, 'frames': len(visemes), 'elapsed': time.perf_counter() - start}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量分析音频并烘焙口型轨道")
+    parser.add_argument('paths', nargs='+', help="音频文件或目录")
+    parser.add_argument('-r', '--recursive', action='store_true', help="递归处理子目录")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="进程数, 默认为CPU核数")
+    parser.add_argument('-o', '--output-dir', help="旁车文件输出目录, 默认与音频文件同目录")
+    parser.add_argument('--frame-rate', type=float, default=24.0)
+    parser.add_argument('--silence-threshold', type=float, default=0.01)
+    parser.add_argument('--max-silence-frames', type=int, default=5)
+    parser.add_argument('--language', default='chinese', choices=['chinese', 'english'])
+    parser.add_argument('--profile', default='standard', choices=list(ANALYSIS_PROFILES))
+    parser.add_argument('--streaming', action='store_true', help="使用流式分析, 适合很长的音频")
+    parser.add_argument('--force', action='store_true', help="忽略已有的旁车文件重新分析")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    files = collect_audio_files(args.paths, args.recursive)
+    if not files:
+        print("没有找到音频文件")
+        return 1
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    core_kwargs = {
+        'frame_rate': args.frame_rate,
+        'silence_threshold': args.silence_threshold,
+        'max_silence_frames': args.max_silence_frames,
+        'language': args.language,
+        'profile': args.profile,
+    }
+    log_level = logging.DEBUG if args.verbose else logging.WARNING
+    jobs = max(1, min(args.jobs, len(files)))
+    print(f"开始烘焙 {len(files)} 个音频文件, 进程数: {jobs}")
+
+    start = time.perf_counter()
+    baked, skipped, failures = [], [], []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(core_kwargs, log_level)) as executor:
+        futures = {executor.submit(_bake_file, audio_file, args.streaming, args.output_dir, args.force): audio_file for audio_file in files}
+        for future in as_completed(futures):
+            audio_file = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures.append((audio_file, f"{type(e).__name__}: {str(e)}"))
+                print(f"失败: {audio_file}: {type(e).__name__}: {str(e)}")
+                continue
+            if result['skipped']:
+                skipped.append(result)
+                print(f"跳过(已烘焙): {audio_file}")
+            else:
+                baked.append(result)
+                print(f"完成: {audio_file} -> {result['sidecar']}, {result['frames']} 帧, {result['elapsed']:.2f}s")
+    wall_time = time.perf_counter() - start
+
+    frames = sum(result['frames'] for result in baked)
+    audio_seconds = frames / args.frame_rate
+    print(f"\n烘焙 {len(baked)} 个, 跳过 {len(skipped)} 个, 失败 {len(failures)} 个, 用时 {wall_time:.2f}s")
+    if baked:
+        print(f"音频总时长 {audio_seconds:.1f}s, 吞吐量 {frames / wall_time:,.0f} 帧/秒, {audio_seconds / wall_time:.1f}x 实时")
+    for audio_file, error in failures:
+        print(f"  失败: {audio_file}: {error}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
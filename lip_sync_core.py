@@ -1,9 +1,16 @@
-import librosa
 import numpy as np
-import bpy
+import itertools
+import functools
 import logging
 import time  # Add this line to import the time module
 
+try:
+    import bpy
+except ImportError:  # 在Blender之外(基准测试等)只使用分析部分
+    bpy = None
+
+# librosa(及numba)、soundfile、soxr 导入很慢, 在用到的函数里才导入, 避免拖慢插件注册
+
 logger = logging.getLogger("LipSyncLogger")
 logger.setLevel(logging.DEBUG)
 
@@ -39,12 +46,100 @@ CHINESE_PHONEME_TO_VISEME = {
     'ang': 'E', 'eng': 'E', 'ing': 'E', 'ong': 'E'
 }
 
+N_MELS = 10
+N_CHROMA = 12
+
+# 分析配置: standard 与 librosa.load / melspectrogram / chroma_stft 的默认参数一致;
+# fast 用低采样率、快速重采样和较短的FFT换取速度, energy_scale 用于补偿FFT长度对能量的影响,
+# 使静音阈值与 standard 含义相近(由合成语音标定)
+ANALYSIS_PROFILES = {
+    'standard': {'sr': 22050, 'n_fft': 2048, 'res_type': 'soxr_hq', 'energy_scale': 1.0},
+    'fast': {'sr': 11025, 'n_fft': 512, 'res_type': 'soxr_qq', 'energy_scale': 11.0},
+}
+
+@functools.lru_cache(maxsize=8)
+def mel_filterbank(sr, n_fft, n_mels=N_MELS):
+    import librosa
+    basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+    basis.setflags(write=False)
+    return basis
+
+@functools.lru_cache(maxsize=64)
+def chroma_filterbank(sr, n_fft, tuning, n_chroma=N_CHROMA):
+    # 估计出的调音偏差以0.01为步长, 缓存的滤波器组数量有限
+    import librosa
+    basis = librosa.filters.chroma(sr=sr, n_fft=n_fft, tuning=tuning, n_chroma=n_chroma)
+    basis.setflags(write=False)
+    return basis
+
+# 以下只供流式分析使用: 流式分析拿不到整段的功率谱, 只能逐块收集谱峰, 所以复制了 librosa.piptrack 的阈值和抛物线插值
+# 整段分析直接调用 librosa.estimate_tuning; 升级 librosa 后运行 benchmarks/bench_streaming_analysis.py, 它会核对两者是否仍然一致
+# 与 librosa.piptrack 的默认参数相同
+PIPTRACK_FMIN = 150.0
+PIPTRACK_FMAX = 4000.0
+PIPTRACK_THRESHOLD = 0.1
+
+def _parabolic_shift(S):
+    # 与 librosa 的抛物线插值逐位一致(numba 模板中的 2 * x 按 float64 计算), 首尾频点为0
+    shift = np.zeros_like(S)
+    prev, x, nxt = S[:-2], S[1:-1], S[2:]
+    a = (nxt + prev).astype(np.float64) - 2 * x.astype(np.float64)
+    b = (nxt - prev).astype(np.float64) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shift[1:-1] = np.where(np.abs(b) >= np.abs(a), 0.0, -b / a)
+    return shift
+
+def _tuning_peaks(power, sr, n_fft):
+    # 与 librosa.piptrack(S=power) 得到的谱峰 (频率, 幅度) 逐位一致, 但只在 fmin~fmax 的频带上计算(两侧各多取一个频点);
+    # 所有运算都在每一帧内进行, 分块计算后拼接与整段计算的结果相同
+    import librosa
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+    band = np.flatnonzero((PIPTRACK_FMIN <= freqs) & (freqs < min(PIPTRACK_FMAX, sr / 2)))
+    if band.size == 0 or power.shape[1] == 0:
+        return np.empty(0, dtype=power.dtype), np.empty(0, dtype=power.dtype)
+    lo, hi = band[0], band[-1] + 1
+    start = max(lo - 1, 0)
+    S = power[start:min(hi + 1, power.shape[0])]
+    inner = slice(lo - start, hi - start)
+    ref_value = PIPTRACK_THRESHOLD * np.max(power, axis=0)
+    rows, cols = np.nonzero(librosa.util.localmax(S * (S > ref_value), axis=0)[inner])
+    shift = _parabolic_shift(S)[inner][rows, cols]
+    avg = np.gradient(S, axis=0)[inner][rows, cols]
+    pitches = np.empty(len(rows), dtype=power.dtype)
+    pitches[:] = (rows + lo + shift) * float(sr) / n_fft
+    return pitches, S[inner][rows, cols] + 0.5 * avg * shift
+
+def _estimate_tuning_from_peaks(pitches, mags):
+    # 与 librosa.estimate_tuning 相同: 取幅度不低于中位数的谱峰, 按频率统计调音偏差
+    import librosa
+    mask = pitches > 0
+    threshold = np.median(mags[mask]) if mask.any() else 0.0
+    return librosa.pitch_tuning(pitches[(mags >= threshold) & mask], resolution=0.01, bins_per_octave=N_CHROMA)
+
+# 口型编码即在 VISEMES 中的下标, -1 表示无口型
+VISEMES = ('A', 'I', 'U', 'E', 'O')
+
+def build_viseme_table(phoneme_to_viseme):
+    # 音素索引 -> 口型编码, 顺序与映射表的键顺序一致
+    return np.array([VISEMES.index(viseme) for viseme in phoneme_to_viseme.values()], dtype=np.int8)
+
+VISEME_TABLES = {
+    'english': build_viseme_table(ENGLISH_PHONEME_TO_VISEME),
+    'chinese': build_viseme_table(CHINESE_PHONEME_TO_VISEME),
+}
+
+# 编码 -> 口型名称, 编码 -1 正好取到末尾的 None
+_VISEME_NAMES = np.array(VISEMES + (None,), dtype=object)
+
 class LipSyncCore:
-    def __init__(self, frame_rate=24.0, silence_threshold=0.01, max_silence_frames=5, language='chinese'):
+    def __init__(self, frame_rate=24.0, silence_threshold=0.01, max_silence_frames=5, language='chinese', tuning=None, feature_cache=None, profile='standard'):
         self.frame_rate = frame_rate
         self.silence_threshold = silence_threshold
         self.max_silence_frames = max_silence_frames
+        self.tuning = tuning  # 色度图的调音偏差, None 表示由音频估计
+        self.feature_cache = feature_cache
         self.set_language(language)
+        self.set_profile(profile)
         logger.debug(f"LipSyncCore 初始化: frame_rate={frame_rate}, silence_threshold={silence_threshold}, max_silence_frames={max_silence_frames}, language={language}")
 
     def set_language(self, language):
@@ -54,56 +149,243 @@ class LipSyncCore:
             self.phoneme_to_viseme = CHINESE_PHONEME_TO_VISEME
         else:
             raise ValueError("Unsupported language. Choose 'english' or 'chinese'.")
+        self.language = language.lower()
+        self.viseme_table = VISEME_TABLES[self.language]
         logger.info(f"设置语言为: {language}")
 
+    def set_profile(self, profile):
+        if profile not in ANALYSIS_PROFILES:
+            raise ValueError(f"Unsupported analysis profile. Choose one of {', '.join(ANALYSIS_PROFILES)}.")
+        self.profile = profile
+        settings = ANALYSIS_PROFILES[profile]
+        self.sample_rate = settings['sr']
+        self.n_fft = settings['n_fft']
+        self.res_type = settings['res_type']
+        self.energy_scale = settings['energy_scale']
+        logger.info(f"设置分析配置为: {profile}")
+
     def analyze_audio(self, audio_file):
         logger.info(f"开始分析音频文件: {audio_file}")
-        y, sr = librosa.load(audio_file)
+        total_frames, mel_spec, chroma = self.extract_features(audio_file)
+        visemes = self.generate_visemes(total_frames, mel_spec, chroma)
+        logger.info(f"生成了 {len(visemes)} 个口型数据点")
+        return visemes
+
+    def feature_params(self):
+        # 影响特征矩阵的参数; 静音阈值、静音帧数和语言只影响口型阶段
+        return {
+            'sr': self.sample_rate,
+            'n_fft': self.n_fft,
+            'res_type': self.res_type,
+            'energy_scale': self.energy_scale,
+            'n_mels': N_MELS,
+            'n_chroma': N_CHROMA,
+            'hop_length': int(self.sample_rate / self.frame_rate),
+            'frame_rate': self.frame_rate,
+            'tuning': self.tuning,
+        }
+
+    def analysis_params(self, streaming=False):
+        # 决定口型结果的全部参数, 用于判断预先烘焙的结果是否可用; 流式和整段分析的结果分开记录
+        params = self.feature_params()
+        params.update({
+            'silence_threshold': self.silence_threshold,
+            'max_silence_frames': self.max_silence_frames,
+            'language': self.language,
+            'streaming': streaming,
+        })
+        return params
+
+    def extract_features(self, audio_file):
+        if self.feature_cache is not None:
+            cache_key = self.feature_cache.make_key(audio_file, self.feature_params())
+            cached = self.feature_cache.load(cache_key)
+            if cached is not None:
+                logger.info(f"命中特征缓存: {cache_key[:12]}")
+                return int(cached['total_frames']), cached['mel_spec'], cached['chroma']
+
+        import librosa
+        y, sr = librosa.load(audio_file, sr=self.sample_rate, res_type=self.res_type)
         duration = librosa.get_duration(y=y, sr=sr)
         logger.info(f"音频已加载. 采样率: {sr}, 音频时长: {duration} 秒")
 
         total_frames = int(duration * self.frame_rate)
         logger.debug(f"总帧数: {total_frames}")
 
-        mel_spec = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=10, hop_length=int(sr/self.frame_rate))
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr, hop_length=int(sr/self.frame_rate))
+        mel_spec, chroma = self.compute_features(y, sr)
         logger.debug(f"生成 Mel 频谱图和色度图. Mel 频谱图形状: {mel_spec.shape}, 色度图形状: {chroma.shape}")
 
-        visemes = self.generate_visemes(total_frames, mel_spec, chroma)
-        logger.info(f"生成了 {len(visemes)} 个口型数据点")
-        return visemes
+        if self.feature_cache is not None:
+            mel_spec, chroma = mel_spec[:, :total_frames], chroma[:, :total_frames]
+            self.feature_cache.store(cache_key, total_frames=np.array(total_frames), mel_spec=mel_spec, chroma=chroma)
+        return total_frames, mel_spec, chroma
 
-    def generate_visemes(self, total_frames, mel_spec, chroma):
-        logger.debug("开始生成口型序列")
-        visemes = []
-        silence_counter = 0
-        current_viseme = None
-
-        for frame in range(total_frames):
-            time = frame / self.frame_rate
-            frame_energy = np.sum(mel_spec[:, frame])
-
-            if frame_energy > self.silence_threshold:
-                pitch_frame = np.argmax(mel_spec[:, frame])
-                chroma_frame = np.argmax(chroma[:, frame])
-                phoneme_index = (pitch_frame + chroma_frame) % len(self.phoneme_to_viseme)
-                current_phoneme = list(self.phoneme_to_viseme.keys())[phoneme_index]
-                current_viseme = self.phoneme_to_viseme[current_phoneme]
-                silence_counter = 0
-            elif silence_counter >= self.max_silence_frames:
-                current_viseme = None
+    def compute_features(self, y, sr):
+        # 只做一次STFT, Mel频谱图和色度图都从同一个功率谱得到
+        power = self._power_spectrogram(y, int(sr/self.frame_rate))
+        # 调音偏差也从同一个功率谱估计, 不再单独做一次STFT
+        tuning = self.tuning
+        if tuning is None:
+            import librosa
+            tuning = librosa.estimate_tuning(S=power, sr=sr, n_fft=self.n_fft, bins_per_octave=N_CHROMA)
+        return self._features_from_power(power, mel_filterbank(sr, self.n_fft), chroma_filterbank(sr, self.n_fft, tuning))
+
+    def analyze_audio_stream(self, audio_file, block_seconds=10.0):
+        # 流式分析: 分块解码、重采样并计算特征, 逐帧产出 (帧, 口型, 强度); 只有估计调音偏差用的谱峰随时长增长(每分钟约 0.2 MB)
+        # 未指定调音偏差时先把整个文件过一遍估计调音偏差(与整段分析用同样的全部谱峰), 再分析; 结果与 analyze_audio 一致
+        # 不读写特征缓存, 缓存里只有整段分析的特征
+        logger.info(f"开始流式分析音频文件: {audio_file}")
+        import soundfile
+        try:
+            info = soundfile.info(audio_file)
+        except RuntimeError as e:
+            logger.warning(f"无法流式解码音频文件, 改为整段分析: {str(e)}")
+            yield from self.analyze_audio(audio_file)
+            return
+
+        sr = self.sample_rate
+        n_fft = self.n_fft
+        sample_count = int(np.ceil(info.frames * sr / info.samplerate))
+        total_frames = int(sample_count / sr * self.frame_rate)
+        logger.info(f"原始采样率: {info.samplerate}, 声道数: {info.channels}, 音频时长: {sample_count / sr} 秒, 总帧数: {total_frames}")
+
+        tuning = self.tuning
+        if tuning is None:
+            peaks = [_tuning_peaks(power, sr, n_fft) for power in self._stream_power(audio_file, info.samplerate, block_seconds, sample_count)]
+            tuning = _estimate_tuning_from_peaks(np.concatenate([pitches for pitches, _ in peaks]), np.concatenate([mags for _, mags in peaks]))
+            del peaks
+            logger.info(f"估计的调音偏差: {tuning}")
+
+        mel_basis = mel_filterbank(sr, n_fft)
+        chroma_basis = chroma_filterbank(sr, n_fft, tuning)
+        state = (-1, 0)
+        frame = 0
+        for power in self._stream_power(audio_file, info.samplerate, block_seconds, sample_count, total_frames):
+            mel_spec, chroma = self._features_from_power(power, mel_basis, chroma_basis)
+            codes, strengths, state = self.generate_viseme_codes(mel_spec, chroma, state)
+            for offset, (viseme, strength) in enumerate(zip(_VISEME_NAMES[codes].tolist(), strengths.tolist())):
+                yield frame + offset, viseme, strength
+            frame += len(codes)
+
+        logger.info(f"流式分析完成, 生成了 {frame} 个口型数据点")
+
+    def _stream_power(self, audio_file, native_sr, block_seconds, sample_count, max_frames=None):
+        # 逐块产出功率谱, 帧的划分与整段 STFT(center=True) 相同; max_frames 为 None 时产出 STFT 的全部帧
+        n_fft = self.n_fft
+        hop_length = int(self.sample_rate / self.frame_rate)
+        frame = 0
+        # 与 center=True 相同: 首尾各补 n_fft // 2 个零, 块与块之间保留未用完的样本作为重叠
+        buffer = np.zeros(n_fft // 2, dtype=np.float32)
+        blocks = self._decode_blocks(audio_file, native_sr, self.sample_rate, block_seconds, sample_count)
+        for block in itertools.chain(blocks, [np.zeros(n_fft // 2, dtype=np.float32)]):
+            buffer = np.concatenate((buffer, block))
+            if len(buffer) < n_fft:
+                continue
+            frame_count = 1 + (len(buffer) - n_fft) // hop_length
+            if max_frames is not None:
+                frame_count = min(frame_count, max_frames - frame)
+            if frame_count <= 0:
+                continue
+            yield self._power_spectrogram(buffer[:(frame_count - 1) * hop_length + n_fft], hop_length, center=False)
+            frame += frame_count
+            buffer = buffer[frame_count * hop_length:]
+
+    def _decode_blocks(self, audio_file, native_sr, sr, block_seconds, sample_count):
+        # 逐块解码为单声道并重采样, 输出长度与 librosa.load 一致
+        import soundfile
+        import soxr
+        resampler = soxr.ResampleStream(native_sr, sr, 1, dtype='float32', quality=self.res_type) if native_sr != sr else None
+        remaining = sample_count
+        blocks = soundfile.blocks(audio_file, blocksize=int(block_seconds * native_sr), dtype='float32', always_2d=True)
+        for block in itertools.chain(blocks, [None]):
+            if block is None:
+                if resampler is None:
+                    break
+                y = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
             else:
-                silence_counter += 1
+                y = block.mean(axis=1)
+                if resampler is not None:
+                    y = resampler.resample_chunk(y)
+            y = y[:remaining]
+            remaining -= len(y)
+            if len(y):
+                yield y
+        if remaining > 0:
+            yield np.zeros(remaining, dtype=np.float32)
+
+    def _power_spectrogram(self, y, hop_length, center=True):
+        import librosa
+        return np.abs(librosa.stft(y, n_fft=self.n_fft, hop_length=hop_length, center=center)) ** 2
 
-            viseme_strength = min(1.0, frame_energy / self.silence_threshold) if current_viseme else 0.0
-            visemes.append((frame, current_viseme, viseme_strength))
-            if frame % 100 == 0:  # 每100帧打印一次，避免日志过多
-                logger.debug(f"帧 {frame}: 时间 {time:.2f}s, 口型 {current_viseme}, 强度 {viseme_strength:.2f}, 能量 {frame_energy:.4f}, 静音计数 {silence_counter}")
+    def _features_from_power(self, power, mel_basis, chroma_basis):
+        # 与 librosa.feature.melspectrogram / chroma_stft 的计算方式相同
+        import librosa
+        mel_spec = np.einsum("ft,mf->mt", power, mel_basis, optimize=True)
+        if self.energy_scale != 1.0:
+            mel_spec *= self.energy_scale
+        raw_chroma = np.einsum("cf,ft->ct", chroma_basis, power, optimize=True)
+        return mel_spec, librosa.util.normalize(raw_chroma, norm=np.inf, axis=0)
 
+    def generate_visemes(self, total_frames, mel_spec, chroma):
+        logger.debug("开始生成口型序列")
+        codes, strengths, _ = self.generate_viseme_codes(mel_spec[:, :total_frames], chroma[:, :total_frames])
+        visemes = list(zip(range(total_frames), _VISEME_NAMES[codes].tolist(), strengths.tolist()))
         logger.debug("口型序列生成完成")
         return visemes
 
-    def apply_visemes_to_mesh(self, obj, visemes, action_name):
+    def generate_viseme_codes(self, mel_spec, chroma, state=(-1, 0)):
+        # 整段矩阵一次性计算, 返回 (口型编码, 强度, 结束状态)
+        # state 为 (当前口型编码, 静音计数), 用于分块处理时衔接上一块
+        current_code, silence_counter = state
+        frame_count = mel_spec.shape[1]
+        if frame_count == 0:
+            return np.empty(0, dtype=np.int8), np.empty(0, dtype=mel_spec.dtype), state
+
+        # 转置成连续内存后按行求和, 与逐帧 np.sum(mel_spec[:, frame]) 的结果逐位一致
+        frame_energy = np.ascontiguousarray(mel_spec.T).sum(axis=1)
+        voiced = frame_energy > self.silence_threshold
+        phoneme_index = (np.argmax(mel_spec, axis=0) + np.argmax(chroma, axis=0)) % len(self.viseme_table)
+        voiced_codes = self.viseme_table[phoneme_index]
+
+        # 静音迟滞: 有声帧之后的前 max_silence_frames 个静音帧保持上一个口型
+        frames = np.arange(frame_count)
+        last_voiced = np.maximum.accumulate(np.where(voiced, frames, -1))
+        has_voiced = last_voiced >= 0
+        run_length = frames - last_voiced + np.where(has_voiced, 0, silence_counter)
+        held_codes = np.where(has_voiced, voiced_codes[last_voiced], current_code)
+        codes = np.where(voiced, voiced_codes, np.where(run_length <= self.max_silence_frames, held_codes, -1)).astype(np.int8)
+        counters = np.where(voiced, 0, np.minimum(run_length, self.max_silence_frames))
+
+        # 按标量除法的结果类型计算强度, 保证与逐帧计算的数值一致
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio_dtype = np.result_type(frame_energy.dtype.type(1) / self.silence_threshold)
+            ratio = frame_energy.astype(ratio_dtype) / self.silence_threshold
+        strengths = np.where(codes >= 0, np.fmin(1.0, ratio), 0.0)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            for frame in range(0, frame_count, 100):  # 每100帧打印一次，避免日志过多
+                logger.debug(f"帧 {frame}: 时间 {frame / self.frame_rate:.2f}s, 口型 {_VISEME_NAMES[codes[frame]]}, 强度 {strengths[frame]:.2f}, 能量 {frame_energy[frame]:.4f}, 静音计数 {counters[frame]}")
+
+        return codes, strengths, (int(codes[-1]), int(counters[-1]))
+
+    def visemes_to_arrays(self, visemes):
+        # (帧, 口型, 强度) 列表 -> (帧数组, 口型编码数组, 强度数组)
+        count = len(visemes)
+        frames = np.fromiter((frame for frame, _, _ in visemes), dtype=np.float32, count=count)
+        codes = np.fromiter((VISEMES.index(viseme) if viseme else -1 for _, viseme, _ in visemes), dtype=np.int8, count=count)
+        strengths = np.fromiter((strength for _, _, strength in visemes), dtype=np.float32, count=count)
+        return frames, codes, strengths
+
+    def build_viseme_channels(self, codes, strengths):
+        # 每个口型一条曲线: 当前口型取强度, 其余为0
+        strengths = np.asarray(strengths, dtype=np.float32)
+        return {viseme: np.where(codes == index, strengths, np.float32(0.0)) for index, viseme in enumerate(VISEMES)}
+
+    def apply_visemes_to_mesh(self, obj, visemes, action_name, reducer=None):
+        frames, codes, strengths = self.visemes_to_arrays(visemes)
+        return self.apply_viseme_arrays_to_mesh(obj, frames, codes, strengths, action_name, reducer)
+
+    def apply_viseme_arrays_to_mesh(self, obj, frames, codes, strengths, action_name, reducer=None):
         logger.info(f"开始将口型应用到网格, 对象: {obj.name}, 动作名称: {action_name}")
         if not obj.data.shape_keys:
             sk_basis = obj.shape_key_add(name='Basis')
@@ -111,7 +393,7 @@ class LipSyncCore:
             logger.info("创建了'Basis'形态键")
 
         shape_keys = obj.data.shape_keys.key_blocks
-        for viseme in ['A', 'I', 'U', 'E', 'O']:
+        for viseme in VISEMES:
             if viseme not in shape_keys:
                 obj.shape_key_add(name=viseme)
                 logger.info(f"创建了形态键: {viseme}")
@@ -122,15 +404,50 @@ class LipSyncCore:
         obj.data.shape_keys.animation_data.action = lip_sync_action
         logger.debug(f"创建了新的动作: {action_name}")
 
-        for frame, viseme, strength in visemes:
-            for shape_key in shape_keys:
-                if shape_key.name in ['A', 'I', 'U', 'E', 'O']:
-                    shape_key.value = strength if shape_key.name == viseme else 0.0
-                    shape_key.keyframe_insert("value", frame=frame)
+        # 直接在动作中批量写入F曲线, 不逐帧 keyframe_insert, 也不修改形态键的当前值
+        # 精简后的曲线按直线插值写入: 精简误差按相邻保留关键帧之间的直线计算, 贝塞尔插值会超出容差
+        keyframe_settings = self._keyframe_defaults(interpolation='LINEAR' if reducer else None)
+        for viseme, values in self.build_viseme_channels(codes, strengths).items():
+            if reducer:
+                kept = reducer.reduce(frames, values)
+                self.write_fcurve(lip_sync_action, f'key_blocks["{viseme}"].value', frames[kept], values[kept], keyframe_settings)
+            else:
+                self.write_fcurve(lip_sync_action, f'key_blocks["{viseme}"].value', frames, values, keyframe_settings)
+
+        if reducer:
+            logger.info(f"精简关键帧: {reducer.keys_before} -> {reducer.keys_after}, 移除 {reducer.removed_count} 个")
 
         logger.info("完成将口型应用到网格")
         return lip_sync_action
 
+    def write_fcurve(self, action, data_path, frames, values, keyframe_settings):
+        count = len(frames)
+        if count == 0:
+            return None
+        fcurve = action.fcurves.new(data_path=data_path)
+        keyframe_points = fcurve.keyframe_points
+        keyframe_points.add(count)
+
+        co = np.empty(count * 2, dtype=np.float32)
+        co[0::2] = frames
+        co[1::2] = values
+        keyframe_points.foreach_set("co", co)
+        for prop, value in keyframe_settings.items():
+            keyframe_points.foreach_set(prop, np.full(count, value, dtype=np.int32))
+        fcurve.update()
+        return fcurve
+
+    def _keyframe_defaults(self, interpolation=None):
+        # 与 keyframe_insert 一致, 使用偏好设置中新关键帧的插值与控制柄类型; interpolation 指定时覆盖偏好设置中的插值
+        edit = bpy.context.preferences.edit
+        properties = bpy.types.Keyframe.bl_rna.properties
+        handle_type = properties['handle_left_type'].enum_items[edit.keyframe_new_handle_type].value
+        return {
+            'interpolation': properties['interpolation'].enum_items[interpolation or edit.keyframe_new_interpolation_type].value,
+            'handle_left_type': handle_type,
+            'handle_right_type': handle_type,
+        }
+
     def create_nla_track(self, obj, action, track_name, strip_name):
         logger.info(f"开始创建NLA轨道, 对象: {obj.name}, 轨道名称: {track_name}, 条带名称: {strip_name}")
         if not obj.animation_data:
@@ -0,0 +1,80 @@
+import os
+import json
+import hashlib
+import zipfile
+import logging
+import numpy as np
+
+logger = logging.getLogger("LipSyncLogger")
+
+class FeatureCache:
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, audio_file, params):
+        # 键由音频内容和影响特征的参数共同决定, 与文件名和路径无关
+        digest = hashlib.sha256()
+        with open(audio_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def load(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                features = {name: data[name] for name in data.files}
+            os.utime(path)  # 以修改时间记录最近使用时间, 供LRU淘汰
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            logger.warning(f"特征缓存文件损坏, 已忽略: {path}, {str(e)}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return features
+
+    def store(self, key, **features):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                np.savez_compressed(f, **features)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"写入特征缓存失败: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self._evict()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _evict(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.npz'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                logger.debug(f"淘汰特征缓存: {path}")
+            except OSError:
+                pass
@@ -0,0 +1,173 @@
+# 音频文件夹监听: 在后台线程中等待新文件, 文件大小和修改时间稳定一段时间后才放入队列, 避免分析写了一半的音频
+# Linux 上使用 inotify, 其它平台退回到轮询; 轮询时只有文件夹本身的修改时间变化才重新列目录
+import os
+import sys
+import time
+import queue
+import struct
+import select
+import logging
+import threading
+import ctypes
+import ctypes.util
+
+logger = logging.getLogger("LipSyncLogger")
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3')
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct('iIII')
+
+def _open_inotify(folder):
+    # 返回 inotify 文件描述符, 不可用时返回 None
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF
+        if libc.inotify_add_watch(fd, os.fsencode(folder), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(error, os.strerror(error))
+        return fd
+    except (OSError, AttributeError) as e:
+        logger.warning(f"inotify 不可用, 改为轮询: {str(e)}")
+        return None
+
+class FolderWatcher:
+    def __init__(self, folder, extensions=AUDIO_EXTENSIONS, settle_time=0.5, poll_interval=1.0):
+        self.folder = folder
+        self.extensions = extensions
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.queue = queue.Queue()
+        self.backend = None
+        self._pending = {}  # 文件名 -> (大小, 修改时间, 最后一次变化的时间)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if not os.path.isdir(self.folder):
+            raise FileNotFoundError(f"监听文件夹不存在: {self.folder}")
+        self._stop_event.clear()
+        # 在调用线程中完成监听注册或初始快照, start() 返回后新建的文件都不会漏掉
+        fd = _open_inotify(self.folder)
+        if fd is not None:
+            self.backend = 'inotify'
+            target, args = self._run_inotify, (fd,)
+        else:
+            self.backend = 'polling'
+            target, args = self._run_polling, (os.stat(self.folder).st_mtime_ns, self._scan())
+        self._thread = threading.Thread(target=target, args=args, name="LipSyncFolderWatcher", daemon=True)
+        self._thread.start()
+        logger.info(f"开始监听文件夹({self.backend}): {self.folder}")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=2)
+        self._thread = None
+        self._pending.clear()
+        logger.info(f"停止监听文件夹: {self.folder}")
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _is_audio(self, name):
+        return name.lower().endswith(self.extensions)
+
+    def _touch(self, name):
+        # 记录一次变化, 稳定计时从这里重新开始
+        if self._is_audio(name):
+            self._pending[name] = (None, None, time.monotonic())
+
+    def _check_pending(self):
+        # 大小和修改时间在 settle_time 内都没有变化的文件才交出去
+        now = time.monotonic()
+        for name, (size, mtime, changed_at) in list(self._pending.items()):
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[name]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                self._pending[name] = (stat.st_size, stat.st_mtime_ns, now)
+            elif stat.st_size > 0 and now - changed_at >= self.settle_time:
+                del self._pending[name]
+                logger.info(f"检测到新的音频文件: {name}")
+                self.queue.put(path)
+
+    def _wait_timeout(self):
+        return min(self.settle_time / 2, self.poll_interval) if self._pending else self.poll_interval
+
+    def _run_inotify(self, fd):
+        started = time.time()
+        try:
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([fd], [], [], self._wait_timeout())
+                if readable:
+                    try:
+                        data = os.read(fd, 64 * 1024)
+                    except BlockingIOError:
+                        data = b''
+                    if not self._handle_events(data, started):
+                        break
+                self._check_pending()
+        finally:
+            os.close(fd)
+
+    def _handle_events(self, data, started):
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & (IN_DELETE_SELF | IN_IGNORED):
+                logger.error(f"监听文件夹已被删除: {self.folder}")
+                return False
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出时丢失了事件, 把监听开始后修改过的文件重新检查一遍
+                logger.warning("inotify 事件队列溢出, 重新扫描文件夹")
+                with os.scandir(self.folder) as it:
+                    for entry in it:
+                        if entry.is_file() and entry.stat().st_mtime >= started:
+                            self._touch(entry.name)
+            elif name:
+                self._touch(name)
+        return True
+
+    def _scan(self):
+        with os.scandir(self.folder) as it:
+            return {entry.name for entry in it if entry.is_file() and self._is_audio(entry.name)}
+
+    def _run_polling(self, folder_mtime, known):
+        while not self._stop_event.wait(self._wait_timeout()):
+            try:
+                mtime = os.stat(self.folder).st_mtime_ns
+                if mtime != folder_mtime:
+                    # 只有新建、删除或重命名文件时才需要重新列目录
+                    folder_mtime = mtime
+                    current = self._scan()
+                    for name in current - known:
+                        self._touch(name)
+                    known = current
+            except OSError as e:
+                logger.error(f"无法读取监听文件夹: {str(e)}")
+                return
+            self._check_pending()
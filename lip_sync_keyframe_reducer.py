@@ -0,0 +1,48 @@
+import numpy as np
+
+class KeyframeReducer:
+    def __init__(self, tolerance=0.01):
+        self.tolerance = tolerance
+        self.keys_before = 0
+        self.keys_after = 0
+
+    @property
+    def removed_count(self):
+        return self.keys_before - self.keys_after
+
+    def reduce(self, frames, values):
+        # 返回需要保留的关键帧下标; 误差按相邻保留关键帧之间的线性插值估算, 写入时必须使用线性插值(LINEAR)才能保证容差
+        count = len(values)
+        self.keys_before += count
+        if count <= 2:
+            self.keys_after += count
+            return np.arange(count)
+
+        # 保持段(前后值都相同)内部的关键帧是多余的
+        hold = (values[1:-1] == values[:-2]) & (values[1:-1] == values[2:])
+        candidates = np.flatnonzero(np.concatenate(([True], ~hold, [True])))
+
+        kept = candidates[self._simplify(frames[candidates], values[candidates])]
+        self.keys_after += len(kept)
+        return kept
+
+    def _simplify(self, frames, values):
+        # Douglas-Peucker, 误差为纵向距离
+        count = len(values)
+        keep = np.zeros(count, dtype=bool)
+        keep[0] = keep[-1] = True
+        segments = [(0, count - 1)]
+        while segments:
+            start, end = segments.pop()
+            if end - start < 2:
+                continue
+            t = (frames[start + 1:end] - frames[start]) / (frames[end] - frames[start])
+            line = values[start] + t * (values[end] - values[start])
+            error = np.abs(values[start + 1:end] - line)
+            worst = int(np.argmax(error))
+            if error[worst] > self.tolerance:
+                split = start + 1 + worst
+                keep[split] = True
+                segments.append((start, split))
+                segments.append((split, end))
+        return np.flatnonzero(keep)
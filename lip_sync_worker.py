@@ -0,0 +1,189 @@
+# 常驻后台分析进程: 启动时预先导入 librosa 并完成 numba JIT 编译, 之后在进程内分析音频,
+# 口型数组(帧, 口型编码, 强度)写入共享内存交回主进程, 不经过 pickle 传递元组列表
+import time
+import queue
+import logging
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+from lip_sync_core import LipSyncCore, ANALYSIS_PROFILES
+from lip_sync_feature_cache import FeatureCache
+from lip_sync_bake import load_baked_visemes
+
+logger = logging.getLogger("LipSyncLogger")
+
+def _warm_up():
+    # 用一秒噪声把每种分析配置都跑一遍, 触发导入和 numba 编译
+    rng = np.random.default_rng(0)
+    for profile in ANALYSIS_PROFILES:
+        core = LipSyncCore(profile=profile)
+        y = (0.1 * rng.standard_normal(core.sample_rate)).astype(np.float32)
+        mel_spec, chroma = core.compute_features(y, core.sample_rate)
+        core.generate_viseme_codes(mel_spec, chroma)
+
+def _analyze(audio_file, options, feature_caches):
+    start = time.perf_counter()
+    cache_dir = options.get('cache_dir')
+    feature_cache = None
+    if cache_dir:
+        feature_cache = feature_caches.get(cache_dir)
+        if feature_cache is None:
+            feature_cache = feature_caches[cache_dir] = FeatureCache(cache_dir)
+    hits = feature_cache.hits if feature_cache else 0
+
+    core = LipSyncCore(feature_cache=feature_cache, **options['core'])
+    visemes = load_baked_visemes(audio_file, core.analysis_params(bool(options.get('streaming'))))
+    baked = visemes is not None
+    if baked:
+        frames, codes, strengths = core.visemes_to_arrays(visemes)
+    elif options.get('streaming'):
+        frames, codes, strengths = core.visemes_to_arrays(list(core.analyze_audio_stream(audio_file)))
+    else:
+        total_frames, mel_spec, chroma = core.extract_features(audio_file)
+        codes, strengths, _ = core.generate_viseme_codes(mel_spec[:, :total_frames], chroma[:, :total_frames])
+        frames = np.arange(len(codes), dtype=np.float32)
+
+    # 布局: frames(float32) | strengths(float32) | codes(int8)
+    count = len(codes)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, count * 9))
+    np.ndarray(count, dtype=np.float32, buffer=shm.buf, offset=0)[:] = frames
+    np.ndarray(count, dtype=np.float32, buffer=shm.buf, offset=count * 4)[:] = strengths
+    np.ndarray(count, dtype=np.int8, buffer=shm.buf, offset=count * 8)[:] = codes
+    info = {
+        'shm': shm.name,
+        'count': count,
+        'baked': baked,
+        'cache_hit': None if feature_cache is None or baked else feature_cache.hits > hits,
+        'elapsed': time.perf_counter() - start,
+    }
+    return shm, info
+
+def _worker_main(requests, results):
+    start = time.perf_counter()
+    try:
+        _warm_up()
+    except Exception as e:
+        logger.warning(f"后台分析进程预热失败: {str(e)}")
+    results.put(('ready', None, time.perf_counter() - start))
+
+    feature_caches = {}
+    segments = {}  # 共享内存由本进程创建, 主进程读取完毕发回 release 后再释放
+    try:
+        while True:
+            message = requests.get()
+            if message is None:
+                break
+            if message[0] == 'release':
+                shm = segments.pop(message[1], None)
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+                continue
+
+            _, job_id, audio_file, options = message
+            try:
+                shm, info = _analyze(audio_file, options, feature_caches)
+            except Exception as e:
+                results.put(('error', job_id, f"{type(e).__name__}: {str(e)}"))
+                continue
+            segments[shm.name] = shm
+            results.put(('done', job_id, info))
+    finally:
+        for shm in segments.values():
+            shm.close()
+            shm.unlink()
+
+class AnalysisWorker:
+    def __init__(self):
+        self._process = None
+        self._requests = None
+        self._results = None
+        self._jobs = {}
+        self._job_ids = itertools.count(1)
+        self.ready = False
+        self.warm_up_time = None
+
+    def start(self):
+        if self.is_alive():
+            return
+        context = multiprocessing.get_context('spawn')
+        self._requests = context.Queue()
+        self._results = context.Queue()
+        self._process = context.Process(target=_worker_main, args=(self._requests, self._results), name="LipSyncAnalysisWorker", daemon=True)
+        self._process.start()
+        self.ready = False
+        logger.info(f"启动后台分析进程, PID: {self._process.pid}")
+
+    def stop(self):
+        if self._process is None:
+            return
+        if self._process.is_alive():
+            self._requests.put(None)
+            self._process.join(timeout=5)
+            if self._process.is_alive():
+                self._process.terminate()
+        self._process = None
+        self._jobs.clear()
+        self.ready = False
+        logger.info("后台分析进程已停止")
+
+    def is_alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def pending(self):
+        return len(self._jobs)
+
+    def submit(self, audio_file, options, callback):
+        # options: {'core': LipSyncCore 参数, 'streaming': 是否流式分析, 'cache_dir': 特征缓存目录或 None}
+        # 结果在 poll() 中以 callback((frames, codes, strengths), info) 交回, 出错时为 callback(None, {'error': 信息})
+        self.start()
+        job_id = next(self._job_ids)
+        self._jobs[job_id] = callback
+        self._requests.put(('analyze', job_id, audio_file, options))
+        logger.info(f"提交后台分析任务 {job_id}: {audio_file}")
+        return job_id
+
+    def poll(self):
+        # 在主线程调用, 不阻塞; 返回仍在等待的任务数
+        if self._results is None:
+            return 0
+        while True:
+            try:
+                kind, job_id, payload = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'ready':
+                self.ready = True
+                self.warm_up_time = payload
+                logger.info(f"后台分析进程预热完成, 用时 {payload:.2f}s")
+                continue
+            callback = self._jobs.pop(job_id, None)
+            if kind == 'error':
+                logger.error(f"后台分析任务 {job_id} 失败: {payload}")
+                if callback:
+                    callback(None, {'error': payload})
+                continue
+            arrays = self._read_result(payload)
+            if callback:
+                callback(arrays, payload)
+
+        if self._jobs and not self.is_alive():
+            logger.error("后台分析进程意外退出")
+            jobs, self._jobs = self._jobs, {}
+            for callback in jobs.values():
+                callback(None, {'error': "后台分析进程意外退出"})
+        return len(self._jobs)
+
+    def _read_result(self, info):
+        shm = shared_memory.SharedMemory(name=info['shm'])
+        try:
+            count = info['count']
+            frames = np.ndarray(count, dtype=np.float32, buffer=shm.buf, offset=0).copy()
+            strengths = np.ndarray(count, dtype=np.float32, buffer=shm.buf, offset=count * 4).copy()
+            codes = np.ndarray(count, dtype=np.int8, buffer=shm.buf, offset=count * 8).copy()
+        finally:
+            shm.close()
+            self._requests.put(('release', info['shm']))
+        return frames, codes, strengths
@@ -1,6 +1,6 @@
 import bpy
 import threading
-from frame_range_adjuster import FrameRangeAdjuster
+from .frame_range_adjuster import FrameRangeAdjuster
 
 class LipSyncCleaner:
     def __init__(self, scene, lipsync_prefix, extra_frames, min_animation_frames):
@@ -3,9 +3,20 @@ import os
 from datetime import datetime
 
 class FileHandlerWithReopen(logging.FileHandler):
+    # 延迟到第一次写日志时才创建目录和文件, 每条日志写完即关闭文件
+    def __init__(self, filename, mode='a', encoding=None):
+        super().__init__(filename, mode, encoding, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
     def emit(self, record):
-        self.stream.close()
-        self.stream = self._open()
+        try:
+            self.stream = self._open()
+        except OSError:
+            self.handleError(record)
+            return
         super().emit(record)
         self.stream.close()
         self.stream = None
@@ -24,12 +35,6 @@ class LipSyncLogger:
         log_filename = f"blender_lipsync_debug_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
         log_file_path = os.path.join(log_dir, log_filename)
 
-        try:
-            os.makedirs(log_dir, exist_ok=True)
-        except Exception as e:
-            print(f"无法创建日志目录：{e}")
-            return
-
         log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
         try:
@@ -49,15 +54,6 @@ class LipSyncLogger:
                 self.logger.addHandler(file_handler)
                 self.logger.addHandler(console_handler)
 
-            print(f"日志文件被创建在: {log_file_path}")
-            self.logger.info("Lip sync & 3D digital human 插件日志系统初始化")
-
-            # 添加测试日志
-            self.logger.debug("这是一条测试 DEBUG 消息")
-            self.logger.info("这是一条测试 INFO 消息")
-            self.logger.warning("这是一条测试 WARNING 消息")
-            self.logger.error("这是一条测试 ERROR 消息")
-
         except Exception as e:
             print(f"设置日志系统时出错：{e}")
 
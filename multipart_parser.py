@@ -0,0 +1,150 @@
+import os
+import logging
+import tempfile
+from email.message import Message
+
+class MultipartError(ValueError):
+    pass
+
+class UploadTooLarge(MultipartError):
+    pass
+
+class UploadedFile:
+    def __init__(self, name, filename, path, content_type):
+        self.name = name
+        self.filename = filename
+        self.path = path
+        self.content_type = content_type
+        self.size = 0
+
+class StreamingMultipartParser:
+    # 逐块解析 multipart/form-data: 文件部分直接写入暂存目录中唯一命名的文件, 内存占用只有一个读缓冲区, 与上传大小无关
+    def __init__(self, boundary, spool_dir, max_file_bytes, max_field_bytes=1024 * 1024, chunk_size=64 * 1024):
+        if not boundary or len(boundary) > 70:
+            raise MultipartError("无效的 multipart 边界")
+        self.boundary = boundary.encode('latin-1')
+        self.spool_dir = spool_dir
+        self.max_file_bytes = max_file_bytes
+        self.max_field_bytes = max_field_bytes
+        self.chunk_size = chunk_size
+        self.max_header_bytes = 16 * 1024
+
+    def parse(self, stream, content_length):
+        # 返回 (字段字典, 文件字典); 出错时删除已经写入的文件
+        self._stream = stream
+        self._remaining = content_length
+        self._buffer = bytearray()
+        fields, files = {}, {}
+        try:
+            self._read_until(b'--' + self.boundary, None, self.max_field_bytes)  # 丢弃前导内容
+            delimiter = b'\r\n--' + self.boundary
+            while True:
+                ending = self._read_exact(2)
+                if ending == b'--':
+                    break
+                if ending != b'\r\n':
+                    raise MultipartError("multipart 边界后格式错误")
+                name, filename, content_type = self._read_part_headers()
+                if filename:
+                    # 同名的文件部分只保留最后一个, 之前暂存的文件先删除, 否则没有人再引用它
+                    previous = files.pop(name, None)
+                    if previous:
+                        self._remove(previous.path)
+                    files[name] = self._spool(name, filename, content_type, delimiter)
+                elif filename is not None:
+                    # 浏览器在没有选择文件时也会发送空的文件部分
+                    self._read_until(delimiter, None, self.max_file_bytes)
+                    logging.warning(f"Field '{name}' has no uploaded file")
+                else:
+                    value = bytearray()
+                    self._read_until(delimiter, value.extend, self.max_field_bytes)
+                    fields[name] = value.decode('utf-8', 'replace')
+            self._drain()
+        except Exception:
+            for upload in files.values():
+                self._remove(upload.path)
+            raise
+        return fields, files
+
+    def _spool(self, name, filename, content_type, delimiter):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        suffix = os.path.splitext(os.path.basename(filename))[1][:16]
+        fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=self.spool_dir)
+        upload = UploadedFile(name, os.path.basename(filename), path, content_type)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                upload.size = self._read_until(delimiter, f.write, self.max_file_bytes)
+        except Exception:
+            self._remove(path)
+            raise
+        return upload
+
+    def _read_until(self, delimiter, sink, limit):
+        # 把分隔符之前的内容交给 sink, 分隔符本身被消耗掉; 缓冲区末尾保留可能是分隔符开头的部分
+        size = 0
+        keep = len(delimiter) - 1
+        while True:
+            index = self._buffer.find(delimiter)
+            end = index if index >= 0 else max(0, len(self._buffer) - keep)
+            if end:
+                size += end
+                if size > limit:
+                    raise UploadTooLarge(f"上传内容超过上限 {limit} 字节")
+                if sink is not None:
+                    sink(bytes(self._buffer[:end]))
+                del self._buffer[:end]
+            if index >= 0:
+                del self._buffer[:len(delimiter)]
+                return size
+            self._fill()
+
+    def _read_part_headers(self):
+        while True:
+            index = self._buffer.find(b'\r\n\r\n')
+            if index >= 0:
+                break
+            if len(self._buffer) > self.max_header_bytes:
+                raise MultipartError("multipart 头部过长")
+            self._fill()
+        raw_headers = bytes(self._buffer[:index]).decode('utf-8', 'replace')
+        del self._buffer[:index + 4]
+
+        message = Message()
+        for line in raw_headers.split('\r\n'):
+            key, _, value = line.partition(':')
+            if value:
+                message[key.strip()] = value.strip()
+        name = message.get_param('name', header='content-disposition')
+        if name is None:
+            raise MultipartError("multipart 部分缺少字段名")
+        return name, message.get_filename(), message.get_content_type()
+
+    def _read_exact(self, count):
+        while len(self._buffer) < count:
+            self._fill()
+        data = bytes(self._buffer[:count])
+        del self._buffer[:count]
+        return data
+
+    def _fill(self):
+        if self._remaining <= 0:
+            raise MultipartError("请求体在 multipart 结束之前就结束了")
+        data = self._stream.read(min(self.chunk_size, self._remaining))
+        if not data:
+            raise MultipartError("连接在上传完成之前断开")
+        self._remaining -= len(data)
+        self._buffer.extend(data)
+
+    def _drain(self):
+        # 读完结尾内容, 长连接上的下一个请求才能从正确的位置开始
+        while self._remaining > 0:
+            data = self._stream.read(min(self.chunk_size, self._remaining))
+            if not data:
+                break
+            self._remaining -= len(data)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,116 @@
+import time
+import threading
+from collections import OrderedDict
+
+# 内容生成的回复缓存: 相同的键在有效期内直接返回上次的回复; 同一个键正在生成时, 后来的请求跟随正在进行的那一次逐段读取, 不再调用后端
+# 只缓存完整生成成功的回复, 出错或中途放弃的不缓存, 跟随者收到同样的错误
+
+class InflightResponse:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def append(self, chunk):
+        with self.condition:
+            self.chunks.append(chunk)
+            self.condition.notify_all()
+
+    def finish(self, error=None):
+        with self.condition:
+            self.done = True
+            self.error = error
+            self.condition.notify_all()
+
+    def follow(self):
+        # 先交出已经收到的片段, 再等待新的片段, 直到生成结束
+        index = 0
+        while True:
+            with self.condition:
+                while index == len(self.chunks) and not self.done:
+                    self.condition.wait()
+                chunks = self.chunks[index:]
+                done, error = self.done, self.error
+            index += len(chunks)
+            yield from chunks
+            if done and index == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+class ResponseCache:
+    def __init__(self, ttl=30.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.entries = OrderedDict()  # 键 -> (过期时间, 回复), 按最近使用排序
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def stream(self, key, produce):
+        # produce() 返回逐段产出回复的迭代器, 只有未命中且没有相同请求在进行时才调用
+        # 查找和登记都推迟到第一次读取时进行: 调用方读取之前就关闭迭代器时不会留下登记, 否则之后相同的请求会一直等待
+        leader = False
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                response = entry[1]
+            else:
+                if entry:
+                    del self.entries[key]
+                response = self.inflight.get(key)
+                if response:
+                    self.coalesced += 1
+                else:
+                    self.misses += 1
+                    response = self.inflight[key] = InflightResponse()
+                    leader = True
+        if leader:
+            # 登记之后到进入 _lead 的 try 之间没有暂停点, 由它的 finally 负责注销
+            yield from self._lead(key, response, produce)
+        elif isinstance(response, InflightResponse):
+            yield from response.follow()
+        else:
+            yield response
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                'entries': len(self.entries),
+                'inflight': len(self.inflight),
+            }
+
+    def _lead(self, key, inflight, produce):
+        error = RuntimeError("生成被中途放弃")
+        try:
+            for chunk in produce():
+                inflight.append(chunk)
+                yield chunk
+            error = None
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+                response = "".join(inflight.chunks)
+                if error is None and response and self.max_entries > 0:
+                    self.entries[key] = (time.monotonic() + self.ttl, response)
+                    self.entries.move_to_end(key)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+            inflight.finish(error)
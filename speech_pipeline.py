@@ -0,0 +1,131 @@
+import re
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 句末标点(中英文), 后面可以跟引号或括号; 英文句点后面必须是空白, 避免把小数和缩写切开
+SENTENCE_END = re.compile(r'(?:[。！？；…!?;\n]+|\.+(?=\s))[”’"」』)）]*')
+# 句子太长还没有遇到句末标点时, 在最后一个分句标点处切开
+CLAUSE_END = re.compile(r'[，、：,:][”’"」』)）]*')
+SPEECH_CHAR = re.compile(r'\w')
+
+class SentenceSplitter:
+    # 把模型逐段输出的文本切成句子; 标点在缓冲区末尾时先不切, 等下一段确认后面没有紧跟的标点或引号
+    def __init__(self, min_chars=3, max_chars=80):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            if match.end() >= len(self.buffer):
+                break
+            if len(self.buffer[start:match.end()].strip()) < self.min_chars:
+                continue  # 太短的句子和下一句合在一起合成
+            sentences.append(self.buffer[start:match.end()])
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        if len(self.buffer) > self.max_chars:
+            clauses = list(CLAUSE_END.finditer(self.buffer, 0, len(self.buffer) - 1))
+            cut = clauses[-1].end() if clauses else self.max_chars
+            sentences.append(self.buffer[:cut])
+            self.buffer = self.buffer[cut:]
+        return [sentence.strip() for sentence in sentences if SPEECH_CHAR.search(sentence)]
+
+    def flush(self):
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if SPEECH_CHAR.search(rest) else []
+
+class SentencePipeline:
+    # 边生成边合成: 模型每输出一句就交给合成线程, 第一句的语音不必等整段回复生成完
+    def __init__(self, workers=1, min_chars=3, max_chars=80):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="SentenceTTS")
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+
+    def run(self, generate, synthesize, on_clip, on_token=None):
+        # generate(on_token) 流式生成并返回完整回复; synthesize(序号, 句子) 返回合成结果
+        # on_clip(序号, 结果) 在合成线程中调用, 多个合成线程时可能乱序, 由调用方按序号排序
+        # 返回 (完整回复, futures), 生成失败时回复为 None, 已经切出的句子照常合成; 每个 future 完成时 on_clip 已经调用过
+        splitter = SentenceSplitter(self.min_chars, self.max_chars)
+        futures = []
+
+        def speak(sentences):
+            for sentence in sentences:
+                logging.debug(f"第 {len(futures) + 1} 句交给语音合成: {sentence}")
+                futures.append(self.executor.submit(self._synthesize, synthesize, on_clip, len(futures), sentence))
+
+        def handle_token(token):
+            if on_token:
+                on_token(token)
+            speak(splitter.feed(token))
+
+        try:
+            content = generate(handle_token)
+        except Exception as e:
+            logging.error(f"流式生成内容时出错: {str(e)}")
+            content = None
+        if content:
+            if not futures and not splitter.buffer.strip():
+                # 不支持流式输出的接口一次返回整段回复
+                speak(splitter.feed(content))
+            speak(splitter.flush())
+        return content, futures
+
+    def _synthesize(self, synthesize, on_clip, index, sentence):
+        try:
+            result = synthesize(index, sentence)
+        except Exception as e:
+            logging.error(f"合成第 {index + 1} 句时出错: {str(e)}")
+            result = None
+        on_clip(index, result)
+        return result
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def split_script(text, max_chars=120):
+    # 长文本按行(段落)切开, 段落内切成句子后把相邻的句子拼成不超过 max_chars 的块; 块不跨段落, 段落之间的停顿保留
+    chunks = []
+    for paragraph in text.splitlines():
+        splitter = SentenceSplitter(min_chars=1, max_chars=max_chars)
+        sentences = []
+        for start in range(0, len(paragraph), max_chars):
+            sentences.extend(splitter.feed(paragraph[start:start + max_chars]))
+        sentences.extend(splitter.flush())
+        chunk = ""
+        for sentence in sentences:
+            if chunk and len(chunk) + len(sentence) > max_chars:
+                chunks.append(chunk)
+                chunk = ""
+            chunk += (" " if chunk and chunk[-1].isascii() else "") + sentence
+        if chunk:
+            chunks.append(chunk)
+    return chunks
+
+def synthesize_chunks(chunks, synthesize, on_clip, workers=4, on_progress=None):
+    # 最多 workers 个块同时合成; synthesize(序号, 文本) 返回合成结果, 失败返回 None
+    # on_clip(序号, 结果) 在合成线程中调用, 可能乱序, 由调用方按序号排序; on_progress(已完成数, 总数)
+    # 返回按块顺序排列的结果列表
+    done = [0]
+    lock = threading.Lock()
+
+    def run(index, chunk):
+        result = None
+        try:
+            result = synthesize(index, chunk)
+        except Exception as e:
+            logging.error(f"合成第 {index + 1} 段时出错: {str(e)}")
+        finally:
+            on_clip(index, result)
+            with lock:  # 在锁内报告, 进度只增不减
+                done[0] += 1
+                if on_progress:
+                    on_progress(done[0], len(chunks))
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ScriptTTS") as executor:
+        return list(executor.map(run, range(len(chunks)), chunks))
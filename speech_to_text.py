@@ -1,21 +1,56 @@
-import logging
-import requests
-import json
 import os
+import time
+import logging
+import threading
+from .http_client import get_client
+from .config_service import config_service
+from .audio_preprocess import AudioPreprocessor, PREPROCESS_DEFAULTS
 
 class SpeechToText:
     def __init__(self, method="Whisper"):
         self.method = method
-        self.config = self._load_config()
+        self.config = config_service.get()
+        config_service.subscribe(self._config_changed)
+        self.http = get_client()
+        self.preprocessor = AudioPreprocessor()
+        self._apply_preprocess_config(self.config)
+        self.requests = 0
+        self.total_time = 0.0
+        self.lock = threading.Lock()
+
+    def _config_changed(self, config):
+        self.config = config
+        self._apply_preprocess_config(config)
+
+    def _apply_preprocess_config(self, config):
+        preprocess = {**PREPROCESS_DEFAULTS, **config.get('stt_preprocess', {})}
+        self.preprocess_enabled = preprocess['enabled']
+        for key in ('sample_rate', 'top_db', 'pad_ms', 'format'):
+            setattr(self.preprocessor, key, preprocess[key])
 
-    def _load_config(self):
-        config_path = os.path.join(os.path.dirname(__file__), 'config.json')
-        with open(config_path, 'r') as f:
-            return json.load(f)
+    def stats(self):
+        # 转写耗时包括预处理、上传和识别
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'avg_latency': self.total_time / self.requests if self.requests else 0.0,
+                'preprocess': self.preprocessor.stats(),
+            }
 
     def transcribe(self, file_name):
         if self.method == "Whisper":
-            return self._transcribe_whisper(file_name)
+            start = time.perf_counter()
+            prepared = self.preprocessor.process(file_name) if self.preprocess_enabled else None
+            try:
+                return self._transcribe_whisper(prepared or file_name)
+            finally:
+                if prepared:
+                    os.remove(prepared)
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.requests += 1
+                    self.total_time += elapsed
+                logging.info(f"语音识别耗时 {elapsed * 1000:.0f} ms")
         elif self.method == "Other":
             return self._transcribe_other(file_name)
         else:
@@ -26,7 +61,7 @@ class SpeechToText:
         try:
             with open(file_name, 'rb') as audio_file:
                 files = {'audio_file': audio_file}
-                response = requests.post(f"{self.config['whisper']['url']}?output=json", files=files)
+                response = self.http.post(f"{self.config['whisper']['url']}?output=json", files=files)
                 
                 if response.status_code == 200:
                     result = response.json()
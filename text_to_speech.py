@@ -1,44 +1,72 @@
 import logging
-import requests
 import os
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .http_client import get_client
+from .config_service import config_service
+from .tts_cache import AudioCache
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), 'Cache', 'tts')
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+CACHE_DEFAULTS = {'enabled': True, 'max_bytes': 256 * 1024 * 1024}
+
+# ChatTTS 的音色参数; 与文本一起组成缓存键, 修改其中任何一项都不会命中旧的缓存
+CHATTTS_VOICE = {
+    'prompt': "[break_6]",
+    'voice': "1031.pt",
+    'speed': '5',
+    'temperature': '0.1',
+    'top_p': '0.701',
+    'top_k': '20',
+    'refine_max_new_token': '384',
+    'infer_max_new_token': '2048',
+    'text_seed': '42',
+    'skip_refine': '1',
+    'is_stream': '0',
+    'custom_voice': '0'
+}
 
 class TextToSpeech:
     def __init__(self, method="ChatTTS"):
         self.method = method
-        self.config = self._load_config()
+        self.config = config_service.get()
+        config_service.subscribe(self._config_changed)
+        self.http = get_client()
+        cache_config = {**CACHE_DEFAULTS, **self.config.get('tts_cache', {})}
+        self.cache_enabled = cache_config['enabled']
+        self.cache = AudioCache(CACHE_DIR, cache_config['max_bytes'])
+        self._downloads = None  # 下载线程池, 第一次有多个文件要下载时创建
+        self._download_lock = threading.Lock()
 
-    def _load_config(self):
-        config_path = os.path.join(os.path.dirname(__file__), 'config.json')
-        with open(config_path, 'r') as f:
-            return json.load(f)
+    def _config_changed(self, config):
+        self.config = config
+        cache_config = {**CACHE_DEFAULTS, **config.get('tts_cache', {})}
+        self.cache_enabled = cache_config['enabled']
+        self.cache.max_bytes = cache_config['max_bytes']
 
-    def synthesize(self, text):
+    def synthesize(self, text, output_dir=None):
+        # output_dir 默认为插件目录下的 Voice 文件夹
         if self.method == "ChatTTS":
-            return self._synthesize_chattts(text)
+            return self._synthesize_chattts(text, output_dir)
         else:
             raise ValueError(f"Unsupported text to speech method: {self.method}")
 
-    def _synthesize_chattts(self, text):
+    def _synthesize_chattts(self, text, output_dir=None):
         logging.info("使用ChatTTS进行文本到语音转换")
+        voice_dir = output_dir or os.path.join(os.path.dirname(__file__), "Voice")
+        cache_key = None
+        if self.cache_enabled:
+            # 服务地址也算进键里, 不同的 ChatTTS 服务可能装着同名但不同的音色文件
+            cache_key = self.cache.make_key(text, {'url': self.config['chattts']['url'], **CHATTTS_VOICE})
+            audio_files = self.cache.load(cache_key, voice_dir)
+            if audio_files is not None:
+                logging.info(f"语音缓存命中, 未调用ChatTTS: {audio_files}")
+                return audio_files
         try:
-            form_data = {
-                'text': text,
-                'prompt': "[break_6]",
-                'voice': "1031.pt",
-                'speed': '5',
-                'temperature': '0.1',
-                'top_p': '0.701',
-                'top_k': '20',
-                'refine_max_new_token': '384',
-                'infer_max_new_token': '2048',
-                'text_seed': '42',
-                'skip_refine': '1',
-                'is_stream': '0',
-                'custom_voice': '0'
-            }
+            form_data = {'text': text, **CHATTTS_VOICE}
             
-            tts_response = requests.post(
+            tts_response = self.http.post(
                 self.config['chattts']['url'],
                 data=form_data,
                 headers={'Content-Type': 'application/x-www-form-urlencoded'}
@@ -47,24 +75,20 @@ class TextToSpeech:
             if tts_response.status_code == 200:
                 tts_data = tts_response.json()
                 if tts_data['code'] == 0:
-                    voice_dir = os.path.join(os.path.dirname(__file__), "Voice")
                     os.makedirs(voice_dir, exist_ok=True)
                     
-                    audio_files = []
-                    for audio_file in tts_data['audio_files']:
-                        url = audio_file['url']
-                        filename = os.path.basename(url)
-                        file_path = os.path.join(voice_dir, filename)
-                        
-                        response = requests.get(url)
-                        if response.status_code == 200:
-                            with open(file_path, 'wb') as f:
-                                f.write(response.content)
-                            logging.info(f"音频文件已下载到: {file_path}")
-                            audio_files.append(file_path)
-                        else:
-                            logging.error(f"下载音频文件失败: {url}")
+                    # 多个文件同时下载, 返回的列表保持 ChatTTS 给出的顺序; 只有一个文件时直接在当前线程下载
+                    downloads = [(audio_file['url'], os.path.join(voice_dir, os.path.basename(audio_file['url'])))
+                                 for audio_file in tts_data['audio_files']]
+                    if len(downloads) > 1:
+                        results = list(self._download_executor().map(lambda item: self._download(*item), downloads))
+                    else:
+                        results = [self._download(*item) for item in downloads]
+                    audio_files = [file_path for file_path in results if file_path]
                     
+                    # 只缓存完整的结果, 有文件下载失败时下次仍然重新合成
+                    if cache_key and audio_files and len(audio_files) == len(tts_data['audio_files']):
+                        self.cache.store(cache_key, audio_files)
                     return audio_files
                 else:
                     logging.error(f"TTS处理错误: {tts_data['msg']}")
@@ -73,4 +97,31 @@ class TextToSpeech:
         except Exception as e:
             logging.error(f"文本到语音处理错误: {str(e)}")
         
-        return None
\ No newline at end of file
+        return None
+
+    def _download_executor(self):
+        with self._download_lock:
+            if self._downloads is None:
+                workers = self.config['chattts'].get('download_workers', DOWNLOAD_WORKERS)
+                self._downloads = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="TTSDownload")
+            return self._downloads
+
+    def _download(self, url, file_path):
+        # 边接收边写入同目录下的 .part 临时文件, 完整后原子改名; 监视 Voice 的线程只认 .wav/.mp3, 不会读到写了一半的文件
+        temp_path = f"{file_path}.{threading.get_ident()}.part"
+        try:
+            with self.http.get(url, stream=True) as response:
+                if response.status_code != 200:
+                    logging.error(f"下载音频文件失败: {url}")
+                    return None
+                with open(temp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+            os.replace(temp_path, file_path)
+        except Exception as e:
+            logging.error(f"下载音频文件失败: {url}, {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return None
+        logging.info(f"音频文件已下载到: {file_path}")
+        return file_path
\ No newline at end of file
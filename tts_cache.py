@@ -0,0 +1,126 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+import unicodedata
+
+# 语音合成结果缓存: 以规范化后的文本和全部合成参数为键, 每个条目是一个目录, 保存该次合成的所有音频文件和清单
+# 命中时把文件硬链接(不支持时复制)到输出目录并换一个新文件名, 不访问网络; 总大小超过上限时按最近使用时间淘汰
+
+MANIFEST = 'manifest.json'
+
+def normalize_text(text):
+    # 全角/半角统一, 去掉首尾空白, 连续空白合并成一个空格; 不改变大小写和标点, 它们会影响语调
+    return " ".join(unicodedata.normalize('NFKC', text).split())
+
+class AudioCache:
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.size = None  # 最近一次扫描得到的总大小
+        self.lock = threading.Lock()
+
+    def make_key(self, text, params):
+        digest = hashlib.sha256(normalize_text(text).encode('utf-8'))
+        digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def load(self, key, output_dir):
+        # 返回输出目录中的音频文件列表, 未命中返回 None
+        entry = os.path.join(self.cache_dir, key)
+        try:
+            with open(os.path.join(entry, MANIFEST), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            os.makedirs(output_dir, exist_ok=True)
+            audio_files = []
+            for name in manifest['files']:
+                stem, ext = os.path.splitext(name)
+                # 每次命中都用新的文件名, 同一句话重复出现时不会覆盖 Voice 中还没播放的文件
+                target = os.path.join(output_dir, f"{stem}-{uuid.uuid4().hex[:8]}{ext}")
+                self._link(os.path.join(entry, name), target)
+                audio_files.append(target)
+            os.utime(entry)  # 以修改时间记录最近使用时间, 供LRU淘汰
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"语音缓存条目损坏, 已删除: {entry}, {str(e)}")
+            shutil.rmtree(entry, ignore_errors=True)
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+            self.bytes_saved += manifest['bytes']
+        return audio_files
+
+    def store(self, key, audio_files):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = os.path.join(self.cache_dir, key)
+        temp_entry = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(temp_entry)
+            names = []
+            for audio_file in audio_files:
+                name = os.path.basename(audio_file)
+                self._link(audio_file, os.path.join(temp_entry, name))
+                names.append(name)
+            manifest = {'files': names, 'bytes': sum(os.path.getsize(audio_file) for audio_file in audio_files)}
+            with open(os.path.join(temp_entry, MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            # 目录改名是原子的; 同一段文本被同时合成时, 后完成的一方改名失败, 直接丢弃
+            os.rename(temp_entry, entry)
+        except OSError as e:
+            if not os.path.isdir(entry):
+                logging.warning(f"写入语音缓存失败: {str(e)}")
+            shutil.rmtree(temp_entry, ignore_errors=True)
+            return
+        self._evict()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'size': self.size,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _link(self, source, target):
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+
+    def _evict(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.is_dir() or entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    with open(os.path.join(entry.path, MANIFEST), 'r', encoding='utf-8') as f:
+                        size = json.load(f)['bytes']
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+                except (OSError, ValueError, KeyError):
+                    continue  # 正在写入或已损坏的条目, 读取时再处理
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logging.debug(f"淘汰语音缓存: {path}")
+        with self.lock:
+            self.size = total
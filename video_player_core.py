@@ -3,10 +3,10 @@ import time
 import os
 import logging
 from bpy.app.handlers import persistent
-from frame_range_adjuster import FrameRangeAdjuster
+from .frame_range_adjuster import FrameRangeAdjuster
 import traceback
 from typing import Optional, List
-from lipsync_cleaner import LipSyncCleaner
+from .lipsync_cleaner import LipSyncCleaner
 from collections import deque
 from .logger import get_logger
 from .lipsync_animation_handler import LipSyncAnimationHandler